@@ -0,0 +1,270 @@
+"""
+Headless benchmark runner. From the root/ folder:
+
+    python -m benchmarks                          # everything, JSON to stdout
+    python -m benchmarks -o results.json          # write to a file
+    python -m benchmarks --compare old.json       # print the change against an earlier run
+    python -m benchmarks --only build_table --scale large
+
+Never imports tkinter, so it runs without a display.
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_report
+from model.report_archive import ARCHIVE_EXTENSION
+from model.test_report import TestReport
+
+
+CORPUS_DIR = Path(__file__).resolve().parents[2] / 'Report Samples'
+
+# make_report() arguments for each scale
+SCALES = {
+    'small':  dict(tests=4,  ccs=2, values_per_cc=5,  results=3, calculations=2, specifications=1, fill=0.9),
+    'medium': dict(tests=8,  ccs=3, values_per_cc=12, results=4, calculations=3, specifications=2, fill=0.8),
+    'large':  dict(tests=4,  ccs=3, values_per_cc=40, results=6, calculations=4, specifications=2, fill=0.8),
+}
+
+# rows evaluated one at a time by the evaluate_formula case
+FORMULA_ROWS = 2000
+
+
+def measure(func, repeat: int = 5, setup=None):
+    """
+    Runs func repeat times (after setup(), untimed, when given) and returns timing stats in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+
+    return {
+        'repeat': repeat,
+        'min_s': min(times),
+        'median_s': statistics.median(times),
+        'mean_s': statistics.fmean(times),
+        'max_s': max(times),
+    }
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _report_shape(report):
+    return {
+        'tests': len(report.tests),
+        'rows': sum(len(test.combo_index) for test in report.tests),
+        'columns': sum(len(test.metadata) for test in report.tests),
+    }
+
+
+# ----- Cases -----
+# each case takes (label, report, repeat) and yields (name, params, stats)
+
+def bench_build_table(label, report, repeat):
+    def run():
+        for test in report.tests:
+            test.build_table()
+    yield 'build_table', {}, measure(run, repeat)
+
+
+def bench_evaluate_formula(label, report, repeat):
+    # the biggest test with a calculation, row by row and as one column
+    tests = [test for test in report.tests if test.calculations and not test.virtual]
+    if not tests:
+        return
+    test = max(tests, key=lambda t: len(t.combo_index))
+    name, formula = next(iter(test.calculations.items()))
+    test.refresh_table()
+    table = test.root_table
+    rows = [row for _, row in table.head(FORMULA_ROWS).iterrows()]
+
+    def run_rows():
+        for row in rows:
+            test.evaluate_formula(formula, row)
+
+    params = {'test': test.name, 'formula': formula}
+    yield 'evaluate_formula', dict(params, rows=len(rows)), measure(run_rows, repeat)
+    yield 'evaluate_column', dict(params, rows=len(table)), measure(lambda: test.evaluate_column(formula, table), repeat)
+
+
+def bench_pickle(label, report, repeat):
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'report.pickle')
+        stats = measure(lambda: report.pickle(path), repeat)
+        size = os.path.getsize(path)
+        yield 'pickle', {'bytes': size}, stats
+        yield 'unpickle', {'bytes': size}, measure(lambda: TestReport.unpickle(path), repeat)
+
+
+def bench_archive(label, report, repeat):
+    # opening only reads the header, selecting a test reads that one test
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, f"report{ARCHIVE_EXTENSION}")
+        stats = measure(lambda: report.save(path), repeat)
+        size = os.path.getsize(path)
+        yield 'save_archive', {'bytes': size}, stats
+        yield 'open_archive', {'bytes': size}, measure(lambda: TestReport.open(path), repeat)
+
+        def select_first(opened):
+            if opened.tests:
+                opened.select_test(opened.tests[0].category, opened.tests[0].name)
+        yield 'open_archive_select', {'bytes': size}, measure(lambda: select_first(TestReport.open(path)), repeat)
+
+
+def bench_update_from_dataframe(label, report, repeat):
+    tests = [test for test in report.tests if test.results and not test.virtual]
+    if not tests:
+        return
+    test = max(tests, key=lambda t: len(t.combo_index))
+    columns = list(test.results.keys())
+    test.refresh_table()
+    edited = test.root_table[columns].copy()
+
+    yield 'update_from_dataframe', {'test': test.name, 'rows': len(edited), 'columns': len(columns)}, \
+        measure(lambda: test.update_from_dataframe(edited), repeat)
+
+
+def bench_edit_Re_val(label, report, repeat):
+    # a single cell edit, which should only patch the columns it touches
+    tests = [test for test in report.tests if test.results]
+    if not tests:
+        return
+    test = max(tests, key=lambda t: len(t.combo_index))
+    name = next(iter(test.results.keys()))
+    row = len(test.combo_index) // 2
+
+    yield 'edit_Re_val', {'test': test.name}, measure(lambda: test.edit_Re_val(name, row, 1.25), repeat)
+
+
+CASES = {
+    'build_table': bench_build_table,
+    'evaluate_formula': bench_evaluate_formula,
+    'pickle': bench_pickle,
+    'archive': bench_archive,
+    'update_from_dataframe': bench_update_from_dataframe,
+    'edit_Re_val': bench_edit_Re_val,
+}
+
+
+# ----- Running -----
+
+def load_corpus(folder=CORPUS_DIR):
+    """
+    (label, report) for every pickle in the corpus folder, skipping ones that fail to load.
+    """
+    reports = []
+    for path in sorted(Path(folder).glob('*.pickle')):
+        try:
+            reports.append((f"corpus:{path.stem}", TestReport.unpickle(path)))
+        except (OSError, pickle.UnpicklingError, TypeError, AttributeError, ModuleNotFoundError) as e:
+            print(f"skipping {path.name}: {e}", file=sys.stderr)
+    return reports
+
+
+def run(scales=('small', 'medium'), cases=None, repeat: int = 5, corpus=True, corpus_dir=CORPUS_DIR):
+    """
+    Runs the benchmark cases over synthetic reports at the given scales and the corpus.
+    Returns a JSON-ready dict.
+    """
+    cases = list(CASES) if cases is None else cases
+
+    reports = []
+    for scale in scales:
+        start = time.perf_counter()
+        report = make_report(**SCALES[scale])
+        reports.append((f"synthetic:{scale}", report, {'generate_s': time.perf_counter() - start, **SCALES[scale]}))
+    if corpus:
+        reports += [(label, report, {}) for label, report in load_corpus(corpus_dir)]
+
+    results = []
+    for label, report, params in reports:
+        for case in cases:
+            for name, case_params, stats in CASES[case](label, report, repeat):
+                results.append({
+                    'name': name,
+                    'report': label,
+                    'params': {**params, **_report_shape(report), **case_params},
+                    **stats,
+                })
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def compare(new, old):
+    """
+    Lines describing how each result's median moved against an earlier run.
+    """
+    previous = {(r['report'], r['name']): r for r in old.get('results', [])}
+    lines = []
+    for result in new['results']:
+        before = previous.get((result['report'], result['name']))
+        if before is None or not before['median_s']:
+            continue
+        ratio = result['median_s'] / before['median_s']
+        lines.append(f"{result['report']:<28} {result['name']:<22} "
+                     f"{before['median_s'] * 1000:10.3f} ms -> {result['median_s'] * 1000:10.3f} ms  ({ratio:.2f}x)")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('-o', '--output', help="write the JSON results here instead of stdout")
+    parser.add_argument('--scale', action='append', choices=list(SCALES),
+                        help="synthetic report scale, can be repeated (default: small and medium)")
+    parser.add_argument('--only', action='append', choices=list(CASES), help="run just these cases")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-corpus', action='store_true', help="skip the Report Samples pickles")
+    parser.add_argument('--corpus-dir', default=str(CORPUS_DIR))
+    parser.add_argument('--compare', help="an earlier JSON run to compare against")
+    args = parser.parse_args(argv)
+
+    results = run(scales=args.scale or ('small', 'medium'), cases=args.only, repeat=args.repeat,
+                  corpus=not args.no_corpus, corpus_dir=args.corpus_dir)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as file:
+            for line in compare(results, json.load(file)):
+                print(line, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
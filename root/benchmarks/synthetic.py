@@ -0,0 +1,75 @@
+"""
+Synthetic TestReports for benchmarking. Everything is seeded, so the same
+arguments always give the same report.
+"""
+import numpy as np
+import pandas as pd
+
+from model.spec_limits import SpecLimit
+from model.test_report import TestReport
+
+
+def make_test(test, ccs: int = 2, values_per_cc: int = 5, results: int = 3, calculations: int = 2,
+              specifications: int = 1, fill: float = 1.0, rng=None):
+    """
+    Fills an empty Test with ccs column conditions of values_per_cc values each,
+    results Re columns (fill is the fraction of cells with a value), calculations
+    Ca columns chained off the results and specifications Sp limit columns.
+    """
+    rng = np.random.default_rng(0) if rng is None else rng
+
+    with test.batch():
+        for i in range(ccs):
+            test.add_CC(f"Condition {i + 1}", [f"{v:g}" for v in np.linspace(1, 10, values_per_cc)])
+
+        result_names = [f"Result {i + 1}" for i in range(results)]
+        for name in result_names:
+            test.add_Re(name)
+
+        num_rows = len(test.combo_index)
+        data = {}
+        for name in result_names:
+            values = rng.normal(5, 1, num_rows).round(4)
+            values[rng.random(num_rows) >= fill] = np.nan
+            data[name] = values
+        if data:
+            test.update_from_dataframe(pd.DataFrame(data))
+
+        calc_names = []
+        for i in range(calculations):
+            if not result_names:
+                break
+            source = result_names[i % len(result_names)]
+            if calc_names and i % 2:
+                # every other calculation reads the previous one, so the dependency graph has some depth
+                formula = f"=Ca('{calc_names[-1]}') - Re('{source}')"
+            elif ccs:
+                formula = f"=Re('{source}') * CC('Condition 1')"
+            else:
+                formula = f"=Re('{source}') * 2"
+            calc_names.append(f"Calculation {i + 1}")
+            test.add_Ca(calc_names[-1], formula)
+
+        for i in range(specifications):
+            targets = result_names + calc_names
+            if not targets:
+                break
+            test.add_Sp(f"Spec {i + 1}", limit=SpecLimit(targets[i % len(targets)], nominal=5, tolerance=1.5))
+
+    return test
+
+
+def make_report(tests: int = 4, ccs: int = 2, values_per_cc: int = 5, results: int = 3, calculations: int = 2,
+                specifications: int = 1, fill: float = 1.0, seed: int = 0, categories: int = 3):
+    """
+    A TestReport with tests spread over categories, each built by make_test().
+    """
+    rng = np.random.default_rng(seed)
+    report = TestReport(title='Synthetic Report')
+
+    with report.batch():
+        for i in range(tests):
+            report.add_test(f"Category {i % max(categories, 1) + 1}", f"Test {i + 1}")
+            make_test(report.tests[-1], ccs, values_per_cc, results, calculations, specifications, fill, rng)
+
+    return report
@@ -0,0 +1,263 @@
+"""
+Headless batch mode. From the root/ folder:
+
+    python main.py validate reports/                       # every report in a folder
+    python main.py rebuild a.trz b.pickle --format trz     # rewrite (and convert) in place
+    python main.py export-csv reports/ -o csv/ --layout tests
+    python main.py export-pdf reports/*.trz -o pdf/ -j 8 --summary summary.json
+    python main.py catalog reports.sqlite reports/           # see model.catalog
+
+Files are spread across a process pool, one report per worker at a time. Every file
+gets a line in the summary with how long it took and what went wrong, and the exit
+code is 1 if any of them failed. Never imports tkinter, so it runs without a display.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from model.catalog import Catalog
+from model.csv_export import LONG_LAYOUT, TESTS_LAYOUT
+from model.formula import ERR
+from model.report_archive import ARCHIVE_EXTENSION, find_reports
+from model.test_report import TestReport
+from utils.tracing import get_logger
+
+log = get_logger(__name__)
+
+
+FORMATS = {'trz': ARCHIVE_EXTENSION, 'pickle': '.pickle'}
+
+
+def _output_path(path, output_dir, extension):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir or os.path.dirname(path), stem + extension)
+
+
+def _count_errors(column):
+    column = np.asarray(column)
+    # a float column has no room for #ERR
+    return int(np.count_nonzero(column == ERR)) if column.dtype.kind in 'OU' else 0
+
+
+def _refresh(report):
+    # builds every table, which evaluates every formula
+    for test in report.tests:
+        test.refresh_table()
+
+
+# ----- Commands -----
+# each runs in a worker process, takes the report path and the parsed options,
+# and returns (files written, details for the summary)
+
+def rebuild(path, options):
+    """
+    Loads every test, rebuilds its table and rewrites the report as one compacted file.
+    """
+    report = TestReport.open(path)
+    report.load_tests()
+    _refresh(report)
+
+    extension = FORMATS[options.format] if options.format else os.path.splitext(path)[1]
+    output = _output_path(path, options.output, extension)
+    if os.path.abspath(output) == os.path.abspath(path):
+        report.compact(output)
+    else:
+        report.save(output)
+    return [output], {'tests': len(report.tests)}
+
+
+def export_csv(path, options):
+    report = TestReport.open(path)
+    extension = '.csv' if options.layout == LONG_LAYOUT else ''
+    paths = report.save_csv(_output_path(path, options.output, extension), options.layout,
+                            skip_blank=not options.keep_blank)
+    return paths, {'tests': len(report.tests)}
+
+
+def export_pdf(path, options):
+    report = TestReport.open(path)
+    output = _output_path(path, options.output, '.tex' if options.tex else '.pdf')
+    # the files are already spread across processes, don't start a pool in each one
+    report.save_latex_pdf(output, engine=options.engine, jobs=1, cache_dir=options.cache_dir)
+    return [output], {'tests': len(report.tests)}
+
+
+def validate(path, options):
+    """
+    Opens the report, loads and evaluates every test, and counts #ERR cells and spec results.
+    Fails on errors, and on spec failures too with --strict.
+    """
+    report = TestReport.open(path)
+
+    problems = []
+    totals = {'tests': len(report.tests), 'errors': 0, 'pass': 0, 'fail': 0, 'untested': 0}
+    for test in report.tests:
+        label = f"{test.category}/{test.name}"
+        try:
+            test.load()
+            names = list(test.calculations)
+            columns = test.compute_columns(names=names) if names else {}
+            counts = test.pass_fail_counts()
+        except Exception as e:
+            problems.append(f"{label}: {type(e).__name__}: {e}")
+            continue
+
+        errors = sum(_count_errors(column) for name, column in columns.items() if name in test.calculations)
+        if errors:
+            problems.append(f"{label}: {errors} {ERR} cells")
+        if options.strict and counts['fail']:
+            problems.append(f"{label}: {counts['fail']} spec failures")
+
+        totals['errors'] += errors
+        for key in ('pass', 'fail', 'untested'):
+            totals[key] += counts[key]
+
+    if problems:
+        raise ValueError('; '.join(problems))
+    return [], totals
+
+
+COMMANDS = {
+    'rebuild': rebuild,
+    'export-csv': export_csv,
+    'export-pdf': export_pdf,
+    'validate': validate,
+}
+
+
+def run_file(command, path, options):
+    """
+    Runs one command on one file and returns its summary entry. Never raises.
+    """
+    start = time.perf_counter()
+    entry = {'path': path, 'ok': True, 'outputs': [], 'details': {}, 'error': None}
+    try:
+        entry['outputs'], entry['details'] = COMMANDS[command](path, options)
+    except Exception as e:
+        entry['ok'] = False
+        entry['error'] = f"{type(e).__name__}: {e}"
+        log.debug("%s %s failed\n%s", command, path, traceback.format_exc())
+    entry['seconds'] = round(time.perf_counter() - start, 4)
+    return entry
+
+
+def run(command, paths, options, jobs: int = None):
+    """
+    Runs command on every path, in a process pool unless jobs == 1.
+    Returns the summary entries in the order the paths were given.
+    """
+    if jobs == 1 or len(paths) < 2:
+        return [run_file(command, path, options) for path in paths]
+
+    entries = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run_file, command, path, options): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                entries[path] = future.result()
+            except Exception as e:
+                # the worker itself died (killed, out of memory), not the command
+                entries[path] = {'path': path, 'ok': False, 'outputs': [], 'details': {},
+                                 'error': f"{type(e).__name__}: {e}", 'seconds': None}
+            _print_entry(entries[path])
+    return [entries[path] for path in paths]
+
+
+def _print_entry(entry):
+    seconds = f"{entry['seconds']:8.2f}s" if entry['seconds'] is not None else '        ?'
+    status = 'ok  ' if entry['ok'] else 'FAIL'
+    line = f"{status} {seconds}  {entry['path']}"
+    if entry['error']:
+        line += f"\n     {entry['error']}"
+    print(line, flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python main.py', description=__doc__.split('\n\n')[0].strip())
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_command(name, help):
+        command = commands.add_parser(name, help=help)
+        command.add_argument('paths', nargs='+', help="report files, or folders of them")
+        command.add_argument('-r', '--recursive', action='store_true', help="look in subfolders too")
+        command.add_argument('-j', '--jobs', type=int, default=None,
+                             help="worker processes (default: one per CPU, 1 runs everything in this process)")
+        command.add_argument('--summary', help="write the per-file summary as JSON here")
+        return command
+
+    command = add_command('rebuild', "rebuild every table and rewrite each report as a single compacted file")
+    command.add_argument('-o', '--output', help="folder to write to (default: in place)")
+    command.add_argument('--format', choices=list(FORMATS), help="convert to this format (default: keep it)")
+
+    command = add_command('export-csv', "export each report's tables to CSV")
+    command.add_argument('-o', '--output', help="folder to write to (default: next to each report)")
+    command.add_argument('--layout', choices=[LONG_LAYOUT, TESTS_LAYOUT], default=LONG_LAYOUT)
+    command.add_argument('--keep-blank', action='store_true', help="write blank cells too (long layout)")
+
+    command = add_command('export-pdf', "render each report to PDF")
+    command.add_argument('-o', '--output', help="folder to write to (default: next to each report)")
+    command.add_argument('--engine', help="TeX engine to compile with (default: the first found on PATH)")
+    command.add_argument('--tex', action='store_true', help="write the LaTeX source instead of compiling it")
+    command.add_argument('--cache-dir', help="rendered fragment cache (default: .latex_cache next to the output)")
+
+    command = add_command('validate', "check every report opens and evaluates without #ERR cells")
+    command.add_argument('--strict', action='store_true', help="spec failures fail the report too")
+
+    # not a per-file command: the catalog is one database, written from this process
+    command = commands.add_parser('catalog', help="add reports to a SQLite catalog, or bring it up to date")
+    command.add_argument('database', help="catalog file, created if it doesn't exist")
+    command.add_argument('paths', nargs='+', help="report files, or folders of them (searched recursively)")
+    command.add_argument('-j', '--jobs', type=int, default=None, help="worker processes (default: one per CPU)")
+    command.add_argument('--keep-missing', action='store_true', help="keep reports that no longer exist")
+
+    return parser
+
+
+def catalog(options):
+    with Catalog(options.database) as catalog:
+        result = catalog.scan(options.paths, jobs=options.jobs, prune=not options.keep_missing)
+
+    for path, error in result.failed.items():
+        print(f"FAIL {path}\n     {error}")
+    print(f"catalog: {result}")
+    return 1 if result.failed else 0
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    if options.command == 'catalog':
+        return catalog(options)
+
+    paths = find_reports(options.paths, options.recursive)
+    if not paths:
+        print("No reports found.", file=sys.stderr)
+        return 1
+    if getattr(options, 'output', None):
+        os.makedirs(options.output, exist_ok=True)
+
+    start = time.perf_counter()
+    entries = run(options.command, paths, options, options.jobs)
+    elapsed = time.perf_counter() - start
+
+    if options.jobs == 1 or len(paths) < 2:
+        # the pool prints as files finish, in this process they're printed at the end
+        for entry in entries:
+            _print_entry(entry)
+
+    failed = sum(not entry['ok'] for entry in entries)
+    print(f"{options.command}: {len(entries) - failed} ok, {failed} failed, {elapsed:.2f}s")
+
+    if options.summary:
+        summary = {'command': options.command, 'seconds': round(elapsed, 4),
+                   'ok': len(entries) - failed, 'failed': failed, 'files': entries}
+        with open(options.summary, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=1)
+
+    return 1 if failed else 0
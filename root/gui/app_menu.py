@@ -2,8 +2,14 @@ import tkinter as tk
 import tkinter.simpledialog as sd
 import tkinter.messagebox as mb
 import tkinter.filedialog as fd
+from concurrent.futures import ThreadPoolExecutor
 
-from model.test_report import TestReport
+# model.test_report brings pandas with it, it's imported when a report is made or opened
+from model.report_archive import ARCHIVE_EXTENSION
+
+from utils.tracing import get_logger
+
+log = get_logger(__name__)
 
 
 
@@ -19,15 +25,23 @@ class AppMenu(tk.Menu):
         file_menu.add_command(label='Open Report', command=self.open_report)
         file_menu.add_separator()
         file_menu.add_command(label='Save', command=self.save)
+        file_menu.add_command(label='Import CSV Log', command=self.import_csv)
+        file_menu.add_command(label='Export PDF', command=self.export_pdf)
         file_menu.add_separator()
-        file_menu.add_command(label='Exit', command=self.parent.quit)
+        file_menu.add_command(label='Exit', command=self.parent.on_close)
 
         edit_menu = tk.Menu(self, tearoff=0)
+        edit_menu.add_command(label='Undo', command=self.undo)
+        edit_menu.add_command(label='Redo', command=self.redo)
+        edit_menu.add_separator()
         edit_menu.add_command(label='Refresh UI', command=self.parent.refresh_all)
 
         self.add_cascade(label='File', menu=file_menu)
         self.add_cascade(label='Edit', menu=edit_menu)
 
+        # exports render on here so the window stays responsive
+        self._export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+
     def new_report(self):
         title = sd.askstring("New Report", "Enter a title for the new report:")
 
@@ -35,13 +49,15 @@ class AppMenu(tk.Menu):
             mb.showerror('Missing Field', 'You are missing a required field!')
             return # user cancelled
         
-        filepath = fd.asksaveasfilename(defaultextension='.pickle',
-                                        filetypes=[('Pickle Files', '*.pickle')],
+        filepath = fd.asksaveasfilename(defaultextension=ARCHIVE_EXTENSION,
+                                        filetypes=[('Test Reports', f'*{ARCHIVE_EXTENSION}'),
+                                                   ('Pickle Files', '*.pickle')],
                                         title='Save Report As')
 
         if not filepath:
             return # user cancelled
         
+        from model.test_report import TestReport
         report = TestReport(title=title)
 
         
@@ -49,41 +65,107 @@ class AppMenu(tk.Menu):
 
         try:
             self.parent.filepath = filepath
-            report.pickle(filepath)
+            report.save(filepath)
         except Exception as e:
             mb.showerror("ERROR", f"Failed to save report: {e}")
 
-        self.parent.report = report
-        self.parent.tests_manager.set_report(report)
-        self.parent.test_editor.set_report(report)
-        self.parent.equipment_manager.set_report(report)
-        self.parent.cover_page_manager.set_report(report)
-        self.parent.image_viewer.set_report(report)
-
+        self.parent.set_report(report, filepath)
         self.master.refresh_all()
 
     def save(self):
-        self.parent.report.pickle(self.parent.filepath)
+        # written on the autosaver's thread, the status bar says when it's done
+        self.parent.autosaver.save_now()
+
+    def undo(self):
+        report = self.parent.report
+        if report is None or not report.undo():
+            self.parent.status_label.config(text="Nothing to undo")
+            return
+        self.parent.refresh_all()
+
+    def redo(self):
+        report = self.parent.report
+        if report is None or not report.redo():
+            self.parent.status_label.config(text="Nothing to redo")
+            return
+        self.parent.refresh_all()
 
     def open_report(self):
         filepath = fd.askopenfilename(title="Open Test Report",
-                                      filetypes=[("Pickle files", "*.pickle"), 
+                                      filetypes=[("Test Reports", f"*{ARCHIVE_EXTENSION} *.pickle"),
+                                                 ("Pickle files", "*.pickle"),
                                                  ("All Files", "*.*")])
         
         if not filepath:
             return
         
         try:
-            report = TestReport.unpickle(filepath)
-            self.parent.report = report
-            self.parent.filepath = filepath
-
-            self.parent.tests_manager.set_report(report)
-            self.parent.test_editor.set_report(report)
-            self.parent.equipment_manager.set_report(report)
-            self.parent.cover_page_manager.set_report(report)
+            from model.test_report import TestReport
+            report = TestReport.open(filepath)
+            self.parent.set_report(report, filepath)
             self.parent.refresh_all()
 
         except Exception as e:
             mb.showerror("Error", f"Could not load report: \n{e}")
-            print(e)
\ No newline at end of file
+            log.exception("could not load report %s", filepath)
+
+    def import_csv(self):
+        report = self.parent.report
+        if report is None or report.selected_test is None:
+            mb.showerror("Error", "Select a test to import into first.")
+            return
+
+        filepath = fd.askopenfilename(title="Import CSV Log",
+                                      filetypes=[("CSV Files", "*.csv"), ("All Files", "*.*")])
+        if not filepath:
+            return
+
+        try:
+            result = report.import_csv(filepath)
+        except Exception as e:
+            mb.showerror("Import Failed", str(e))
+            log.exception("importing %s failed", filepath)
+            return
+
+        self.parent.refresh_all()
+
+        message = (f"{result.lines} lines read, {result.matched} matched a row, "
+                   f"{result.written} values written.")
+        if result.unmatched:
+            lines = ', '.join(str(line) for line, _ in result.unmatched_samples)
+            message += f"\n\n{result.unmatched} lines matched no row (lines {lines}...)."
+        if result.duplicates:
+            lines = ', '.join(str(line) for line, _ in result.duplicate_samples)
+            message += f"\n\n{result.duplicates} lines repeated an earlier line's conditions, the last one was kept (lines {lines}...)."
+        mb.showinfo("Import CSV Log", message)
+
+    def export_pdf(self):
+        report = self.parent.report
+        if report is None:
+            mb.showerror("Error", "Open a report first.")
+            return
+
+        filepath = fd.asksaveasfilename(defaultextension='.pdf',
+                                        initialfile=f"{report.title}.pdf",
+                                        filetypes=[('PDF Files', '*.pdf'), ('LaTeX Files', '*.tex')],
+                                        title='Export PDF')
+        if not filepath:
+            return
+
+        # render a copy, edits made while it runs don't end up half in the PDF
+        future = self._export_executor.submit(report.snapshot().save_latex_pdf, filepath)
+        self.parent.status_label.config(text=f"Exporting {filepath}...")
+        self.after(200, self._poll_export, future, filepath)
+
+    def _poll_export(self, future, filepath):
+        if not future.done():
+            self.after(200, self._poll_export, future, filepath)
+            return
+
+        error = future.exception()
+        if error is not None:
+            log.error("exporting %s failed: %s", filepath, error, exc_info=error)
+            self.parent.status_label.config(text=f"Export failed: {error}")
+            mb.showerror("Export Failed", str(error))
+        else:
+            self.parent.status_label.config(text=f"Exported {filepath}")
@@ -67,12 +67,10 @@ class CCDialog(tk.Toplevel):
             self.on_submit(name, values)
         else:
             self.on_submit(self.col_tag, name, values)
-        print('SUBMIT HIT!')
         self.destroy()
 
     def delete(self):
         self.on_delete(self.col_tag)
-        print('DELTE HIT!')
         self.destroy()
 
 
@@ -131,5 +129,4 @@ class ReDialog(tk.Toplevel):
 
     def delete(self):
         self.on_delete(self.col_tag)
-        print('DELTE HIT!')
         self.destroy()
\ No newline at end of file
@@ -4,6 +4,10 @@ import pandas as pd
 
 from model.test_report import TestReport
 
+from utils.tracing import get_logger
+
+log = get_logger(__name__)
+
 
 class EquipmentManager(tk.Frame):
     def __init__(self, parent):
@@ -68,9 +72,7 @@ class EquipmentManager(tk.Frame):
             entries[field] = entry
 
         def save():
-            values = [entries[field].get() for field in fields]
-            new_row = pd.DataFrame([values], columns=fields)
-            self.report.cover_page.equipment_used = pd.concat([self.report.cover_page.equipment_used, new_row], ignore_index=True)
+            self.report.add_equipment({field: entries[field].get() for field in fields})
             editor.destroy()
             self.refresh_ui()
 
@@ -120,14 +122,8 @@ class EquipmentManager(tk.Frame):
         if not self.report.selected_test:
             return
 
-        if var.get():
-            if index not in self.report.selected_test.checkbox_vars:
-                self.report.selected_test.checkbox_vars.append(index)
-                print(f"[+] Selected equipment index {index}")
-        else:
-            if index in self.report.selected_test.checkbox_vars:
-                self.report.selected_test.checkbox_vars.remove(index)
-                print(f"[-] Deselected equipment index {index}")
+        self.report.set_equipment_checked(index, var.get())
+        log.debug("equipment index %s checked: %s", index, var.get())
 
     def edit_equipment_dialog(self, index):
         row_data = self.equipment_used.iloc[index]
@@ -147,16 +143,13 @@ class EquipmentManager(tk.Frame):
 
         def save():
             for field in fields:
-                self.equipment_used.at[index, field] = entries[field].get()
+                self.report.edit_equipment(index, field, entries[field].get())
             editor.destroy()
             self.refresh_ui()
 
         def delete():
-            self.equipment_used.drop(self.equipment_used.index[index], inplace=True)
-            self.equipment_used.reset_index(drop=True, inplace=True)
-            # Clean checkbox_vars for all tests
-            for test in self.report.tests:
-                test.checkbox_vars = [i if i < index else i - 1 for i in test.checkbox_vars if i != index]
+            # also renumbers the checked equipment on every test
+            self.report.remove_equipment(index)
             editor.destroy()
             self.refresh_ui()
 
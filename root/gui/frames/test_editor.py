@@ -9,17 +9,28 @@ from tksheet import (
 )
 
 from model.test_report import TestReport
+from model.column_store import display_values
+from model.virtual_table import VirtualTable
 from gui.frames.dialogs import CCDialog, ReDialog
 
+from utils.tracing import get_logger, traced
+
+log = get_logger(__name__)
+
 
 # column 1, row 0
 class TestEditor(tk.Frame):
+    # rows pulled into the sheet at a time when the test's table is virtual
+    WINDOW_ROWS = 1000
+
     def __init__(self, parent):
         super().__init__(parent)
-        print("TEST EDITOR CONSTRUCTED")
 
         self.report = None
 
+        # first table row shown in the sheet (only moves for virtual tables)
+        self.window_start = 0
+
         # Header area (like a group label)
         self.header = ttk.Label(
             self, 
@@ -54,6 +65,11 @@ class TestEditor(tk.Frame):
         new_report_button = ttk.Button(toolbar, text='NEW REPORT', style='ToolButton.TButton', command=self.master.menu.new_report)
         new_report_button.pack(side=tk.RIGHT, padx=3, pady=2)
 
+        # paging for tests too big to load into the sheet at once
+        self.next_rows_button = ttk.Button(toolbar, text='▶', style='ToolButton.TButton', command=lambda: self.move_window(1))
+        self.prev_rows_button = ttk.Button(toolbar, text='◀', style='ToolButton.TButton', command=lambda: self.move_window(-1))
+        self.rows_label = ttk.Label(toolbar, text='')
+
 
         
         # self.test_name_label = ttk.Label(title_bar, text="Please create or open a test report.")
@@ -87,14 +103,13 @@ class TestEditor(tk.Frame):
         Only changes left in event['data'] will be committed.
         """
 
-        print("🔧 Validation triggered.")
         for (row, col), new_value in event["data"].items():
-            old_value = self.sheet.get_cell_data(row, col)
-            print(f"📌 Cell ({row}, {col}) changed: '{old_value}' ➜ '{new_value}'")
+            log.debug("cell (%s, %s) changed: %r -> %r", row, col, self.sheet.get_cell_data(row, col), new_value)
 
             name = self.report.get_root_table().columns[col]
 
-            self.report.edit_Re_val(name, row, new_value)
+            # the sheet only holds a window of a virtual table
+            self.report.edit_Re_val(name, self.window_start + row, new_value)
 
         # Example: block any edits that include "block"
         event["data"] = {
@@ -134,10 +149,6 @@ class TestEditor(tk.Frame):
                  existing_name_var='', 
                  existing_values_var='')
 
-        print("HIT!")
-        print(self.report.get_CC())
-        print(self.report.get_metadata())
-
 
     def add_Re(self):
         if not self.report or self.report.tests == []:
@@ -149,10 +160,6 @@ class TestEditor(tk.Frame):
 
         ReDialog(self, on_submit, col_tag='')
 
-        print("HIT!")
-        print(self.report.get_CC())
-        print(self.report.get_metadata())
-
     def add_Ca(self):
         pass
 
@@ -161,9 +168,7 @@ class TestEditor(tk.Frame):
 
 
     def edit_column(self, col_tag):
-        print(col_tag)
-        print(self.report.get_metadata()[col_tag])
-        print("EDITING COLUMN")
+        log.debug("editing column %s (%r)", col_tag, self.report.get_metadata()[col_tag])
 
         if 'CC' in col_tag:
 
@@ -198,11 +203,45 @@ class TestEditor(tk.Frame):
 
     def set_report(self, report: TestReport):
         self.report = report
+        self.window_start = 0
         self.refresh_ui()
 
-    def refresh_ui(self):
+    def move_window(self, pages):
+        table = self.report.get_root_table()
+        last_start = max(len(table.index) - 1, 0) // self.WINDOW_ROWS * self.WINDOW_ROWS
 
-        
+        self.window_start = min(max(self.window_start + pages * self.WINDOW_ROWS, 0), last_start)
+        self.refresh_ui()
+
+    def load_sheet(self, table):
+        """
+        Puts the table into the sheet. Virtual tables only have the current window computed.
+        """
+        if isinstance(table, VirtualTable):
+            if self.window_start >= len(table):
+                self.window_start = 0
+            df = table.window(self.window_start, self.window_start + self.WINDOW_ROWS)
+
+            self.prev_rows_button.pack(side=tk.LEFT, padx=1, pady=2)
+            self.rows_label.pack(side=tk.LEFT, padx=3, pady=2)
+            self.next_rows_button.pack(side=tk.LEFT, padx=1, pady=2)
+            self.rows_label.config(text=f"Rows {self.window_start + 1:,}-{self.window_start + len(df.index):,} of {len(table):,}")
+        else:
+            self.window_start = 0
+            df = table
+
+            self.prev_rows_button.pack_forget()
+            self.rows_label.pack_forget()
+            self.next_rows_button.pack_forget()
+
+        # blank results are NaN in the typed table, show them as empty cells and numbers as typed
+        columns = [display_values(df[name].to_numpy()) for name in df.columns]
+        self.sheet.set_sheet_data([list(row) for row in zip(*columns)] if columns else [])
+        self.sheet.headers(df.columns.tolist())
+        self.sheet.row_index([str(i + 1) for i in df.index])
+
+    @traced('TestEditor.refresh_ui')
+    def refresh_ui(self):
 
         if not self.report:
             # self.test_name_label.config(text="Please create or open a test report.")
@@ -231,6 +270,11 @@ class TestEditor(tk.Frame):
             # self.test_name_label.config(text=f"Test Name: {self.report.selected_test.name}")
             self.header.config(text=f'⚡ Test Editor  --  Test Name: {self.report.selected_test.name}')
 
+            if self.report.selected_test.spec_limits:
+                counts = self.report.selected_test.pass_fail_counts()
+                self.header.config(text=f"{self.header.cget('text')}  --  "
+                                        f"PASS: {counts['pass']}  FAIL: {counts['fail']}  UNTESTED: {counts['untested']}")
+
         
             # create the dict of buttons
             for key in self.report.get_metadata().keys():
@@ -241,26 +285,15 @@ class TestEditor(tk.Frame):
             if self.metadata_button_dict != {}:
                 # pack the dict of buttons
                 for key, butt in self.metadata_button_dict.items():
-                    print(f"THIS IS THE KEY: {key}")
                     butt.config(command=lambda k=key: self.edit_column(k))
                     butt.pack(side=tk.LEFT)
 
-            print(self.metadata_button_dict.keys())
-            print(self.report.get_CC())
-
-            df = self.report.get_root_table()
-            self.sheet.set_sheet_data(df.values.tolist())
-            self.sheet.headers(df.columns.tolist())
-            
-
-            print(self.report.get_root_table().head(5))
+            self.load_sheet(self.report.get_root_table())
         self.sheet.pack(fill='both', expand=True)
 
         
 
         # self.after(100, lambda: self.sheet.focus_set())
-        print(f"\n\n\n\nTHIS IS THE FOCUS: {self.focus_displayof()}\n\n\n\n")
-        print(f"sheet data: {self.sheet.get_column_data(0)}")
 
         self.sheet.enable_bindings("all")
 
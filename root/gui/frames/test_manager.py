@@ -5,12 +5,15 @@ import tkinter.messagebox as mb
 
 from model.test_report import TestReport
 
+from utils.tracing import get_logger, traced
+
+log = get_logger(__name__)
+
 
 # column 0, rows 0 and 1
 class TestsManager(tk.Frame):
     def __init__(self, parent):
         super().__init__(parent)
-        print("TEST MANAGER CONSTRUCTED")
 
         self.report = None
         # self.selected_test = None
@@ -63,8 +66,6 @@ class TestsManager(tk.Frame):
             return
 
         parent_id = self.test_tree.parent(item_id)
-        print(f"ITEM ID: {item_id}")
-        print(f"PARENT ID: {parent_id}")
         
         # Only proceed if it's a test, not a category
         if parent_id:
@@ -81,7 +82,6 @@ class TestsManager(tk.Frame):
 
         else:
             old_category = self.test_tree.item(item_id, 'text')
-            print(f"OLD CATEGORY: {old_category}")
 
             new_cat = sd.askstring("Rename Test", f"Enter a new name for category '{old_category}':", initialvalue=old_category, parent=self)
 
@@ -132,16 +132,17 @@ class TestsManager(tk.Frame):
         if parent_id == '':
             # this is a category
             category = self.test_tree.item(item_id, 'text')
-            print(f"Selected Category: {category}")
+            log.debug("selected category %r", category)
 
         else:
             # this is a test
             category = self.test_tree.item(parent_id, 'text')
             test_name = self.test_tree.item(item_id, 'text')
 
-            print(F"Selected Test: {test_name} | Category: {category}")
+            log.debug("selected test %r in %r", test_name, category)
 
             self.report.select_test(category, test_name)
+            self.master.test_editor.window_start = 0
             # print(self.report.get_root_table().head(5))
 
         self.master.test_editor.refresh_ui()
@@ -159,6 +160,7 @@ class TestsManager(tk.Frame):
 
         self.refresh_ui()
 
+    @traced('TestsManager.refresh_ui')
     def refresh_ui(self):
 
         if not self.report:
@@ -176,20 +178,13 @@ class TestsManager(tk.Frame):
             self.test_tree.delete(item)
 
         
-        # group tests by category
-        category_map = {}
-        for test in self.report.tests:
-            category = test.category
-            name = test.name
-
-            # create category group if not already added
-            if category not in category_map:
-                parent_id = self.test_tree.insert('', 'end', text=category, open=(category in open_categories))
-                category_map[category] = parent_id
-
-            # add test as child under that category
-            # self.test_tree.insert(category_map[category], 'end', text='', values=(name,))
-            self.test_tree.insert(category_map[category], 'end', text=name)
+        # the report keeps tests grouped by category already
+        for category in self.report.get_categories():
+            parent_id = self.test_tree.insert('', 'end', text=category, open=(category in open_categories))
+
+            # add tests as children under that category
+            for test in self.report.get_category_tests(category):
+                self.test_tree.insert(parent_id, 'end', text=test.name)
 
         # self.report.select_test(category, name)
         # print(self.report.selected_test.head(5))
@@ -3,19 +3,21 @@ import tkinter as tk
 # import tkinter.simpledialog as sd
 # import tkinter.messagebox as mb
 from tkinter import ttk
-from PIL import Image, ImageTk
 from pathlib import Path
 
-from model.test_report import TestReport
-from gui.frames.cover_page_manager import CoverPageManager
-from gui.frames.equipment_manager import EquipmentManager
-from gui.frames.test_editor import TestEditor
-from gui.frames.test_manager import TestsManager
-from gui.frames.image_viewer import ImageViewer
+from model.autosave import AutoSaver
 from gui.app_menu import AppMenu
 
+from utils import startup
+from utils.tracing import get_logger, traced
+
+log = get_logger(__name__)
+
 
 class MainApp(tk.Tk):
+    # how often the autosaver is checked, in ms
+    AUTOSAVE_POLL = 500
+
     def __init__(self):
         super().__init__()
 
@@ -78,11 +80,55 @@ class MainApp(tk.Tk):
 
         
 
+        self.status_label = tk.Label(self, text='TEXT HERE', relief='sunken', anchor='w', bd=1)
+        self.status_label.pack(side=tk.BOTTOM, fill=tk.BOTH)
+
+        # the panels pull in pandas and tksheet, so they're built once the empty window is on screen
+        self.panels_built = False
+        self.loading_label = tk.Label(self, text='Loading...', fg='#808080')
+        self.loading_label.pack(fill=tk.BOTH, expand=True)
+        self.bind('<Map>', self.on_first_map, add='+')
+
+        # saves on a worker thread, started and finished from poll_autosave()
+        self.autosaver = AutoSaver(on_status=lambda message: self.status_label.config(text=message))
+        self.after(self.AUTOSAVE_POLL, self.poll_autosave)
+        self.protocol('WM_DELETE_WINDOW', self.on_close)
+
+        # main_paned.add(self.cover_page_manager, weight=1)
+
+
+
+    def on_first_map(self, event):
+        if event.widget is not self or self.panels_built:
+            return
+        self.unbind('<Map>')
+        # draw the empty window now, the panels come on the next turn of the event loop
+        self.update_idletasks()
+        startup.mark('window shown')
+        self.after(1, self.build_panels)
+
+    @traced('MainApp.build_panels')
+    def build_panels(self):
+        """
+        Builds the panels, once. Called after the first paint, or straight away by anything
+        that needs them sooner.
+        """
+        if self.panels_built:
+            return
+        self.panels_built = True
+
+        from gui.frames.cover_page_manager import CoverPageManager
+        from gui.frames.equipment_manager import EquipmentManager
+        from gui.frames.test_editor import TestEditor
+        from gui.frames.test_manager import TestsManager
+        from gui.frames.image_viewer import ImageViewer
+
+        self.loading_label.destroy()
+
         # create main horizontal PanedWidonw
         main_paned = ttk.PanedWindow(self, orient=tk.HORIZONTAL) # horizontal means they are packed blocks from left to right
         main_paned.pack(fill=tk.BOTH, expand=True) # fill any extra space # expand with the window if it resizes
 
-        # placeholder frames
         self.tests_manager = TestsManager(self)
         main_paned.add(self.tests_manager, weight=1)# left panel (test_manager)
 
@@ -97,7 +143,6 @@ class MainApp(tk.Tk):
 
         self.cover_page_manager = CoverPageManager(self)
         self.image_viewer = ImageViewer(self)
-        
 
         right_paned = ttk.PanedWindow(main_paned, orient=tk.VERTICAL)
         main_paned.add(right_paned, weight=1)
@@ -105,17 +150,49 @@ class MainApp(tk.Tk):
         right_paned.add(self.cover_page_manager, weight=1)
         right_paned.add(self.image_viewer, weight=1)
 
-        self.status_label = tk.Label(self, text='TEXT HERE', relief='sunken', anchor='w', bd=1)
-        self.status_label.pack(side=tk.BOTTOM, fill=tk.BOTH)
-
-        # main_paned.add(self.cover_page_manager, weight=1)
-
-
-
+        # a report opened before the panels were up
+        if self.report is not None:
+            self.set_panels_report(self.report)
+            self.refresh_all()
+
+        startup.mark('panels built')
+        startup.finish()
+
+    def set_report(self, report, filepath):
+        self.report = report
+        self.filepath = filepath
+        self.autosaver.set_report(report, filepath)
+        self.build_panels()
+        self.set_panels_report(report)
+
+    def set_panels_report(self, report):
+        self.tests_manager.set_report(report)
+        self.test_editor.set_report(report)
+        self.equipment_manager.set_report(report)
+        self.cover_page_manager.set_report(report)
+        self.image_viewer.set_report(report)
+
+    def poll_autosave(self):
+        self.autosaver.poll()
+        self.after(self.AUTOSAVE_POLL, self.poll_autosave)
+
+    def on_close(self):
+        # let a running save finish, then write whatever is left before closing
+        self.autosaver.close()
+        if self.report is not None and self.filepath and self.report.dirty:
+            try:
+                self.report.save(self.filepath)
+            except Exception:
+                log.exception("saving %s on exit failed", self.filepath)
+        self.destroy()
+
+    @traced('MainApp.refresh_all')
     def refresh_all(self):
+        if not self.panels_built:
+            return
         self.tests_manager.refresh_ui()
         self.test_editor.refresh_ui()
         self.equipment_manager.refresh_ui()
         self.cover_page_manager.refresh_ui()
         # self.image_viewer.refresh_ui()
-        print(f"\n\n\n\nTHIS IS THE FOCUS: {self.focus_displayof()}\n\n\n\n")
\ No newline at end of file
+        log.debug("focus: %s", self.focus_displayof())
\ No newline at end of file
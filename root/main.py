@@ -1,5 +1,22 @@
-from gui.main_app import MainApp
+import sys
+
+# first, so every import after it can be timed (TRG_STARTUP_REPORT, see utils/startup.py)
+from utils import startup
+startup.install_from_environment()
+
+from utils.tracing import configure_logging
 
 if __name__ == '__main__':
+    configure_logging()
+
+    # with arguments it's the batch command line (see cli.py), which never loads the GUI
+    if len(sys.argv) > 1:
+        from cli import main
+        sys.exit(main())
+
+    # only tkinter here, the panels (and pandas, tksheet with them) come after the window shows
+    from gui.main_app import MainApp
+    startup.mark('imports done')
     app = MainApp()
-    app.mainloop()
\ No newline at end of file
+    startup.mark('window created')
+    app.mainloop()
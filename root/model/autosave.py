@@ -0,0 +1,144 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from utils.tracing import get_logger, span
+
+log = get_logger(__name__)
+
+
+class AutoSaver():
+    """
+    Saves a report in the background.
+
+    The snapshot is taken on the calling thread (cheap, see TestReport.snapshot) and
+    written on a single worker thread, so the GUI never waits on the disk. Nothing
+    here touches tkinter: call poll() every so often from the GUI thread (MainApp
+    does it with after()) to start saves and finish the ones that are done.
+
+    A save starts once the report has been dirty for `delay` seconds, or straight
+    away from save_now(). Only one save runs at a time.
+    """
+    def __init__(self, interval: float = 60.0, delay: float = 5.0, on_status=None):
+        self.interval = interval   # seconds between saves while there are edits
+        self.delay = delay         # seconds to wait after the report first becomes dirty
+        # called with a short status message whenever a save starts, finishes or fails
+        self.on_status = on_status
+
+        self.report = None
+        self.filepath = None
+
+        self.enabled = True
+        self.last_saved = None
+        self.last_error = None
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='autosave')
+        self._future = None
+        self._finish = None
+        self._started = None
+        self._dirty_since = None
+        self._save_requested = False
+
+    def set_report(self, report, filepath):
+        # a save still running for the old report finishes first
+        self.wait()
+        self.report = report
+        self.filepath = filepath
+        self.last_saved = time.monotonic()
+        self._dirty_since = None
+
+    @property
+    def busy(self):
+        return self._future is not None
+
+    def save_now(self):
+        """
+        Saves as soon as possible, even if nothing changed (e.g. File -> Save).
+        """
+        self._save_requested = True
+        self.poll()
+
+    def poll(self):
+        """
+        Finishes a completed save and starts a new one if it's due. Call from the GUI thread.
+        """
+        if self._future is not None:
+            if not self._future.done():
+                return
+            self._complete()
+
+        report = self.report
+        if report is None or not self.filepath:
+            return
+
+        now = time.monotonic()
+        if not report.dirty:
+            self._dirty_since = None
+        elif self._dirty_since is None:
+            self._dirty_since = now
+
+        if self._save_requested:
+            self._start()
+        elif self.enabled and self._dirty_since is not None and report._batch_tests is None \
+                and (now - self._dirty_since >= self.delay or now - self.last_saved >= self.interval):
+            self._start()
+
+    def _start(self):
+        self._save_requested = False
+        try:
+            write, self._finish = self.report.prepare_save(self.filepath)
+        except Exception as e:
+            self._failed(e)
+            return
+
+        self._started = time.monotonic()
+        self._future = self._executor.submit(self._write, write, self.filepath)
+        self._status(f"Saving {self.filepath}...")
+
+    @staticmethod
+    def _write(write, filepath):
+        with span('AutoSaver.write', path=filepath):
+            return write()
+
+    def _complete(self):
+        future, finish = self._future, self._finish
+        self._future = None
+        self._finish = None
+
+        error = future.exception()
+        try:
+            if error is not None:
+                finish(None, error)
+                raise error
+            finish(future.result())
+        except Exception as e:
+            self._failed(e)
+            return
+
+        self.last_saved = time.monotonic()
+        self.last_error = None
+        self._dirty_since = None if not self.report.dirty else self.last_saved
+        log.debug("saved %s in %.3fs", self.filepath, self.last_saved - self._started)
+        self._status(f"Saved {self.filepath} at {time.strftime('%H:%M:%S')}")
+
+    def _failed(self, error):
+        self.last_error = error
+        # try again after another delay rather than on every poll
+        self._dirty_since = time.monotonic()
+        log.error("saving %s failed: %s", self.filepath, error, exc_info=error)
+        self._status(f"Save failed: {error}")
+
+    def _status(self, message):
+        if self.on_status is not None:
+            self.on_status(message)
+
+    def wait(self):
+        """
+        Blocks until a running save is done and finishes it.
+        """
+        if self._future is not None:
+            wait([self._future])
+            self._complete()
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown(wait=True)
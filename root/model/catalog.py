@@ -0,0 +1,491 @@
+"""
+SQLite catalog of many report files, for looking things up across reports without
+opening them.
+
+    catalog = Catalog('reports.sqlite')
+    catalog.scan(['//server/reports'], recursive=True)
+    catalog.query(column='Efficiency', properties={'Model': 'X'}, since='2026-01-01')
+
+scan() finds the reports that changed since the last scan (size and modification
+time of the file and its journal, then a sha256 of the contents to be sure) and
+reads them in a process pool. Workers send back plain data, only this process
+writes to the database, one transaction per report. Reports that disappeared are
+dropped from the catalog.
+
+Stored per report: title, general specifications, testing and review, equipment;
+per test: category, name, column names/formulas, CC values; and every non-blank
+result (Re) and calculation (Ca) cell with the CC values of its row.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from model.journal import journal_path
+from model.report_archive import find_reports
+from model.test_report import TestReport
+from utils.tracing import get_logger, span
+
+log = get_logger(__name__)
+
+
+CATALOG_VERSION = 1
+
+# rows of a test computed at a time while reading its cells
+EXTRACT_CHUNK_ROWS = 50_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    signature TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    modified REAL NOT NULL,
+    title TEXT,
+    scanned REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_modified ON reports (modified);
+
+CREATE TABLE IF NOT EXISTS properties (
+    report_id INTEGER NOT NULL REFERENCES reports (id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS properties_name ON properties (name, value);
+CREATE INDEX IF NOT EXISTS properties_report ON properties (report_id);
+
+CREATE TABLE IF NOT EXISTS equipment (
+    report_id INTEGER NOT NULL REFERENCES reports (id) ON DELETE CASCADE,
+    row INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS equipment_field ON equipment (field, value);
+CREATE INDEX IF NOT EXISTS equipment_report ON equipment (report_id);
+
+CREATE TABLE IF NOT EXISTS tests (
+    id INTEGER PRIMARY KEY,
+    report_id INTEGER NOT NULL REFERENCES reports (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    category TEXT,
+    name TEXT,
+    rows INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tests_name ON tests (category, name);
+CREATE INDEX IF NOT EXISTS tests_report ON tests (report_id);
+
+CREATE TABLE IF NOT EXISTS conditions (
+    test_id INTEGER NOT NULL REFERENCES tests (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS conditions_test ON conditions (test_id);
+
+CREATE TABLE IF NOT EXISTS columns (
+    id INTEGER PRIMARY KEY,
+    test_id INTEGER NOT NULL REFERENCES tests (id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT,
+    formula TEXT
+);
+CREATE INDEX IF NOT EXISTS columns_name ON columns (name);
+CREATE INDEX IF NOT EXISTS columns_test ON columns (test_id);
+
+CREATE TABLE IF NOT EXISTS combos (
+    test_id INTEGER NOT NULL REFERENCES tests (id) ON DELETE CASCADE,
+    row INTEGER NOT NULL,
+    conditions TEXT NOT NULL,
+    PRIMARY KEY (test_id, row)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS cells (
+    column_id INTEGER NOT NULL REFERENCES columns (id) ON DELETE CASCADE,
+    row INTEGER NOT NULL,
+    number REAL,
+    text TEXT,
+    PRIMARY KEY (column_id, row)
+) WITHOUT ROWID;
+"""
+
+
+class ScanResult():
+    def __init__(self):
+        self.added = []
+        self.updated = []
+        self.unchanged = []
+        self.removed = []
+        self.failed = {}        # path -> error message
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return (f"ScanResult({len(self.added)} added, {len(self.updated)} updated, {len(self.unchanged)} unchanged, "
+                f"{len(self.removed)} removed, {len(self.failed)} failed, {self.seconds:.2f}s)")
+
+
+# ----- Reading reports -----
+# these run in worker processes
+
+def file_signature(path):
+    """
+    Size and modification time of the report and its journal, the cheap check for changes.
+    """
+    parts = []
+    for part in (path, journal_path(path)):
+        try:
+            stat = os.stat(part)
+        except FileNotFoundError:
+            continue
+        parts.append([os.path.basename(part), stat.st_size, stat.st_mtime_ns])
+    return json.dumps(parts)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    for part in (path, journal_path(path)):
+        if not os.path.exists(part):
+            continue
+        with open(part, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _text(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return str(value)
+
+
+def _test_cells(test):
+    """
+    (columns, combos) for a test: every Re/Ca column with its non-blank cells as
+    (row array, number array, text list), and {row: CC values} for the rows with any.
+    """
+    names = [name for tag, name in test.metadata.items() if tag.startswith(('Re', 'Ca'))]
+    total = len(test.combo_index)
+
+    cells = {name: ([], [], []) for name in names}
+    for start in range(0, total if names else 0, EXTRACT_CHUNK_ROWS):
+        stop = min(start + EXTRACT_CHUNK_ROWS, total)
+        computed = test.compute_columns(start, stop, names=names)
+
+        for name in names:
+            values = np.asarray(computed.get(name, ()))
+            if values.dtype.kind == 'f':
+                rows = np.flatnonzero(~np.isnan(values))
+                numbers, texts = values[rows], [None] * len(rows)
+            else:
+                # text and #ERR cells are kept as text, numbers with units go in as numbers
+                numbers = test.column_numbers(name, values, start, stop)
+                texts = [_text(v) for v in values.tolist()]
+                rows = np.flatnonzero(~np.isnan(numbers) | np.array([bool(t) for t in texts], dtype=bool))
+                texts = [None if numbers[row] == numbers[row] else texts[row] for row in rows.tolist()]
+                numbers = numbers[rows]
+            row_list, number_list, text_list = cells[name]
+            row_list.append(rows + start)
+            number_list.append(numbers)
+            text_list.extend(texts)
+
+    columns = {}
+    used = []
+    for name, (rows, numbers, texts) in cells.items():
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        numbers = np.concatenate(numbers) if numbers else np.empty(0)
+        columns[name] = (rows, numbers, texts)
+        used.append(rows)
+
+    combos = {}
+    if used:
+        rows = np.unique(np.concatenate(used))
+        cc_names = [name for tag, name in test.metadata.items() if tag.startswith('CC')]
+        for row, combo in zip(rows.tolist(), test.combo_index.combos(rows)):
+            combos[row] = json.dumps(dict(zip(cc_names, combo)), default=str)
+    return columns, combos
+
+
+def extract_report(path, known_hash=None):
+    """
+    Everything the catalog keeps about one report, as plain data.
+    Returns just the hash when it matches known_hash (touched but not changed).
+    """
+    signature = file_signature(path)
+    sha256 = file_hash(path)
+    info = {'path': path, 'signature': signature, 'sha256': sha256,
+            'modified': max(os.path.getmtime(p) for p in (path, journal_path(path)) if os.path.exists(p))}
+    if sha256 == known_hash:
+        info['unchanged'] = True
+        return info
+
+    report = TestReport.open(path)
+    cover_page = report.cover_page
+
+    info['title'] = report.title
+    info['properties'] = [('specification', str(k), _text(v)) for k, v in cover_page.general_specifications.items()] \
+        + [('review', str(k), _text(v)) for k, v in cover_page.testing_and_review.items()]
+
+    table = cover_page.equipment_used
+    info['equipment'] = [(row, str(field), _text(value))
+                         for row, record in enumerate(table.to_dict('records'))
+                         for field, value in record.items() if _text(value) not in (None, '')]
+
+    tests = []
+    for position, test in enumerate(report.tests):
+        test.load()
+        columns, combos = _test_cells(test)
+        tests.append({
+            'position': position,
+            'category': test.category,
+            'name': test.name,
+            'rows': len(test.combo_index),
+            'conditions': [(str(name), i, _text(value))
+                           for name, values in test.column_conditions.items() for i, value in enumerate(values or ())],
+            # kind is the tag without its number: CC, Re, Ca or Sp
+            'columns': [(tag, tag[:2], name, test.calculations.get(name), columns.get(name))
+                        for tag, name in test.metadata.items()],
+            'combos': combos,
+        })
+    info['tests'] = tests
+    return info
+
+
+def _extract(path, known_hash):
+    # never raises, so one bad file doesn't take the scan down
+    try:
+        return extract_report(path, known_hash)
+    except Exception as e:
+        return {'path': path, 'error': f"{type(e).__name__}: {e}"}
+
+
+# ----- Catalog -----
+
+def _timestamp(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return value.timestamp()
+
+
+class Catalog():
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.db = sqlite3.connect(filepath)
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.executescript(SCHEMA)
+
+        version = self.db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is None:
+            with self.db:
+                self.db.execute("INSERT INTO meta VALUES ('version', ?)", (str(CATALOG_VERSION),))
+        elif int(version[0]) > CATALOG_VERSION:
+            raise TypeError(f"Catalog version {version[0]} is newer than this program supports")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    # ----- Scanning -----
+
+    def scan(self, paths, recursive: bool = True, jobs: int = None, prune: bool = True):
+        """
+        Brings the catalog up to date with the reports in paths (files or folders).
+        Only reports whose file or journal changed are read again.
+        prune drops reports that no longer exist from the catalog.
+        """
+        start = time.perf_counter()
+        result = ScanResult()
+        known = {path: (signature, sha256)
+                 for path, signature, sha256 in self.db.execute('SELECT path, signature, sha256 FROM reports')}
+
+        todo = []
+        for path in find_reports(paths, recursive):
+            previous = known.get(path)
+            if previous is not None and previous[0] == file_signature(path):
+                result.unchanged.append(path)
+            else:
+                todo.append((path, previous[1] if previous else None))
+
+        with span('Catalog.scan', files=lambda: len(todo)):
+            if jobs == 1 or len(todo) < 2:
+                for path, known_hash in todo:
+                    self._store(_extract(path, known_hash), path in known, result)
+            else:
+                with ProcessPoolExecutor(max_workers=jobs) as pool:
+                    futures = [pool.submit(_extract, path, known_hash) for path, known_hash in todo]
+                    for future in as_completed(futures):
+                        info = future.result()
+                        self._store(info, info['path'] in known, result)
+
+        if prune:
+            gone = [path for path in known if not os.path.exists(path)]
+            with self.db:
+                self.db.executemany('DELETE FROM reports WHERE path = ?', [(path,) for path in gone])
+            result.removed = gone
+
+        result.seconds = time.perf_counter() - start
+        log.info("%s", result)
+        return result
+
+    def _store(self, info, existing, result):
+        path = info['path']
+        if 'error' in info:
+            result.failed[path] = info['error']
+            log.warning("cataloging %s failed: %s", path, info['error'])
+            return
+
+        now = time.time()
+        with self.db:
+            if info.get('unchanged'):
+                self.db.execute('UPDATE reports SET signature = ?, modified = ?, scanned = ? WHERE path = ?',
+                                (info['signature'], info['modified'], now, path))
+                result.unchanged.append(path)
+                return
+
+            # replacing the row drops everything under it (ON DELETE CASCADE)
+            self.db.execute('DELETE FROM reports WHERE path = ?', (path,))
+            report_id = self.db.execute(
+                'INSERT INTO reports (path, signature, sha256, modified, title, scanned) VALUES (?, ?, ?, ?, ?, ?)',
+                (path, info['signature'], info['sha256'], info['modified'], info['title'], now)).lastrowid
+
+            self.db.executemany('INSERT INTO properties VALUES (?, ?, ?, ?)',
+                                [(report_id,) + p for p in info['properties']])
+            self.db.executemany('INSERT INTO equipment VALUES (?, ?, ?, ?)',
+                                [(report_id,) + e for e in info['equipment']])
+
+            for test in info['tests']:
+                test_id = self.db.execute(
+                    'INSERT INTO tests (report_id, position, category, name, rows) VALUES (?, ?, ?, ?, ?)',
+                    (report_id, test['position'], test['category'], test['name'], test['rows'])).lastrowid
+                self.db.executemany('INSERT INTO conditions VALUES (?, ?, ?, ?)',
+                                    [(test_id,) + c for c in test['conditions']])
+                self.db.executemany('INSERT INTO combos VALUES (?, ?, ?)',
+                                    [(test_id, row, conditions) for row, conditions in test['combos'].items()])
+
+                for tag, kind, name, formula, cells in test['columns']:
+                    column_id = self.db.execute(
+                        'INSERT INTO columns (test_id, tag, kind, name, formula) VALUES (?, ?, ?, ?, ?)',
+                        (test_id, tag, kind, name, formula)).lastrowid
+                    if cells is None:
+                        continue
+                    rows, numbers, texts = cells
+                    numbers = [None if number != number else number for number in numbers.tolist()]
+                    self.db.executemany('INSERT INTO cells VALUES (?, ?, ?, ?)',
+                                        zip([column_id] * len(rows), rows.tolist(), numbers, texts))
+
+        (result.updated if existing else result.added).append(path)
+
+    # ----- Queries -----
+
+    def _frame(self, sql, params=()):
+        return pd.read_sql_query(sql, self.db, params=params)
+
+    def reports(self):
+        return self._frame('SELECT path, title, modified, scanned FROM reports ORDER BY path')
+
+    def tests(self, category: str = None, name: str = None):
+        sql = ('SELECT r.path, r.title, t.category, t.name, t.rows FROM tests t '
+               'JOIN reports r ON r.id = t.report_id WHERE 1=1')
+        params = []
+        if category is not None:
+            sql += ' AND t.category = ?'
+            params.append(category)
+        if name is not None:
+            sql += ' AND t.name = ?'
+            params.append(name)
+        return self._frame(sql + ' ORDER BY r.path, t.position', params)
+
+    def columns(self, kind: str = None):
+        """
+        Every column name in the catalog with how many tests have it.
+        """
+        sql = 'SELECT kind, name, COUNT(*) AS tests FROM columns'
+        params = []
+        if kind is not None:
+            sql += ' WHERE kind = ?'
+            params.append(kind)
+        return self._frame(sql + ' GROUP BY kind, name ORDER BY kind, name', params)
+
+    def query(self, column: str = None, test: str = None, category: str = None, kind: str = None,
+              properties: dict = None, equipment: dict = None, since=None, until=None,
+              expand_conditions: bool = True):
+        """
+        Stored cells as a long DataFrame: path, title, modified, category, test, column, kind, row,
+        value, plus one column per CC (or a single JSON 'conditions' column without expand_conditions).
+
+        column/test/category/kind match exactly. properties is {name: value} that the report's
+        general specifications / testing and review must have. equipment is {field: value} that
+        one of its equipment rows must have, or a list of those for several rows.
+        since/until bound the report's modification time (timestamp, date, datetime or ISO string).
+        """
+        sql = ['SELECT r.path, r.title, r.modified, t.category, t.name AS test, c.name AS "column", c.kind, '
+               'v.row, v.number, v.text, k.conditions FROM cells v '
+               'JOIN columns c ON c.id = v.column_id '
+               'JOIN tests t ON t.id = c.test_id '
+               'JOIN reports r ON r.id = t.report_id '
+               'LEFT JOIN combos k ON k.test_id = t.id AND k.row = v.row WHERE 1=1']
+        params = []
+
+        for field, value in (('c.name', column), ('t.name', test), ('t.category', category), ('c.kind', kind)):
+            if value is not None:
+                sql.append(f'AND {field} = ?')
+                params.append(value)
+        for name, value in (properties or {}).items():
+            sql.append('AND EXISTS (SELECT 1 FROM properties p WHERE p.report_id = r.id AND p.name = ? AND p.value = ?)')
+            params += [name, _text(value)]
+        if isinstance(equipment, dict):
+            equipment = [equipment]
+        for match in equipment or ():
+            # every field of a match has to be on the same equipment row
+            if not match:
+                continue
+            tables, where = ['equipment e0'], []
+            for i, (field, value) in enumerate(match.items()):
+                if i:
+                    tables.append(f'JOIN equipment e{i} ON e{i}.report_id = e0.report_id AND e{i}.row = e0.row')
+                where.append(f'e{i}.field = ? AND e{i}.value = ?')
+                params += [field, _text(value)]
+            sql.append(f"AND EXISTS (SELECT 1 FROM {' '.join(tables)} "
+                       f"WHERE e0.report_id = r.id AND {' AND '.join(where)})")
+        if since is not None:
+            sql.append('AND r.modified >= ?')
+            params.append(_timestamp(since))
+        if until is not None:
+            sql.append('AND r.modified < ?')
+            params.append(_timestamp(until))
+        sql.append('ORDER BY r.path, t.position, c.id, v.row')
+
+        with span('Catalog.query'):
+            frame = self._frame(' '.join(sql), params)
+
+        values = frame.pop('number').astype(object)
+        texts = frame.pop('text')
+        values[values.isna()] = texts[values.isna()]
+        frame['value'] = values
+        frame['modified'] = pd.to_datetime(frame['modified'], unit='s')
+
+        conditions = frame.pop('conditions')
+        if not expand_conditions:
+            frame['conditions'] = conditions
+        elif len(frame):
+            expanded = pd.DataFrame([json.loads(c) if c else {} for c in conditions], index=frame.index)
+            frame = pd.concat([frame, expanded], axis=1)
+        return frame
@@ -0,0 +1,808 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from model.combo_index import ComboIndex
+from model.units import is_placeholder, main_unit, parse_quantities, parse_quantity
+
+
+BLANK = ''
+
+
+def coerce_value(value):
+    """
+    Turns a cell value (usually a string from the sheet) into what gets stored.
+    Returns (number, None) for numbers, (nan, BLANK) for blanks and (nan, text) for anything else.
+    """
+    if value is None:
+        return math.nan, BLANK
+
+    if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+        value = float(value)
+        if math.isnan(value):
+            return math.nan, BLANK
+        return value, None
+
+    text = str(value).strip()
+    if text == '':
+        return math.nan, BLANK
+
+    try:
+        number = float(text)
+    except ValueError:
+        return math.nan, str(value)
+
+    if not math.isfinite(number):
+        return math.nan, str(value)
+    return number, None
+
+
+def format_number(number):
+    """
+    Text for a stored number the way it would be typed: 2.0 is '2', 1.2345678 stays
+    '1.2345678' (the shortest text that reads back as the same float).
+    """
+    number = float(number)
+    if number.is_integer() and abs(number) < 1e16:
+        return str(int(number))
+    return repr(number)
+
+
+def display_values(values):
+    """
+    Cells of a column as they're shown and written out: blanks and NaN as '', numbers
+    through format_number(), anything else as it is.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        return ['' if v != v else format_number(v) for v in values.tolist()]
+    return ['' if v is None or (isinstance(v, float) and v != v)
+            else format_number(v) if isinstance(v, (float, np.floating)) else v
+            for v in values.tolist()]
+
+
+class Column():
+    """
+    One result or specification column, a value per row of the grid of CC combos.
+
+    Only filled cells are stored: the grid rows that have one (sorted) and their values,
+    so an empty column costs nothing and memory follows the measured points rather than
+    the size of the grid. Once more than DENSE_FILL of the grid is filled, a value per
+    row (NaN/'' for blanks) is smaller than a row number plus a value per cell, and the
+    column switches to that.
+
+    Values are float64 while every value is a number. The first value that isn't a
+    number switches the column to an object array of python values, which keeps the text
+    as typed plus a numeric shadow of it: the number and unit each cell parses to ('3.3mV'
+    is 0.0033 in V, see model.units) and whether it's text that isn't one. The shadow is
+    updated with the cells it belongs to, never parsed again as a whole.
+
+    Cells belong to their combo of CC values rather than their row: when CCs are added,
+    removed or reordered, relayout() works out each cell's combo from the old grid and
+    moves it to that combo's row in the new one. Cells whose combo isn't in the new grid
+    are kept aside, as the CC values of each one, until a later grid has their combo again.
+    """
+    # fraction of the grid filled past which the column keeps a value per row
+    DENSE_FILL = 0.5
+
+    def __init__(self, values=(), index: ComboIndex = None, tags=()):
+        self._index = index if index is not None else ComboIndex([[i for i in range(len(values))]])
+        self._tags = tuple(tags) if index is not None else ('#',)
+
+        self._clear()
+        if len(values):
+            self.assign(values)
+
+    def _clear(self):
+        # nothing is allocated until a cell is filled
+        self._rows = np.empty(0, dtype=np.int64)    # sorted grid rows with a cell, None once dense
+        self._data = np.empty(0)                     # value per stored cell, or per row once dense
+        # numeric shadow of an object column, None while _data is numbers itself
+        self._numbers = None                         # number per value, NaN for blanks, text and placeholders
+        self._units = None                           # unit per value, None where there's no number
+        self._text = None                            # True for text that isn't a number or placeholder
+        # cells whose combo isn't in the grid: ({tag: CC value of each cell}, values), None if there are none
+        self._hidden = None
+
+    # ----- Sequence Behaviour -----
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+
+        slot = self._slot(self._check_row(row))
+        if slot < 0:
+            return BLANK
+        value = self._data[slot]
+        if self.is_numeric:
+            return BLANK if np.isnan(value) else float(value)
+        return value
+
+    def __setitem__(self, row, value):
+        self._set_row(self._check_row(row), value)
+
+    def __eq__(self, other):
+        if isinstance(other, Column):
+            other = other.tolist()
+        return self.tolist() == list(other)
+
+    def __repr__(self):
+        layout = 'dense' if self.is_dense else 'sparse'
+        return f"Column({self.dtype}, {layout}, {self.filled} of {len(self)} filled)"
+
+    def __getstate__(self):
+        # the shadow is rebuilt on load, so it doesn't go in the file
+        return {'index': self._index, 'tags': self._tags, 'rows': self._rows, 'data': self._data,
+                'hidden': self._hidden}
+
+    def __setstate__(self, state):
+        self._index = state['index']
+        self._tags = state['tags']
+
+        if 'keys' in state:
+            # saved when cells were stored by combo key, one tuple per cell
+            keys = state['keys']
+            cells = {}
+            for i, tag in enumerate(self._tags):
+                cells[tag] = np.empty(len(keys), dtype=object)
+                cells[tag][:] = [key[i] for key in keys]
+            self._place(cells, state['data'])
+            return
+
+        # saved without rows when columns were always a value per row
+        self._rows = state.get('rows')
+        self._data = state['data']
+        self._hidden = state.get('hidden')
+        self._numbers = self._units = self._text = None
+        if not self.is_numeric:
+            self._build_shadow()
+
+    def snapshot(self):
+        """
+        Copy of the stored cells that's only good for pickling, without the shadow.
+        """
+        column = Column.__new__(Column)
+        column._index = self._index
+        column._tags = self._tags
+        column._rows = None if self._rows is None else self._rows.copy()
+        column._data = self._data.copy()
+        column._numbers = column._units = column._text = None
+        # replaced as a whole by relayout(), never edited, so it can be shared
+        column._hidden = self._hidden
+        return column
+
+    def copy(self):
+        """
+        Independent copy, ready to be edited or put back in a store.
+        """
+        column = self.snapshot()
+        if not self.is_numeric:
+            column._numbers = self._numbers.copy()
+            column._units = self._units.copy()
+            column._text = self._text.copy()
+        return column
+
+    def _check_row(self, row):
+        size = len(self)
+        if row < 0:
+            row += size
+        if not 0 <= row < size:
+            raise IndexError(f"row {row} out of range for {size} rows")
+        return row
+
+    # ----- Storage -----
+
+    @property
+    def is_numeric(self):
+        return self._data.dtype.kind == 'f'
+
+    @property
+    def is_dense(self):
+        return self._rows is None
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    @property
+    def filled(self):
+        # number of stored cells, including ones whose combo isn't in the grid right now
+        hidden = len(self._hidden[1]) if self._hidden is not None else 0
+        stored = len(self._rows) if self._rows is not None else int(np.count_nonzero(self._filled()))
+        return stored + hidden
+
+    @property
+    def nbytes(self):
+        size = self._data.nbytes
+        if self._rows is not None:
+            size += self._rows.nbytes
+        if not self.is_numeric:
+            size += self._numbers.nbytes + self._units.nbytes + self._text.nbytes
+        if self._hidden is not None:
+            cells, values = self._hidden
+            size += values.nbytes + sum(array.nbytes for array in cells.values())
+        return size
+
+    @property
+    def unit(self):
+        """
+        Unit most of the cells are in, '' for plain numbers, None for an empty or all text column.
+        """
+        if self.is_numeric:
+            has_cells = len(self._rows) if self._rows is not None else self._filled().any()
+            return '' if has_cells else None
+        return main_unit(self._units)
+
+    @property
+    def has_text(self):
+        # any cell that isn't a number, a number with a unit or a placeholder
+        return not self.is_numeric and bool(self._text.any())
+
+    def _filled(self, start=0, stop=None):
+        # which rows have a cell, only for dense columns
+        data = self._data[start:stop]
+        return ~np.isnan(data) if self.is_numeric else data != BLANK
+
+    def _slot(self, row):
+        # where a row's value is in _data, -1 if a sparse column has no cell there
+        if self._rows is None:
+            return row
+        slot = int(np.searchsorted(self._rows, row))
+        return slot if slot < len(self._rows) and self._rows[slot] == row else -1
+
+    def _slots(self, rows):
+        # _slot() for an array of rows
+        if self._rows is None:
+            return rows
+        slots = np.searchsorted(self._rows, rows)
+        found = slots < len(self._rows)
+        found[found] = self._rows[slots[found]] == rows[found]
+        return np.where(found, slots, -1)
+
+    def _window_slots(self, start, stop):
+        # slots of a sparse column's cells in rows start:stop, and their rows relative to start
+        first, last = np.searchsorted(self._rows, [start, stop])
+        return slice(first, last), self._rows[first:last] - start
+
+    def _make_room(self, rows):
+        """
+        Adds blank slots to a sparse column for rows (sorted, none stored yet), keeping _rows sorted.
+        """
+        merged = np.concatenate([self._rows, rows])
+        order = np.argsort(merged, kind='stable')
+        self._rows = merged[order]
+        self._data = np.concatenate([self._data, _blanks(len(rows), self._data.dtype)])[order]
+        if not self.is_numeric:
+            numbers, units, text = _blank_shadow(len(rows))
+            self._numbers = np.concatenate([self._numbers, numbers])[order]
+            self._units = np.concatenate([self._units, units])[order]
+            self._text = np.concatenate([self._text, text])[order]
+
+    def _clear_rows(self, rows):
+        slots = self._slots(rows)
+        slots = slots[slots >= 0]
+        if not len(slots):
+            return
+
+        if self._rows is not None:
+            keep = np.ones(len(self._rows), dtype=bool)
+            keep[slots] = False
+            self._rows = self._rows[keep]
+            self._data = self._data[keep]
+            if not self.is_numeric:
+                self._numbers, self._units, self._text = self._numbers[keep], self._units[keep], self._text[keep]
+        elif self.is_numeric:
+            self._data[slots] = np.nan
+        else:
+            self._data[slots] = BLANK
+            self._numbers[slots], self._units[slots], self._text[slots] = np.nan, None, False
+
+    def _densify(self):
+        # once it's filled enough, a value per row is the smaller layout
+        if self._rows is None or len(self._rows) <= len(self._index) * self.DENSE_FILL:
+            return
+
+        rows = self._rows
+        size = len(self._index)
+        data = _blanks(size, self._data.dtype)
+        data[rows] = self._data
+        if not self.is_numeric:
+            numbers, units, text = _blank_shadow(size)
+            numbers[rows], units[rows], text[rows] = self._numbers, self._units, self._text
+            self._numbers, self._units, self._text = numbers, units, text
+        self._rows = None
+        self._data = data
+
+    def _to_numeric(self):
+        # back to float64 once every value is a plain number again, the shadow has them already
+        filled = self._units if self._rows is not None else self._units[self._filled()]
+        if not (filled == '').all():
+            return
+        self._data = self._numbers
+        self._numbers = self._units = self._text = None
+
+    def _to_object(self):
+        # the numbers so far are their own shadow
+        blank = np.isnan(self._data)
+        self._numbers = self._data.copy()
+        self._units = np.where(blank, None, '').astype(object)
+        self._text = np.zeros(len(self._data), dtype=bool)
+        self._data = self._data.astype(object)
+        self._data[blank] = BLANK
+
+    def _build_shadow(self):
+        self._numbers, self._units, self._text = _blank_shadow(len(self._data))
+        self._parse_slots(np.arange(len(self._data)) if self._rows is not None else np.flatnonzero(self._filled()))
+
+    def _parse_slots(self, slots):
+        # brings the shadow of some values up to date with them
+        self._numbers[slots], self._units[slots], self._text[slots] = parse_quantities(self._data[slots])
+
+    def get(self, key, default=BLANK):
+        """
+        Value stored for a combo key, whether or not that combo is in the grid.
+        """
+        key = tuple(key)
+        row = self._index.row(key) if len(key) == len(self._tags) else None
+        if row is not None:
+            value = self[row]
+            return default if isinstance(value, str) and value == BLANK else value
+
+        if self._hidden is not None and len(key) == len(self._tags):
+            cells, values = self._hidden
+            match = np.ones(len(values), dtype=bool)
+            for tag, value in zip(self._tags, key):
+                match &= cells[tag] == value
+            found = np.flatnonzero(match)
+            if len(found):
+                value = values[found[-1]]
+                return float(value) if values.dtype.kind == 'f' else value
+        return default
+
+    def items(self):
+        """
+        (combo key, value) for every stored cell.
+        """
+        cells, values, _ = self._cells()
+        keys = zip(*[cells[tag].tolist() for tag in self._tags]) if self._tags else [()] * len(values)
+        for key, value in zip(keys, values.tolist()):
+            yield key, value
+
+    def _set_row(self, row, value):
+        number, text = coerce_value(value)
+        if text is BLANK:
+            self._clear_rows(np.array([row], dtype=np.int64))
+            return
+
+        slot = self._slot(row)
+
+        if text is not None and self.is_numeric:
+            self._to_object()
+
+        if slot < 0:
+            self._make_room(np.array([row], dtype=np.int64))
+            slot = self._slot(row)
+
+        if self.is_numeric:
+            self._data[slot] = number
+        else:
+            self._data[slot] = number if text is None else text
+            self._numbers[slot], self._units[slot] = parse_quantity(self._data[slot])
+            self._text[slot] = self._units[slot] is None and not is_placeholder(text)
+        self._densify()
+
+    def set_rows(self, rows, values):
+        """
+        Stores values at many grid rows in one pass. Blank values are skipped rather than
+        clearing their cell, and cells at other rows are left alone. rows must not repeat.
+        Returns how many cells were written.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        numbers, blanks, text = _coerce_array(values)
+        return self._write(rows, numbers, blanks, text)
+
+    def take(self, rows):
+        """
+        Values at rows in the column's dtype, blanks included (NaN in a numeric column,
+        '' otherwise). put() writes them back.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        slots = self._slots(rows)
+        values = _blanks(len(rows), self._data.dtype)
+        found = slots >= 0
+        values[found] = self._data[slots[found]]
+        return values
+
+    def put(self, rows, values):
+        """
+        Writes values at rows like set_rows(), except blank values clear their cell.
+        Values take() got from a numeric column turn the column back to numbers if
+        nothing but numbers is left, so taking back a text edit puts the dtype back too.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        numbers, blanks, text = _coerce_array(values)
+        self._clear_rows(rows[blanks])
+        self._write(rows, numbers, blanks, text)
+        if isinstance(values, np.ndarray) and values.dtype.kind == 'f' and not self.is_numeric:
+            self._to_numeric()
+
+    def _write(self, rows, numbers, blanks, text):
+        # set_rows() with the values coerced already
+        filled = ~blanks
+        if not filled.all():
+            rows, numbers = rows[filled], numbers[filled]
+            text = text[filled] if text is not None else None
+        if not len(rows):
+            return 0
+
+        is_text = np.isnan(numbers) if text is not None else None
+        if is_text is not None and is_text.any() and self.is_numeric:
+            self._to_object()
+
+        slots = self._slots(rows)
+        if self._rows is not None:
+            new = slots < 0
+            if new.any():
+                self._make_room(np.sort(rows[new]))
+                slots = self._slots(rows)
+
+        if self.is_numeric:
+            self._data[slots] = numbers
+        else:
+            data = numbers.astype(object)
+            if is_text is not None:
+                data[is_text] = text[is_text]
+            self._data[slots] = data
+            self._parse_slots(slots)
+        self._densify()
+        return len(rows)
+
+    def filled_rows(self):
+        """
+        Grid rows that have a cell, in order.
+        """
+        return self._rows.copy() if self._rows is not None else np.flatnonzero(self._filled())
+
+    @property
+    def has_hidden(self):
+        # cells whose combo isn't in the grid right now
+        return self._hidden is not None
+
+    def relayout(self, index: ComboIndex, tags):
+        """
+        Moves the stored cells onto a new grid of CC values, O(filled cells) with no per-cell python.
+
+        Cells keep their values for CC tags that still exist. A new CC puts existing cells
+        at its first value. When a CC is removed, only the cells at its first value
+        are kept, since the others would all land on the same rows.
+        Cells whose combo isn't in the new grid are kept but hidden until it is again.
+        """
+        tags = tuple(tags)
+        if tags == self._tags and (index is self._index or index.value_lists == self._index.value_lists):
+            self._index = index
+            return
+
+        cells, values, shadow = self._cells()
+        old_tags = self._tags
+        old_lists = self._index.value_lists
+
+        keep = np.ones(len(values), dtype=bool)
+        for i, tag in enumerate(old_tags):
+            if tag not in tags:
+                first = old_lists[i][0] if i < len(old_lists) and old_lists[i] else None
+                keep &= cells[tag] == first
+
+        moved = {}
+        for i, tag in enumerate(tags):
+            if tag in cells:
+                moved[tag] = cells[tag][keep]
+            else:
+                moved[tag] = np.full(int(np.count_nonzero(keep)), None, dtype=object)
+                moved[tag][:] = index.value_lists[i][0] if index.value_lists[i] else None
+
+        if shadow is not None:
+            shadow = tuple(part[keep] for part in shadow)
+        self._index = index
+        self._tags = tags
+        self._place(moved, values[keep], shadow)
+
+    def _cells(self):
+        # every stored cell as ({tag: its CC value}, values, shadow or None)
+        if self._rows is not None:
+            rows, slots = self._rows, slice(None)
+        else:
+            rows = slots = np.flatnonzero(self._filled())
+
+        index = self._index
+        cells = {}
+        for i, tag in enumerate(self._tags):
+            lookup = np.empty(index.sizes[i], dtype=object)
+            lookup[:] = index.value_lists[i]
+            cells[tag] = lookup[(rows // index.strides[i]) % index.sizes[i]]
+
+        values = self._data[slots]
+        shadow = None if self.is_numeric else (self._numbers[slots], self._units[slots], self._text[slots])
+
+        if self._hidden is not None:
+            hidden_cells, hidden_values = self._hidden
+            for tag in self._tags:
+                cells[tag] = np.concatenate([cells[tag], hidden_cells[tag]])
+            values = np.concatenate([values, hidden_values])
+            if shadow is not None:
+                shadow = tuple(np.concatenate(parts) for parts in zip(shadow, parse_quantities(hidden_values)))
+
+        return cells, values, shadow
+
+    def _place(self, cells, values, shadow=None):
+        """
+        Lays cells out on the grid from their CC values ({tag: value of each cell}, in
+        self._tags). Cells whose combo isn't in the grid go in _hidden.
+        """
+        count = len(values)
+        placed = np.ones(count, dtype=bool)
+        codes = []
+        for tag, lookup in zip(self._tags, self._index.positions):
+            code = _positions(cells[tag], lookup)
+            placed &= code >= 0
+            codes.append(code)
+
+        if codes:
+            rows = self._index.rows_for([code[placed] for code in codes])
+        else:
+            rows = np.zeros(int(np.count_nonzero(placed)), dtype=np.int64)
+
+        # sorted by row, the last cell wins where repeated CC values put two on one row
+        picks = np.flatnonzero(placed)
+        order = np.argsort(rows, kind='stable')
+        rows = rows[order]
+        last = np.ones(len(rows), dtype=bool)
+        last[:-1] = rows[1:] != rows[:-1]
+        picks = picks[order[last]]
+
+        if shadow is not None:
+            shadow = tuple(part[picks] for part in shadow)
+        self._store(rows[last], values[picks], shadow)
+
+        hidden = ~placed
+        self._hidden = None
+        if hidden.any():
+            self._hidden = ({tag: cells[tag][hidden] for tag in self._tags}, values[hidden])
+
+    def _store(self, rows, values, shadow=None):
+        # replaces the cells with values at rows (sorted, no repeats)
+        self._rows = rows
+        self._data = values
+        self._numbers = self._units = self._text = None
+        if values.dtype == object:
+            if shadow is None:
+                self._build_shadow()
+            else:
+                self._numbers, self._units, self._text = shadow
+        self._densify()
+
+    def assign(self, values):
+        """
+        Replaces the whole column from one value per row, coercing every value in one pass.
+        """
+        numbers, blanks, text = _coerce_array(values)
+        count = min(len(self._index), len(numbers))
+        rows = np.flatnonzero(~blanks[:count])
+
+        self._clear()
+        if text is None:
+            self._store(rows, numbers[rows])
+            return
+
+        data = numbers[rows].astype(object)
+        is_text = np.isnan(numbers[rows])
+        data[is_text] = text[rows][is_text]
+        self._store(rows, data)
+
+    def resize(self, new_length: int):
+        # length always follows the combo index, kept for callers of the old list API
+        pass
+
+    # ----- Views -----
+
+    def tolist(self):
+        return self.to_array(blank=BLANK).tolist()
+
+    def _window(self, start, stop):
+        stop = len(self) if stop is None else min(stop, len(self))
+        return start, max(stop, start)
+
+    def numeric(self, start: int = 0, stop: int = None):
+        """
+        float64 values per row (or rows start:stop) with NaN for blanks, placeholders and text.
+        Numbers with a unit are scaled to it, straight from the shadow.
+        """
+        start, stop = self._window(start, stop)
+        source = self._data if self.is_numeric else self._numbers
+        if self._rows is None:
+            return source[start:stop].copy()
+
+        numbers = np.full(stop - start, np.nan)
+        slots, rows = self._window_slots(start, stop)
+        numbers[rows] = source[slots]
+        return numbers
+
+    def units(self, start: int = 0, stop: int = None):
+        """
+        Unit per row (or rows start:stop) for the cells numeric() has a number for, None elsewhere.
+        """
+        start, stop = self._window(start, stop)
+        if self._rows is None:
+            if self.is_numeric:
+                return np.where(np.isnan(self._data[start:stop]), None, '').astype(object)
+            return self._units[start:stop].copy()
+
+        units = np.full(stop - start, None, dtype=object)
+        slots, rows = self._window_slots(start, stop)
+        units[rows] = '' if self.is_numeric else self._units[slots]
+        return units
+
+    def missing(self, start: int = 0, stop: int = None):
+        start, stop = self._window(start, stop)
+        if self._rows is None:
+            return ~self._filled(start, stop)
+
+        missing = np.ones(stop - start, dtype=bool)
+        missing[self._window_slots(start, stop)[1]] = False
+        return missing
+
+    def to_array(self, blank=None, start: int = 0, stop: int = None):
+        """
+        Dense column (or rows start:stop of it) for the table: float64 with NaN blanks,
+        or objects with '' blanks.
+        """
+        start, stop = self._window(start, stop)
+
+        if self._rows is not None:
+            if self.is_numeric and blank is None:
+                values = np.full(stop - start, np.nan)
+            else:
+                values = np.full(stop - start, BLANK if blank is None else blank, dtype=object)
+            slots, rows = self._window_slots(start, stop)
+            values[rows] = self._data[slots]
+            return values
+
+        data = self._data[start:stop]
+        if self.is_numeric and blank is None:
+            return data.copy()
+
+        values = data.astype(object)
+        if blank is None:
+            blank = BLANK
+        if self.is_numeric or blank is not BLANK:
+            values[~self._filled(start, stop)] = blank
+        return values
+
+    def table_value(self, row):
+        """
+        Single value in the same form as to_array().
+        """
+        slot = self._slot(self._check_row(row))
+        if slot < 0:
+            return np.nan if self.is_numeric else BLANK
+        return self._data[slot]
+
+
+def _blanks(size, dtype):
+    # blank values of a column's dtype: NaN for numbers, '' for objects
+    if dtype.kind == 'f':
+        return np.full(size, np.nan)
+    return np.full(size, BLANK, dtype=object)
+
+
+def _blank_shadow(size):
+    return np.full(size, np.nan), np.full(size, None, dtype=object), np.zeros(size, dtype=bool)
+
+
+def _positions(values, lookup):
+    # position of each value in a CC's value list (lookup is value -> position), -1 if it isn't there
+    if not len(values):
+        return np.empty(0, dtype=np.int64)
+    if not lookup:
+        return np.full(len(values), -1, dtype=np.int64)
+    keys = pd.Index(list(lookup), dtype=object)
+    positions = np.array(list(lookup.values()), dtype=np.int64)
+    found = keys.get_indexer(pd.Index(values, dtype=object))
+    return np.where(found >= 0, positions[found], -1)
+
+
+def _coerce_array(values):
+    """
+    Coerces a list/array/Series of cell values at once.
+    Returns (numbers, blanks, text) where text is None if nothing needed to stay as text.
+    """
+    if isinstance(values, Column):
+        values = values.tolist()
+
+    if isinstance(values, (np.ndarray, pd.Series)) and values.dtype.kind in 'fiu':
+        # already numbers, NaN is blank (inf still goes the long way, it's kept as text)
+        numbers = np.array(values, dtype=float)
+        if not np.isinf(numbers).any():
+            return numbers, np.isnan(numbers), None
+
+    series = pd.Series(values, dtype=object) if not isinstance(values, pd.Series) else values.astype(object)
+    raw = series.to_numpy(dtype=object)
+
+    if len(raw) == 0:
+        return np.empty(0, dtype=float), np.empty(0, dtype=bool), None
+
+    stripped = series.map(lambda v: v.strip() if isinstance(v, str) else v)
+    blanks = stripped.isna().to_numpy() | (stripped == '').to_numpy()
+    numbers = np.array(pd.to_numeric(stripped.where(~blanks, None), errors='coerce'), dtype=float)
+    numbers[~np.isfinite(numbers)] = np.nan
+    numbers[blanks] = np.nan
+
+    text_rows = np.isnan(numbers) & ~blanks
+    text = None
+    if text_rows.any():
+        text = np.array([str(v) for v in raw], dtype=object)
+
+    return numbers, blanks, text
+
+
+class ColumnStore(dict):
+    """
+    name -> Column, all laid out on the same grid of CC combos.
+    Plain lists assigned into the store are converted to Columns (one value per row).
+    """
+    def __init__(self, columns=None, index: ComboIndex = None, tags=()):
+        super().__init__()
+        self.index = index if index is not None else ComboIndex([])
+        self.tags = tuple(tags)
+
+        for name, values in (columns or {}).items():
+            self[name] = values
+
+    def __setitem__(self, name, values):
+        if not isinstance(values, Column):
+            values = Column(values, self.index, self.tags)
+        elif values._tags == ('#',):
+            # a column built from a plain list, line its rows up with the grid
+            values = Column(values.to_array(blank=BLANK), self.index, self.tags)
+        elif values._index is not self.index or values._tags != self.tags:
+            values.relayout(self.index, self.tags)
+        super().__setitem__(name, values)
+
+    def __reduce__(self):
+        return (ColumnStore, (dict(self), self.index, self.tags))
+
+    def copy(self):
+        # same Column objects in a new store
+        store = ColumnStore(index=self.index, tags=self.tags)
+        dict.update(store, self)
+        return store
+
+    def snapshot(self):
+        store = ColumnStore(index=self.index, tags=self.tags)
+        for name, column in self.items():
+            dict.__setitem__(store, name, column.snapshot())
+        return store
+
+    def relayout(self, index: ComboIndex, tags):
+        """
+        Moves every column onto a new grid of CC combos, O(filled cells).
+        """
+        tags = tuple(tags)
+        if index is self.index and tags == self.tags:
+            return
+
+        self.index = index
+        self.tags = tags
+        for column in self.values():
+            column.relayout(index, tags)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.values())
@@ -0,0 +1,134 @@
+from collections.abc import Sequence
+from itertools import product
+from math import prod
+
+import numpy as np
+
+
+class ComboIndex(Sequence):
+    """
+    Maps row numbers to column condition combos (and back) without building the list of combos.
+
+    Rows follow itertools.product order, so the first column condition changes slowest.
+    Row r is the mixed-radix number whose digits are the value positions of each CC:
+        r = sum(position[i] * stride[i])    where stride[i] = prod(sizes[i + 1:])
+    """
+    def __init__(self, value_lists):
+        self.value_lists = [list(values) for values in value_lists]
+        self.sizes = [len(values) for values in self.value_lists]
+
+        # product of nothing is one empty combo, same as itertools.product()
+        self.size = prod(self.sizes)
+
+        self.strides = []
+        stride = 1
+        for size in reversed(self.sizes):
+            self.strides.insert(0, stride)
+            stride *= size
+
+        self._positions = None
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self.combo(r) for r in range(*row.indices(self.size))]
+        return self.combo(row)
+
+    def __iter__(self):
+        return product(*self.value_lists)
+
+    def __contains__(self, combo):
+        return self.row(combo) is not None
+
+    def __repr__(self):
+        return f"ComboIndex(sizes={self.sizes}, rows={self.size})"
+
+    @property
+    def positions(self):
+        # value -> position lookup for every CC, built on first use
+        if self._positions is None:
+            self._positions = []
+            for values in self.value_lists:
+                lookup = {}
+                for i, value in enumerate(values):
+                    lookup.setdefault(value, i)
+                self._positions.append(lookup)
+        return self._positions
+
+    def combo(self, row: int):
+        """
+        Returns the tuple of CC values for a row number.
+        """
+        if row < 0:
+            row += self.size
+        if not 0 <= row < self.size:
+            raise IndexError(f"row {row} out of range for {self.size} rows")
+
+        combo = []
+        for values, stride, size in zip(self.value_lists, self.strides, self.sizes):
+            combo.append(values[(row // stride) % size])
+        return tuple(combo)
+
+    def row(self, combo):
+        """
+        Returns the row number of a combo tuple, or None if it isn't in the grid.
+        """
+        if len(combo) != len(self.value_lists):
+            return None
+
+        row = 0
+        for value, lookup, stride in zip(combo, self.positions, self.strides):
+            position = lookup.get(value)
+            if position is None:
+                return None
+            row += position * stride
+        return row
+
+    def codes(self, i: int, start: int = 0, stop: int = None):
+        """
+        Value positions of CC number i for every row (or rows start:stop) as an int array.
+        """
+        stop = self.size if stop is None else min(stop, self.size)
+        size = self.sizes[i]
+        stride = self.strides[i]
+
+        if start == 0 and stop == self.size:
+            outer = self.size // (size * stride) if size else 0
+            return np.tile(np.repeat(np.arange(size), stride), outer)
+
+        rows = np.arange(start, stop)
+        return (rows // stride) % size
+
+    def column(self, i: int, start: int = 0, stop: int = None):
+        """
+        Values of CC number i for every row (or rows start:stop) as an array.
+        """
+        values = np.empty(self.sizes[i], dtype=object)
+        values[:] = self.value_lists[i]
+        return values[self.codes(i, start, stop)]
+
+    def combos(self, rows):
+        """
+        Combo tuples for an array of row numbers, one pass per CC instead of one per row.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if not self.value_lists:
+            return [()] * len(rows)
+
+        columns = []
+        for values, stride, size in zip(self.value_lists, self.strides, self.sizes):
+            lookup = np.empty(size, dtype=object)
+            lookup[:] = values
+            columns.append(lookup[(rows // stride) % size].tolist())
+        return list(zip(*columns))
+
+    def rows_for(self, codes):
+        """
+        Row numbers for a list of per-CC position arrays (one array per CC).
+        """
+        rows = np.zeros(len(codes[0]) if codes else 1, dtype=np.int64)
+        for code, stride in zip(codes, self.strides):
+            rows += np.asarray(code, dtype=np.int64) * stride
+        return rows
@@ -23,6 +23,12 @@ class CoverPage():
         new_row = pd.DataFrame([equipment])
         self.equipment_used = pd.concat([self.equipment_used, new_row], ignore_index=True)
     
+    def edit_equipment(self, index, field, value):
+        self.equipment_used.at[index, field] = value
+
+    def remove_equipment(self, index):
+        self.equipment_used = self.equipment_used.drop(self.equipment_used.index[index]).reset_index(drop=True)
+
     def add_general_specification(self, name, value):
         gs = {name: value}
         self.general_specifications[name] = value
\ No newline at end of file
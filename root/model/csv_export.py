@@ -0,0 +1,147 @@
+"""
+CSV export for TestReport.save_csv, written row by row from generators.
+
+Tables are never built whole: each test is computed EXPORT_CHUNK_ROWS rows at a
+time straight from its stored columns (Test.compute_columns), and tests that
+haven't been loaded from their archive are read into a throwaway copy, so the
+report doesn't keep them in memory afterwards.
+"""
+import csv
+import os
+import re
+import tempfile
+
+from model.column_store import display_values
+from model.report_archive import replace_file
+from utils.tracing import span
+
+
+EXPORT_CHUNK_ROWS = 10_000
+
+LONG_LAYOUT = 'long'
+TESTS_LAYOUT = 'tests'
+
+
+def _source(test):
+    # read a deferred test without keeping it loaded on the report
+    return test if test.loaded else test.snapshot()
+
+
+def iter_test_chunks(test, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    (column names, {name: list of cells}) for every chunk of rows in the test's table.
+    """
+    names = list(test.metadata.values())
+    total = len(test.combo_index)
+
+    for start in range(0, total, chunk_rows):
+        stop = min(start + chunk_rows, total)
+        columns = test.compute_columns(start, stop)
+        yield names, {name: display_values(columns[name]) for name in names if name in columns}
+
+
+def iter_test_rows(test, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    The test's table as CSV rows, header first.
+    """
+    yield list(test.metadata.values())
+
+    for names, cells in iter_test_chunks(test, chunk_rows):
+        yield from zip(*(cells.get(name, ['']) for name in names))
+
+
+def _iter_long_body(report, conditions, chunk_rows, skip_blank):
+    # every test is read once: CC names are added to conditions as tests come up, so a
+    # row only has slots for the CCs known so far (iter_long_rows pads the rest)
+    for test in report.tests:
+        source = _source(test)
+        cc_names = [name for tag, name in source.metadata.items() if tag.startswith('CC')]
+        value_names = [name for tag, name in source.metadata.items() if not tag.startswith('CC')]
+        for name in cc_names:
+            if name not in conditions:
+                conditions.append(name)
+        cc_slots = [conditions.index(name) for name in cc_names]
+        width = len(conditions)
+
+        with span('export_test', test=test.name):
+            for names, cells in iter_test_chunks(source, chunk_rows):
+                cc_cells = [cells[name] for name in cc_names]
+                value_cells = [(name, cells[name]) for name in value_names if name in cells]
+
+                for row in range(len(next(iter(cells.values()), ()))):
+                    prefix = [test.category, test.name] + [''] * width
+                    for slot, values in zip(cc_slots, cc_cells):
+                        prefix[2 + slot] = values[row]
+
+                    for name, values in value_cells:
+                        value = values[row]
+                        if skip_blank and value == '':
+                            continue
+                        yield prefix + [name, value]
+
+
+def iter_long_rows(report, chunk_rows: int = EXPORT_CHUNK_ROWS, skip_blank: bool = True):
+    """
+    One row per table cell: category, test, the row's CC values, column, value.
+    CCs a test doesn't have are left blank. Blank cells are skipped unless skip_blank is False.
+
+    The header needs every CC in the report, so the cells are spooled to a temporary
+    file while the tests are read and come back from it as text.
+    """
+    conditions = []
+    with tempfile.TemporaryFile('w+', newline='', encoding='utf-8') as body:
+        csv.writer(body).writerows(_iter_long_body(report, conditions, chunk_rows, skip_blank))
+        body.seek(0)
+
+        yield ['Category', 'Test'] + conditions + ['Column', 'Value']
+        for row in csv.reader(body):
+            missing = len(conditions) + 4 - len(row)
+            if missing:
+                row[-2:-2] = [''] * missing
+            yield row
+
+
+def _write_rows(filepath, rows):
+    temp_path = f"{filepath}.tmp"
+    with open(temp_path, 'w', newline='', encoding='utf-8') as file:
+        csv.writer(file).writerows(rows)
+    replace_file(temp_path, filepath)
+
+
+def test_filename(test):
+    # category and name, minus anything a filesystem won't take
+    name = f"{test.category} - {test.name}" if test.category else test.name
+    return re.sub(r'[<>:"/\\|?*\x00-\x1f]', '_', name).strip(' .') or 'test'
+
+
+def save_csv(report, filepath, layout: str = LONG_LAYOUT, chunk_rows: int = EXPORT_CHUNK_ROWS,
+             skip_blank: bool = True):
+    """
+    Writes the report as one long CSV (layout='long') or as one CSV per test in the
+    folder filepath (layout='tests'). Returns the paths written.
+    """
+    if layout == LONG_LAYOUT:
+        with span('save_csv', path=filepath, layout=layout):
+            _write_rows(filepath, iter_long_rows(report, chunk_rows, skip_blank))
+        return [filepath]
+
+    if layout != TESTS_LAYOUT:
+        raise ValueError(f"Unknown CSV layout '{layout}', expected '{LONG_LAYOUT}' or '{TESTS_LAYOUT}'.")
+
+    os.makedirs(filepath, exist_ok=True)
+    paths = []
+    used = set()
+    with span('save_csv', path=filepath, layout=layout):
+        for test in report.tests:
+            # tests can share a category and name
+            stem = test_filename(test)
+            name, n = stem, 1
+            while name.lower() in used:
+                n += 1
+                name = f"{stem} ({n})"
+            used.add(name.lower())
+
+            path = os.path.join(filepath, f"{name}.csv")
+            _write_rows(path, iter_test_rows(_source(test), chunk_rows))
+            paths.append(path)
+    return paths
@@ -0,0 +1,211 @@
+"""
+Bulk import of instrument/datalogger CSV logs into a test's result columns.
+
+The file is read IMPORT_CHUNK_ROWS lines at a time. Each line is matched to its row
+of the test by the values in its CC columns, through a hash lookup per CC (the
+same value -> position idea as ComboIndex), and the matched values are written
+into the Re columns a chunk at a time with Column.set_rows. Lines that don't match
+any combo, and lines for a combo that already had one, are counted and a few of
+each are kept as samples for the caller to show.
+
+Memory stays at about one chunk plus one flag per row of the test, plus a copy of
+each Re column written to (only its filled cells), kept until the import is done
+so a failure can put it back.
+"""
+import numpy as np
+import pandas as pd
+
+from model.column_store import coerce_value
+from utils.tracing import get_logger, span
+
+log = get_logger(__name__)
+
+
+IMPORT_CHUNK_ROWS = 100_000
+
+# what to do with a line whose combo was already imported
+KEEP_LAST = 'last'
+KEEP_FIRST = 'first'
+RAISE = 'error'
+DUPLICATE_POLICIES = (KEEP_LAST, KEEP_FIRST, RAISE)
+
+# unmatched/duplicate lines kept on the result for showing to the user
+SAMPLE_LINES = 20
+
+
+class ImportResult():
+    """
+    What an import did. Samples are (line number, CC values as read) for the first few lines.
+    """
+    def __init__(self, filepath, columns):
+        self.filepath = filepath
+        self.columns = columns      # csv header -> Re name
+
+        self.lines = 0
+        self.matched = 0
+        self.written = 0            # cells written, blank values aren't
+        self.unmatched = 0
+        self.duplicates = 0
+        self.unmatched_samples = []
+        self.duplicate_samples = []
+
+    def __repr__(self):
+        return (f"ImportResult({self.lines} lines, {self.matched} matched, {self.unmatched} unmatched, "
+                f"{self.duplicates} duplicates, {self.written} cells written)")
+
+
+class _ConditionLookup():
+    """
+    CC value -> position in the CC's value list. Text from the file matches a number
+    if it parses to the same number, so '25', '25.0' and 25 are all the same value.
+    """
+    def __init__(self, values):
+        numbers, texts = {}, {}
+        for position, value in enumerate(values):
+            number, text = coerce_value(value)
+            if text is None:
+                numbers.setdefault(number, position)
+            else:
+                texts.setdefault(str(value).strip(), position)
+
+        self.numbers = (pd.Index(list(numbers), dtype=float), np.array(list(numbers.values()), dtype=np.int64))
+        self.texts = (pd.Index(list(texts), dtype=object), np.array(list(texts.values()), dtype=np.int64))
+
+    def positions(self, column: pd.Series):
+        """
+        Position of every value in column, -1 where it isn't one of the CC's values.
+        """
+        positions = np.full(len(column), -1, dtype=np.int64)
+
+        index, found = self.numbers
+        if len(index):
+            # to_numeric takes care of surrounding spaces itself
+            hits = index.get_indexer(pd.to_numeric(column, errors='coerce').to_numpy(dtype=float))
+            positions[hits >= 0] = found[hits[hits >= 0]]
+
+        index, found = self.texts
+        missing = np.flatnonzero(positions < 0)
+        if len(index) and len(missing):
+            # only the lines that are left get stripped
+            text = column.iloc[missing].astype(str).str.strip().to_numpy(dtype=object)
+            hits = index.get_indexer(text)
+            positions[missing[hits >= 0]] = found[hits[hits >= 0]]
+
+        return positions
+
+
+def _blanks(values):
+    # the cells Column.set_rows would skip
+    values = pd.Series(values, dtype=object)
+    return values.isna().to_numpy() | values.astype(str).str.strip().eq('').to_numpy()
+
+
+def _sample(samples, lines, chunk, cc_headers, picks):
+    for i in picks[:SAMPLE_LINES - len(samples)]:
+        samples.append((int(lines[i]), tuple(chunk[header].iat[i] for header in cc_headers)))
+
+
+def import_csv(report, filepath, columns=None, conditions=None, duplicates: str = KEEP_LAST,
+               chunk_rows: int = IMPORT_CHUNK_ROWS, **read_options):
+    """
+    Imports a CSV log into the selected test's result columns.
+
+    conditions maps each CC name to the CSV header holding its values (default: the same name).
+    columns maps CSV headers to the Re columns they go into (default: every header that is
+    the name of an existing Re column). Values of a line go to the row whose CCs it matches.
+    duplicates says which line wins when several match the same row: 'last', 'first', or
+    'error' to raise. read_options go to pandas.read_csv (sep, encoding, ...).
+
+    Runs as one report batch, so the table is rebuilt once and a failure leaves the test as it
+    was. The rollback only copies the Re columns written to, the rest of the test isn't touched.
+    Returns an ImportResult.
+    """
+    if duplicates not in DUPLICATE_POLICIES:
+        raise ValueError(f"Unknown duplicates policy '{duplicates}', expected one of {DUPLICATE_POLICIES}.")
+
+    test = report.selected_test
+    if test is None:
+        raise ValueError("No test selected to import into.")
+
+    cc_names = [name for tag, name in test.metadata.items() if tag.startswith('CC')]
+    if conditions is None:
+        conditions = {}
+    cc_headers = [conditions.get(name, name) for name in cc_names]
+
+    header = pd.read_csv(filepath, nrows=0, **read_options).columns.tolist()
+    missing = [h for h in cc_headers if h not in header]
+    if missing:
+        raise ValueError(f"CSV is missing the condition column(s): {', '.join(map(str, missing))}")
+
+    if columns is None:
+        columns = {h: h for h in header if h in test.results}
+    else:
+        columns = dict(columns) if isinstance(columns, dict) else {h: h for h in columns}
+    unknown = [name for name in columns.values() if name not in test.results]
+    if unknown:
+        raise ValueError(f"Not result columns of '{test.name}': {', '.join(map(str, unknown))}")
+    absent = [h for h in columns if h not in header]
+    if absent:
+        raise ValueError(f"CSV has no column(s): {', '.join(map(str, absent))}")
+    if not columns:
+        raise ValueError("None of the CSV's columns match a result column.")
+
+    combos = test.combo_index
+    lookups = [_ConditionLookup(values) for values in combos.value_lists]
+    seen = np.zeros(len(combos), dtype=bool)
+    result = ImportResult(filepath, columns)
+
+    # CC values are matched as text (see _ConditionLookup), results are parsed by pandas
+    read_options['dtype'] = {**{h: str for h in cc_headers}, **read_options.get('dtype', {})}
+    reader = pd.read_csv(filepath, usecols=list(dict.fromkeys(cc_headers + list(columns))),
+                         chunksize=chunk_rows, keep_default_na=False, na_values=[''], **read_options)
+
+    with span('import_csv', path=filepath, test=test.name), report.batch():
+        for chunk in reader:
+            # line numbers in the file, the header is line 1
+            lines = np.arange(result.lines + 2, result.lines + 2 + len(chunk))
+            result.lines += len(chunk)
+
+            codes = [lookup.positions(chunk[h]) for lookup, h in zip(lookups, cc_headers)]
+            matched = np.ones(len(chunk), dtype=bool)
+            for code in codes:
+                matched &= code >= 0
+
+            unmatched = np.flatnonzero(~matched)
+            result.unmatched += len(unmatched)
+            _sample(result.unmatched_samples, lines, chunk, cc_headers, unmatched)
+
+            picks = np.flatnonzero(matched)
+            rows = combos.rows_for([code[picks] for code in codes]) if codes else np.zeros(len(picks), dtype=np.int64)
+            result.matched += len(picks)
+
+            # a line is a duplicate if an earlier line, in this chunk or before, matched the same row
+            _, first = np.unique(rows, return_index=True)
+            first = first[~seen[rows[first]]]
+            repeated = np.ones(len(rows), dtype=bool)
+            repeated[first] = False
+
+            duplicate_lines = picks[repeated]
+            result.duplicates += len(duplicate_lines)
+            _sample(result.duplicate_samples, lines, chunk, cc_headers, duplicate_lines)
+            if duplicates == RAISE and len(duplicate_lines):
+                line, values = result.duplicate_samples[0]
+                raise ValueError(f"Line {line} repeats conditions {values} of an earlier line.")
+
+            seen[rows] = True
+            if duplicates == KEEP_LAST:
+                # per column, the last line with a value for each row wins, overwriting what earlier
+                # chunks wrote. A blank in a later line doesn't take an earlier line's value away.
+                for h, name in columns.items():
+                    values = chunk[h].to_numpy()[picks]
+                    filled = np.flatnonzero(~_blanks(values))
+                    _, last = np.unique(rows[filled][::-1], return_index=True)
+                    keep = filled[np.sort(len(filled) - 1 - last)]
+                    result.written += report.set_Re_rows(name, rows[keep], values[keep])
+            else:
+                keep = np.sort(first)
+                for h, name in columns.items():
+                    result.written += report.set_Re_rows(name, rows[keep], chunk[h].to_numpy()[picks[keep]])
+
+    log.debug("%s", result)
+    return result
@@ -0,0 +1,99 @@
+class DependencyCycleError(ValueError):
+    pass
+
+
+class DependencyGraph():
+    """
+    Which columns each calculation (Ca) column reads, and the reverse.
+
+    Nodes are column names. Only calculations have outgoing edges, everything
+    else (CC, Re, Sp) is a source.
+    """
+    def __init__(self):
+        self.references = {}   # calculation name -> set of column names it reads
+        self.dependents = {}   # column name -> set of calculation names that read it
+
+    def __contains__(self, name):
+        return name in self.references
+
+    def set(self, name, references):
+        """
+        Sets the columns a calculation reads. Raises DependencyCycleError (and leaves
+        the graph unchanged) if that would make the calculation depend on itself.
+        """
+        references = set(references)
+
+        cycle = self._find_path(references, name)
+        if cycle is not None:
+            chain = ' -> '.join([name] + cycle)
+            raise DependencyCycleError(f"Circular reference: {chain}")
+
+        self.remove(name)
+        self.references[name] = references
+        for ref in references:
+            self.dependents.setdefault(ref, set()).add(name)
+
+    def remove(self, name):
+        for ref in self.references.pop(name, ()):
+            users = self.dependents.get(ref)
+            if users is not None:
+                users.discard(name)
+                if not users:
+                    del self.dependents[ref]
+
+    def _find_path(self, starts, target):
+        # depth first search through calculation references looking for target
+        stack = [(start, [start]) for start in starts]
+        seen = set()
+        while stack:
+            node, path = stack.pop()
+            if node == target:
+                return path
+            if node in seen:
+                continue
+            seen.add(node)
+            for ref in self.references.get(node, ()):
+                stack.append((ref, path + [ref]))
+        return None
+
+    def downstream(self, names):
+        """
+        Calculations affected by a change to any of names, in the order they have to be
+        evaluated. Calculations in names are included themselves.
+        """
+        affected = set()
+        stack = list(names)
+        while stack:
+            node = stack.pop()
+            if node in self.references and node not in affected:
+                affected.add(node)
+            for user in self.dependents.get(node, ()):
+                if user not in affected:
+                    stack.append(user)
+
+        return self.order(affected)
+
+    def order(self, names=None):
+        """
+        Topological order of the given calculations (all of them by default).
+        Ties keep the order the calculations were added in.
+        """
+        names = set(self.references) if names is None else set(names)
+        positions = {n: i for i, n in enumerate(self.references)}
+        position = lambda n: positions.get(n, len(positions))
+
+        ordered = []
+        done = set()
+
+        def visit(node):
+            if node in done:
+                return
+            done.add(node)
+            for ref in sorted(self.references.get(node, ()), key=position):
+                if ref in names:
+                    visit(ref)
+            ordered.append(node)
+
+        for name in sorted(names, key=position):
+            visit(name)
+        return ordered
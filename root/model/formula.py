@@ -0,0 +1,596 @@
+import ast
+import operator
+from functools import lru_cache, reduce
+
+import numpy as np
+import pandas as pd
+
+from model.units import is_placeholder, parse_quantities, parse_quantity
+
+
+ERR = '#ERR'
+
+# functions that can reference a column of the table
+REFERENCE_FUNCTIONS = ('CC', 'Re', 'Ca')
+
+# plain functions allowed inside a formula, all of them work on scalars and arrays
+FUNCTIONS = {
+    'abs': np.abs,
+    'round': np.round,
+    'sqrt': np.sqrt,
+    'exp': np.exp,
+    'log': np.log,
+    'log10': np.log10,
+    'sin': np.sin,
+    'cos': np.cos,
+    'tan': np.tan,
+    'min': lambda *args: reduce(np.minimum, args),
+    'max': lambda *args: reduce(np.maximum, args),
+}
+
+# functions over a group of rows, e.g. MEAN(Re('Ripple'), 'Vin') is the mean ripple of the
+# rows with the same Vin. See Aggregate.
+AGGREGATE_FUNCTIONS = ('MEAN', 'MIN', 'MAX', 'STD', 'FIRST', 'DELTA')
+
+BIN_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+    ast.Not: np.logical_not,
+}
+
+COMPARE_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+
+class FormulaError(ValueError):
+    pass
+
+
+class _NotVectorizable(Exception):
+    pass
+
+
+class _BlankCell(FormulaError):
+    # a row reading a blank cell, which has no value rather than an error
+    pass
+
+
+# ----- Expression Tree Nodes -----
+
+class Const():
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def evaluate(self, env):
+        return self.value
+
+
+class Ref():
+    __slots__ = ('kind', 'name')
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+
+    def evaluate(self, env):
+        return env.lookup(self.kind, self.name)
+
+
+class BinOp():
+    __slots__ = ('op', 'left', 'right')
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def evaluate(self, env):
+        return self.op(env.number(self.left.evaluate(env)), env.number(self.right.evaluate(env)))
+
+
+class UnaryOp():
+    __slots__ = ('op', 'operand')
+
+    def __init__(self, op, operand):
+        self.op = op
+        self.operand = operand
+
+    def evaluate(self, env):
+        value = self.operand.evaluate(env)
+        # 'not' takes anything, the signs only numbers
+        return self.op(value if self.op is np.logical_not else env.number(value))
+
+
+class Compare():
+    __slots__ = ('ops', 'operands')
+
+    def __init__(self, ops, operands):
+        self.ops = ops
+        self.operands = operands
+
+    def evaluate(self, env):
+        # a < b < c  ->  (a < b) & (b < c)
+        values = [node.evaluate(env) for node in self.operands]
+        results = [op(values[i], values[i + 1]) for i, op in enumerate(self.ops)]
+        return reduce(np.logical_and, results)
+
+
+class BoolOp():
+    __slots__ = ('op', 'values')
+
+    def __init__(self, op, values):
+        self.op = op
+        self.values = values
+
+    def evaluate(self, env):
+        return reduce(self.op, [node.evaluate(env) for node in self.values])
+
+
+class IfExp():
+    __slots__ = ('test', 'body', 'orelse')
+
+    def __init__(self, test, body, orelse):
+        self.test = test
+        self.body = body
+        self.orelse = orelse
+
+    def evaluate(self, env):
+        return np.where(self.test.evaluate(env), self.body.evaluate(env), self.orelse.evaluate(env))
+
+
+class Call():
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+
+    def evaluate(self, env):
+        return self.func(*[env.number(arg.evaluate(env)) for arg in self.args])
+
+
+class Aggregate():
+    """
+    FUNC(expression, 'CC', ...) -> the expression over the rows that share those CC values,
+    the same value on each of them. FUNC(expression, over='CC') groups by every other CC
+    instead, and FUNC(expression) takes the whole test. Blank cells are skipped, an #ERR or text
+    that isn't a number makes the whole group #ERR. DELTA is MAX - MIN, FIRST the first filled
+    value in table order.
+
+    The values come from the evaluation environment, which asks the test for them
+    (Test._aggregate) since they need every row, not just the ones being evaluated.
+    """
+    __slots__ = ('func', 'arg', 'by', 'over', 'key', 'inner')
+
+    def __init__(self, func, arg, by=(), over=None, source=''):
+        self.func = func
+        self.arg = arg
+        self.by = tuple(by)
+        self.over = None if over is None else tuple(over)
+        # the same aggregate in different formulas shares a cache entry
+        self.key = (func, source, self.by, self.over)
+        self.inner = CompiledFormula(f"={source}", arg)
+
+    def evaluate(self, env):
+        return env.aggregate(self)
+
+
+# ----- Parsing -----
+
+def _build(node):
+    """
+    Turns a python ast node into one of the expression tree nodes above.
+    Anything that isn't explicitly allowed raises a FormulaError.
+    """
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, (int, float, str, bool)):
+            return Const(node.value)
+
+    elif isinstance(node, ast.BinOp) and type(node.op) in BIN_OPS:
+        return BinOp(BIN_OPS[type(node.op)], _build(node.left), _build(node.right))
+
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPS:
+        return UnaryOp(UNARY_OPS[type(node.op)], _build(node.operand))
+
+    elif isinstance(node, ast.Compare) and all(type(op) in COMPARE_OPS for op in node.ops):
+        ops = [COMPARE_OPS[type(op)] for op in node.ops]
+        return Compare(ops, [_build(node.left)] + [_build(n) for n in node.comparators])
+
+    elif isinstance(node, ast.BoolOp):
+        op = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return BoolOp(op, [_build(n) for n in node.values])
+
+    elif isinstance(node, ast.IfExp):
+        return IfExp(_build(node.test), _build(node.body), _build(node.orelse))
+
+    elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in AGGREGATE_FUNCTIONS:
+        return _build_aggregate(node.func.id, node)
+
+    elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        func_name = node.func.id
+
+        if func_name in REFERENCE_FUNCTIONS:
+            if len(node.args) != 1 or not isinstance(node.args[0], ast.Constant) \
+                    or not isinstance(node.args[0].value, str):
+                raise FormulaError(f"{func_name}() takes a single quoted column name")
+            return Ref(func_name, node.args[0].value)
+
+        if func_name in FUNCTIONS:
+            return Call(FUNCTIONS[func_name], [_build(n) for n in node.args])
+
+        raise FormulaError(f"Unknown function: {func_name}")
+
+    raise FormulaError(f"Unsupported expression: {ast.dump(node)}")
+
+
+def _quoted_names(nodes):
+    if not all(isinstance(n, ast.Constant) and isinstance(n.value, str) for n in nodes):
+        return None
+    return [n.value for n in nodes]
+
+
+def _build_aggregate(func_name, node):
+    usage = f"{func_name}() takes a value and the quoted CC names to group by, e.g. {func_name}(Re('Iout'), 'Vin')"
+    if not node.args:
+        raise FormulaError(usage)
+
+    by = _quoted_names(node.args[1:])
+    if by is None:
+        raise FormulaError(usage)
+
+    over = None
+    for keyword in node.keywords:
+        if keyword.arg != 'over':
+            raise FormulaError(f"{func_name}() has no argument '{keyword.arg}'")
+        value = keyword.value
+        over = _quoted_names(value.elts if isinstance(value, (ast.List, ast.Tuple)) else [value])
+        if over is None:
+            raise FormulaError(f"{func_name}(over=...) takes a quoted CC name or a list of them")
+
+    if by and over is not None:
+        raise FormulaError(f"{func_name}() groups by CC names or over=, not both")
+
+    return Aggregate(func_name, _build(node.args[0]), by, over, ast.unparse(node.args[0]))
+
+
+def _collect_refs(node, refs):
+    if isinstance(node, Ref):
+        if (node.kind, node.name) not in refs:
+            refs.append((node.kind, node.name))
+        return
+
+    if isinstance(node, Aggregate):
+        for name in node.by + (node.over or ()):
+            if ('CC', name) not in refs:
+                refs.append(('CC', name))
+
+    for attr in node.__slots__:
+        child = getattr(node, attr)
+        children = child if isinstance(child, list) else [child]
+        for c in children:
+            if hasattr(c, '__slots__') and hasattr(c, 'evaluate'):
+                _collect_refs(c, refs)
+
+
+# ----- Evaluation Environments -----
+
+class _ColumnEnv():
+    """
+    Looks up whole columns as float arrays for the vectorized path.
+    """
+    def __init__(self, columns, num_rows, aggregates=None, numbers=None):
+        self.columns = columns
+        self.num_rows = num_rows
+        self.cache = {}
+        self.invalid = np.zeros(num_rows, dtype=bool)
+        # the invalid rows that are only invalid because they read a blank cell
+        self.blank = np.zeros(num_rows, dtype=bool)
+        # Aggregate.key -> its values for these rows
+        self.aggregates = aggregates or {}
+        # name -> already parsed numbers of a stored column, or None
+        self.numbers = numbers
+
+    def lookup(self, kind, name):
+        if name in self.cache:
+            return self.cache[name]
+
+        values = self.numbers(name) if self.numbers is not None else None
+        if values is not None:
+            # numeric shadow of a stored column, units already taken off and no text in it
+            missing = np.isnan(values)
+            self.invalid |= missing
+            self.blank |= missing
+            self.cache[name] = values
+            return values
+
+        if name not in self.columns:
+            raise _NotVectorizable(name)
+
+        raw = self.columns[name]
+        values = _to_float_array(raw)
+
+        # text that isn't a number can't take part in array math, let the row-wise path sort it out
+        missing = np.isnan(values)
+        if missing.any():
+            text = pd.Series(raw).to_numpy(dtype=object)[missing]
+            if any(not _is_blank(v) and v != ERR and not is_quantity(v) for v in text):
+                raise _NotVectorizable(name)
+            values = np.array(values)
+            values[missing] = parse_quantities(raw)[0][missing]
+            missing = np.isnan(values)
+
+        if missing.any():
+            rows = np.flatnonzero(missing)
+            text = pd.Series(raw).to_numpy(dtype=object)[rows]
+            self.blank[rows[[_is_blank(v) for v in text]]] = True
+        self.invalid |= missing
+        self.cache[name] = values
+        return values
+
+    def number(self, value):
+        # text only takes part in comparisons, 'x' * 3 is an error rather than 'xxx'
+        if isinstance(value, str):
+            raise FormulaError(f"'{value}' isn't a number")
+        return value
+
+    def aggregate(self, node):
+        values = self.aggregates.get(node.key)
+        if values is None:
+            raise FormulaError(f"{node.func}() needs the whole test to evaluate")
+        self.invalid |= np.isnan(values)
+        return values
+
+
+class _RowEnv():
+    """
+    Looks up single values for the row-wise fallback path.
+    """
+    def __init__(self, row):
+        self.row = row
+
+    def lookup(self, kind, name):
+        value = self.row.get(name, None)
+        if _is_blank(value):
+            # like the vectorized path, a row reading a blank cell has no value
+            raise _BlankCell(f"{name} is blank")
+        if value == ERR:
+            # errors carry through to anything calculated from them
+            raise FormulaError(f"{name} is an error")
+        if isinstance(value, str):
+            number, unit = parse_quantity(value)
+            return number if unit is not None else value
+        return value
+
+    number = _ColumnEnv.number
+
+    def aggregate(self, node):
+        # put in the row by CompiledFormula._evaluate_rows
+        value = self.row.get(node.key)
+        if value is None or np.isnan(value):
+            raise FormulaError(f"{node.func}() has no value for this row")
+        return value
+
+
+def is_quantity(value):
+    # a number with a prefix and/or unit, '3.3mV'
+    return isinstance(value, str) and parse_quantity(value)[1] is not None
+
+
+def _is_blank(value):
+    if value is None or (isinstance(value, str) and (value.strip() == '' or is_placeholder(value))):
+        return True
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def _aggregate_nodes(node, found):
+    # aggregates of this formula, not the ones nested inside them (those belong to the inner formula)
+    if isinstance(node, Aggregate):
+        found.append(node)
+        return
+    for attr in node.__slots__:
+        child = getattr(node, attr)
+        for c in child if isinstance(child, list) else [child]:
+            if hasattr(c, '__slots__') and hasattr(c, 'evaluate'):
+                _aggregate_nodes(c, found)
+
+
+def aggregate(func: str, values, groups):
+    """
+    func over values within each group, broadcast back to every row (see Aggregate).
+    values is a float array with NaN for blanks, groups an int group id per row.
+    """
+    grouped = pd.Series(values).groupby(groups, sort=False)
+    if func == 'DELTA':
+        result = grouped.transform('max') - grouped.transform('min')
+    else:
+        result = grouped.transform(AGGREGATE_METHODS[func])
+    return np.array(result.to_numpy(dtype=float))
+
+
+AGGREGATE_METHODS = {'MEAN': 'mean', 'MIN': 'min', 'MAX': 'max', 'STD': 'std', 'FIRST': 'first'}
+
+
+def _to_float_array(values):
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'f':
+        return values
+    return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
+
+
+# ----- Compiled Formula -----
+
+class CompiledFormula():
+    def __init__(self, formula: str, root):
+        self.formula = formula
+        self.root = root
+
+        self.references = []
+        _collect_refs(root, self.references)
+
+        self.aggregates = []
+        _aggregate_nodes(root, self.aggregates)
+
+    @property
+    def referenced_names(self):
+        return [name for _, name in self.references]
+
+    def evaluate(self, columns, num_rows: int, aggregates=None, start: int = 0, numbers=None):
+        """
+        Evaluates the formula over whole columns at once.
+        columns maps a column name to a list/array/Series of num_rows values, which are
+        rows start:start + num_rows of the test. aggregates(node) gives the values of an
+        Aggregate for every row of the test (see Test._aggregate). numbers(name) gives the
+        same rows of a column as floats when they're already parsed, None otherwise.
+        Falls back to evaluate_row for every row if the expression can't run on arrays.
+        """
+        resolved = self._resolve_aggregates(aggregates, start, num_rows)
+        env, result = self._evaluate_columns(columns, num_rows, resolved, numbers)
+        if env is None:
+            return self._evaluate_rows(columns, num_rows, resolved)
+
+        invalid = env.invalid
+        if result.dtype.kind == 'f':
+            invalid = invalid | ~np.isfinite(result)
+
+        if not invalid.any():
+            return np.array(result)
+
+        out = result.astype(object)
+        out[invalid] = ERR
+        return out
+
+    def evaluate_values(self, columns, num_rows: int, aggregates=None, numbers=None):
+        """
+        Like evaluate(), as (float values, errors) for aggregating over: values is NaN
+        where a row has no number, errors is True where that's because of an #ERR, a
+        value that isn't a number or math that failed. A row reading a blank cell is
+        NaN without being an error, so aggregates can skip it.
+        """
+        resolved = self._resolve_aggregates(aggregates, 0, num_rows)
+        env, result = self._evaluate_columns(columns, num_rows, resolved, numbers)
+        if env is None:
+            return self._evaluate_row_values(columns, num_rows, resolved)
+
+        values = np.array(result, dtype=float)
+        blank = env.blank
+        errors = (env.invalid & ~blank) | (~np.isfinite(values) & ~env.invalid)
+        values[env.invalid | errors] = np.nan
+        return values, errors
+
+    def _resolve_aggregates(self, aggregates, start, num_rows):
+        resolved = {}
+        if aggregates is not None:
+            for node in self.aggregates:
+                try:
+                    resolved[node.key] = aggregates(node)[start:start + num_rows]
+                except Exception:
+                    # unknown CC and the like, #ERR like any other formula that can't be evaluated
+                    resolved[node.key] = np.full(num_rows, np.nan)
+        return resolved
+
+    def _evaluate_columns(self, columns, num_rows, resolved, numbers=None):
+        # (env, result array) from the vectorized path, or (None, None) if it has to go row by row
+        env = _ColumnEnv(columns, num_rows, resolved, numbers)
+        try:
+            with np.errstate(all='ignore'):
+                result = self.root.evaluate(env)
+            result = np.broadcast_to(np.asarray(result), (num_rows,))
+        except Exception:
+            return None, None
+
+        if result.dtype.kind not in 'fiub':
+            return None, None
+        return env, result
+
+    def _records(self, columns, num_rows, aggregates=None):
+        frame = columns if isinstance(columns, pd.DataFrame) else pd.DataFrame(dict(columns))
+        records = frame.to_dict('records') if len(frame.columns) else [{} for _ in range(num_rows)]
+        for key, values in (aggregates or {}).items():
+            for record, value in zip(records, values.tolist()):
+                record[key] = value
+        return records
+
+    def _evaluate_rows(self, columns, num_rows, aggregates=None):
+        records = self._records(columns, num_rows, aggregates)
+        out = np.empty(num_rows, dtype=object)
+        for i in range(num_rows):
+            out[i] = self.evaluate_row(records[i])
+        return out
+
+    def _evaluate_row_values(self, columns, num_rows, aggregates=None):
+        records = self._records(columns, num_rows, aggregates)
+        values = np.full(num_rows, np.nan)
+        errors = np.zeros(num_rows, dtype=bool)
+        for i in range(num_rows):
+            try:
+                with np.errstate(all='ignore'):
+                    value = self.root.evaluate(_RowEnv(records[i]))
+            except _BlankCell:
+                continue
+            except Exception:
+                errors[i] = True
+                continue
+
+            if isinstance(value, (np.ndarray, np.generic)):
+                value = value.item()
+            if isinstance(value, (bool, int, float)) and np.isfinite(value):
+                values[i] = value
+            else:
+                # text, #ERR or inf
+                errors[i] = True
+        return values, errors
+
+    def evaluate_row(self, row):
+        """
+        Evaluates the formula for a single row (dict or Series of column name -> value).
+        """
+        try:
+            with np.errstate(all='ignore'):
+                value = self.root.evaluate(_RowEnv(row))
+        except Exception:
+            return ERR
+
+        if isinstance(value, np.ndarray):
+            value = value.item()
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, float) and not np.isfinite(value):
+            return ERR
+        return value
+
+
+@lru_cache(maxsize=512)
+def compile_formula(formula: str) -> CompiledFormula:
+    """
+    Parses a formula string like "=CC('Vin') * Re('Iout')" once into an expression tree.
+    Results are cached by formula string.
+    """
+    if not isinstance(formula, str) or not formula.startswith('='):
+        raise FormulaError(f"Formulas must start with '=': {formula}")
+
+    try:
+        tree = ast.parse(formula[1:].strip(), mode='eval')
+    except SyntaxError as e:
+        raise FormulaError(f"Invalid formula syntax: {formula}") from e
+
+    return CompiledFormula(formula, _build(tree.body))
@@ -0,0 +1,397 @@
+"""
+Undo/redo for report edits.
+
+Every @journaled TestReport call passes through here (see model.journal). Before the
+edit runs, the capture function for its op saves just what the edit is about to
+change, as the calls that would put it back. The calls have the same shape as
+journal records, (op, test position, args, kwargs), so undoing goes through the
+journaled methods and the journal stays right without a compaction.
+
+Nothing is deep copied. Columns the edit replaces or deletes are kept as they are,
+since nothing can change them once they're out of the test. Cells written in place
+only keep their old values at the rows written (Column.take), put back with set_cells.
+Undoing a cell or column edit patches those columns of the table, CC edits rebuild
+it like the edit itself did.
+
+Edits without a capture function (adding or removing tests) can't be undone and
+clear the history. Edits inside a batch become one step when it commits, and only
+clear the history then, since a rollback takes them back anyway.
+"""
+import copy
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from model.column_store import BLANK, Column, coerce_value
+from utils.tracing import get_logger
+
+log = get_logger(__name__)
+
+
+class Change():
+    """
+    One undo step: the calls that make it again and the calls that take it back.
+    """
+    __slots__ = ('forward', 'inverse', 'nbytes')
+
+    def __init__(self, forward, inverse):
+        self.forward = forward
+        self.inverse = inverse
+        self.nbytes = _nbytes(forward) + _nbytes(inverse)
+
+    def __repr__(self):
+        ops = ', '.join(op for op, *_ in self.forward)
+        return f"Change({ops}, {self.nbytes} bytes)"
+
+
+# capture() result for an edit that can't be undone
+IRREVERSIBLE = object()
+
+
+class History():
+    # oldest steps are dropped past either limit, the newest one is always kept
+    MAX_BYTES = 256 * 1024 * 1024
+    MAX_STEPS = 500
+
+    def __init__(self, max_bytes: int = None, max_steps: int = None):
+        self.max_bytes = self.MAX_BYTES if max_bytes is None else max_bytes
+        self.max_steps = self.MAX_STEPS if max_steps is None else max_steps
+
+        self.undo_stack = []
+        self.redo_stack = []
+        self.nbytes = 0
+
+        # undo_stack positions where open batches started, and whether each made an edit that can't be undone
+        self._holds = []
+        self._irreversible = []
+        self._paused = 0
+        self._redoing = False
+
+    def __repr__(self):
+        return f"History({len(self.undo_stack)} undo, {len(self.redo_stack)} redo, {self.nbytes} bytes)"
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def clear(self):
+        self.undo_stack = []
+        self.redo_stack = []
+        self.nbytes = 0
+        self._holds = [0] * len(self._holds)
+
+    # ----- Recording -----
+
+    def capture(self, report, op, position, args, kwargs):
+        """
+        Saves what op is about to change. Call before the edit, then push() the result after it.
+        """
+        if self._paused:
+            return None
+
+        capture = CAPTURES.get(op)
+        if capture is None:
+            return IRREVERSIBLE
+        try:
+            inverse = capture(report, position, *args, **kwargs)
+        except Exception:
+            # the edit itself is about to fail the same way, or can't be taken back
+            log.debug("couldn't capture %s for undo", op, exc_info=True)
+            return IRREVERSIBLE
+        return Change([(op, position, args, kwargs)], inverse)
+
+    def push(self, change):
+        if change is None:
+            return
+        if change is IRREVERSIBLE:
+            if self._holds:
+                # only clears the history if the batch commits, a rollback takes the edit back anyway
+                self._irreversible[-1] = True
+                return
+            log.debug("history cleared by an edit that can't be undone")
+            self.clear()
+            return
+
+        self.undo_stack.append(change)
+        self.nbytes += change.nbytes
+        if not self._redoing and self.redo_stack:
+            # a new edit, what was undone can't be redone on top of it
+            self.nbytes -= sum(step.nbytes for step in self.redo_stack)
+            self.redo_stack = []
+        self._trim()
+
+    def hold(self):
+        self._holds.append(len(self.undo_stack))
+        self._irreversible.append(False)
+
+    def release(self, commit: bool = True):
+        """
+        Ends a batch: its steps become one (commit) or are thrown away (rollback).
+        """
+        irreversible = self._irreversible.pop()
+        mark = min(self._holds.pop(), len(self.undo_stack))
+        if commit and irreversible and self._holds:
+            # up to the outer batch
+            self._irreversible[-1] = True
+        steps = self.undo_stack[mark:]
+        self.nbytes -= sum(step.nbytes for step in steps)
+        del self.undo_stack[mark:]
+        if commit and irreversible and not self._holds:
+            log.debug("history cleared by a batch with an edit that can't be undone")
+            self.clear()
+            return
+        if not commit or not steps:
+            return
+
+        # taken back last change first
+        forward = [record for step in steps for record in step.forward]
+        inverse = [record for step in reversed(steps) for record in step.inverse]
+        change = Change(forward, inverse)
+        self.undo_stack.append(change)
+        self.nbytes += change.nbytes
+        self._trim()
+
+    @contextmanager
+    def paused(self):
+        # edits made in here aren't recorded (undoing, replaying a journal)
+        self._paused += 1
+        try:
+            yield self
+        finally:
+            self._paused -= 1
+
+    @contextmanager
+    def redoing(self):
+        # edits made in here don't clear the redo stack
+        self._redoing = True
+        try:
+            yield self
+        finally:
+            self._redoing = False
+
+    def _trim(self):
+        # steps inside an open batch are needed to group it, so only older ones go
+        limit = min(self._holds) if self._holds else len(self.undo_stack) - 1
+        dropped = 0
+        while dropped < limit and (len(self.undo_stack) - dropped > self.max_steps
+                                   or self.nbytes > self.max_bytes):
+            self.nbytes -= self.undo_stack[dropped].nbytes
+            dropped += 1
+
+        if dropped:
+            log.debug("history over its limits, dropped the %d oldest steps", dropped)
+            del self.undo_stack[:dropped]
+            self._holds = [mark - dropped for mark in self._holds]
+
+    # ----- Undo / Redo -----
+
+    def pop_undo(self):
+        if not self.undo_stack:
+            return None
+        change = self.undo_stack.pop()
+        self.nbytes -= change.nbytes
+        return change
+
+    def push_redo(self, change):
+        # the inverse is captured again when it's redone
+        change = Change(change.forward, [])
+        self.redo_stack.append(change)
+        self.nbytes += change.nbytes
+
+    def pop_redo(self):
+        if not self.redo_stack:
+            return None
+        change = self.redo_stack.pop()
+        self.nbytes -= change.nbytes
+        return change
+
+
+def _nbytes(value):
+    # rough size of what a step keeps alive
+    if isinstance(value, Column):
+        return value.nbytes
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        return int(np.sum(value.memory_usage(index=False)))
+    if isinstance(value, (list, tuple, set)):
+        if len(value) > 1000:
+            # long lists of cell values, sized from the first few
+            sample = list(value)[:100] if isinstance(value, set) else value[:100]
+            return 8 * len(value) + sum(_nbytes(item) for item in sample) * len(value) // len(sample)
+        return 8 * len(value) + sum(_nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return 16 * len(value) + sum(_nbytes(item) for item in value.values())
+    if isinstance(value, str):
+        return len(value) + 49
+    return 32
+
+
+# ----- Captures -----
+# op -> function(report, test position, *args, **kwargs) returning the inverse records.
+# They run before the edit, so they see the state it's about to change.
+
+def _restore(position, **parts):
+    return ('_restore_test', position, (), parts)
+
+
+def _cells(position, name, column, rows):
+    # the values at rows as they are now, and the call that writes them back
+    rows = np.asarray(rows, dtype=np.int64)
+    return ('set_cells', position, (name, rows, column.take(rows)), {})
+
+
+def _capture_edit_Re_val(report, position, name, row, value):
+    column = report.tests[position].results[name]
+    if column.is_numeric and coerce_value(value)[1] not in (None, BLANK):
+        # text turns the whole column to objects, a number taken from it turns it back
+        return [_cells(position, name, column, [row])]
+    return [('edit_Re_val', position, (name, row, column[row]), {})]
+
+
+def _capture_set_Re_rows(report, position, name, rows, values):
+    return [_cells(position, name, report.tests[position].results[name], rows)]
+
+
+def _capture_set_cells(report, position, name, rows, values):
+    test = report.tests[position]
+    column = test.results[name] if name in test.results else test.specifications[name]
+    return [_cells(position, name, column, rows)]
+
+
+def _capture_add_Re(report, position, name=''):
+    test = report.tests[position]
+    return [_restore(position, metadata=dict(test.metadata), results={name: test.results.get(name)})]
+
+
+def _capture_edit_Re_name(report, position, col_tag, new_name):
+    test = report.tests[position]
+    old_name = test.metadata[col_tag]
+    inverse = [('edit_Re_name', position, (col_tag, old_name), {})]
+    if new_name != old_name and new_name in test.results:
+        # a column the rename wrote over
+        inverse.append(_restore(position, results={new_name: test.results[new_name]}))
+    return inverse
+
+
+def _capture_del_Re(report, position, col_tag):
+    test = report.tests[position]
+    name = test.metadata[col_tag]
+    return [_restore(position, metadata=dict(test.metadata), results={name: test.results.get(name)})]
+
+
+def _capture_layout(report, position, *args, **kwargs):
+    # adding and editing a CC moves the cells without losing any, putting the CCs back moves them back
+    test = report.tests[position]
+    return [_restore(position, metadata=dict(test.metadata),
+                     column_conditions=copy.deepcopy(test.column_conditions))]
+
+
+def _capture_del_CC(report, position, col_tag):
+    # cells at the CC's other values are dropped, they're written back once the CCs are
+    test = report.tests[position]
+    combos = test.combo_index
+    i = test._cc_tags().index(col_tag)
+    values = combos.value_lists[i]
+    kept = np.array([value == values[0] for value in values], dtype=bool)
+
+    parts = {'results': {}, 'specifications': {}}
+    cells = []
+    for kind, store in (('results', test.results), ('specifications', test.specifications)):
+        for name, column in store.items():
+            if column.has_hidden:
+                # cells off the grid have no row to be written back at
+                parts[kind][name] = column.copy()
+                continue
+            rows = column.filled_rows()
+            rows = rows[~kept[(rows // combos.strides[i]) % combos.sizes[i]]]
+            if len(rows):
+                cells.append(_cells(position, name, column, rows))
+
+    return [_restore(position, metadata=dict(test.metadata),
+                     column_conditions=copy.deepcopy(test.column_conditions), **parts)] + cells
+
+
+def _capture_add_Ca(report, position, name='', formula=''):
+    test = report.tests[position]
+    return [_restore(position, metadata=dict(test.metadata), calculations={name: test.calculations.get(name)})]
+
+
+def _capture_add_Sp(report, position, name='', specifications=None, limit=None):
+    test = report.tests[position]
+    return [_restore(position, metadata=dict(test.metadata),
+                     specifications={name: test.specifications.get(name)},
+                     spec_limits={name: test.spec_limits.get(name)})]
+
+
+def _capture_set_test_name(report, position, name):
+    return [('set_test_name', position, (report.tests[position].name,), {})]
+
+
+def _capture_set_cat_name(report, position, cat):
+    return [('set_cat_name', position, (report.tests[position].category,), {})]
+
+
+def _capture_rename_category(report, position, old_cat, new_cat):
+    # one call per test, renaming the category back would take tests that were already in new_cat too
+    return [('set_cat_name', report._test_position(test), (old_cat,), {})
+            for test in report.get_category_tests(old_cat)]
+
+
+def _capture_add_equipment(report, position, equipment):
+    # the new row goes at the end, nothing has it checked yet
+    return [('remove_equipment', position, (len(report.cover_page.equipment_used),), {})]
+
+
+def _capture_edit_equipment(report, position, index, field, value):
+    equipment = report.cover_page.equipment_used
+    old = equipment.at[index, field] if field in equipment.columns and index in equipment.index else ''
+    return [('edit_equipment', position, (index, field, old), {})]
+
+
+def _capture_equipment_rows(report, position, index, *args):
+    # removing a row renumbers every test's checked rows
+    return [('_restore_cover_page', position, (), {
+        'equipment_used': report.cover_page.equipment_used.copy(),
+        'checkbox_vars': {i: list(test.checkbox_vars) for i, test in enumerate(report.tests)},
+    })]
+
+
+def _capture_set_equipment_checked(report, position, index, checked=True):
+    return [('_restore_cover_page', position, (), {
+        'checkbox_vars': {position: list(report.tests[position].checkbox_vars)},
+    })]
+
+
+def _capture_add_general_specification(report, position, name, value):
+    return [('_restore_cover_page', position, (), {
+        'general_specifications': dict(report.cover_page.general_specifications),
+    })]
+
+
+CAPTURES = {
+    'edit_Re_val': _capture_edit_Re_val,
+    'set_Re_rows': _capture_set_Re_rows,
+    'set_cells': _capture_set_cells,
+    'add_Re': _capture_add_Re,
+    'edit_Re_name': _capture_edit_Re_name,
+    'del_Re': _capture_del_Re,
+    'add_CC': _capture_layout,
+    'edit_CC': _capture_layout,
+    'del_CC': _capture_del_CC,
+    'add_Ca': _capture_add_Ca,
+    'add_Sp': _capture_add_Sp,
+    'set_test_name': _capture_set_test_name,
+    'set_cat_name': _capture_set_cat_name,
+    'rename_category': _capture_rename_category,
+    'add_equipment': _capture_add_equipment,
+    'edit_equipment': _capture_edit_equipment,
+    'remove_equipment': _capture_equipment_rows,
+    'set_equipment_checked': _capture_set_equipment_checked,
+    'add_general_specification': _capture_add_general_specification,
+}
@@ -0,0 +1,191 @@
+"""
+Append-only edit log kept next to a report archive (report.trz -> report.trz.journal).
+
+Every TestReport method marked @journaled adds a record when it's called. Saving
+appends the records made since the last save, so a save costs about as much as
+the edits it writes. Now and then the report is compacted instead: the whole
+archive is rewritten and the journal starts over.
+
+File layout:
+
+    MAGIC, base id (16 bytes)           the archive write this journal applies to
+    [length, crc32, pickled record]...  record = (method name, selected test position, args, kwargs)
+
+A journal whose base id doesn't match the archive's is left over from before a
+compaction and gets ignored. Reading stops at the first damaged record, so a
+save that died halfway only loses its own records.
+"""
+import functools
+import os
+import pickle
+import struct
+import zlib
+
+from model.report_archive import replace_file
+from utils.tracing import get_logger, span
+
+log = get_logger(__name__)
+
+
+JOURNAL_SUFFIX = '.journal'
+MAGIC = b'TRGJ\x01\n'
+RECORD_HEADER = struct.Struct('<II')
+
+
+def journal_path(report_path):
+    return f"{report_path}{JOURNAL_SUFFIX}"
+
+
+def journaled(method):
+    """
+    Marks a TestReport method as an edit worth keeping. The call bumps the report's
+    revision and is recorded with the test that was selected beforehand so replaying
+    it hits the same test. The report's undo history gets to look first (see model.history).
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        journal = self._journal
+        history = self._history
+        if journal is None and history is None:
+            result = method(self, *args, **kwargs)
+            self._revision += 1
+            return result
+
+        position = self._test_position(self.selected_test)
+        change = history.capture(self, name, position, args, kwargs) if history is not None else None
+        result = method(self, *args, **kwargs)
+        self._revision += 1
+        if journal is not None:
+            journal.record(name, position, args, kwargs)
+        if history is not None:
+            history.push(change)
+        return result
+    return wrapper
+
+
+class Journal():
+    # compact once the journal is bigger than this many bytes, or this fraction of the archive
+    COMPACT_BYTES = 8 * 1024 * 1024
+    COMPACT_RATIO = 0.5
+
+    def __init__(self, filepath, base_id: bytes):
+        self.filepath = filepath
+        self.base_id = base_id
+
+        # records made since the last flush
+        self.pending = []
+        # pending positions where open batches started, records after these can still be rolled back
+        self._holds = []
+
+        # no filepath means the report hasn't been saved to an archive yet and the
+        # records are just being collected
+        self.size = os.path.getsize(filepath) if filepath and os.path.exists(filepath) else 0
+
+    def __repr__(self):
+        return f"Journal({self.filepath!r}, {len(self.pending)} pending, {self.size} bytes)"
+
+    # ----- Writing -----
+
+    def start(self):
+        """
+        Starts an empty journal, replacing whatever was there.
+        """
+        temp_path = f"{self.filepath}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(MAGIC + self.base_id)
+            file.flush()
+            os.fsync(file.fileno())
+        replace_file(temp_path, self.filepath)
+
+        self.size = len(MAGIC) + len(self.base_id)
+        self.pending = []
+        self._holds = [0] * len(self._holds)
+
+    def record(self, op, position, args, kwargs):
+        self.pending.append(pickle.dumps((op, position, args, kwargs), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def hold(self):
+        self._holds.append(len(self.pending))
+
+    def release(self, commit: bool = True):
+        mark = self._holds.pop()
+        if not commit:
+            del self.pending[mark:]
+
+    def take(self):
+        """
+        Removes and returns the pending records that are ready to write. Records made
+        inside an open batch stay pending until it commits.
+        """
+        count = self._holds[0] if self._holds else len(self.pending)
+        records = self.pending[:count]
+        del self.pending[:count]
+        self._holds = [mark - count for mark in self._holds]
+        return records
+
+    def write(self, records):
+        """
+        Appends records from take() to the file. Safe to call from another thread.
+        """
+        if not records:
+            return 0
+
+        chunks = []
+        for data in records:
+            chunks.append(RECORD_HEADER.pack(len(data), zlib.crc32(data)))
+            chunks.append(data)
+        blob = b''.join(chunks)
+
+        with span('Journal.write', records=lambda: len(records), bytes=lambda: len(blob)), open(self.filepath, 'ab') as file:
+            file.write(blob)
+            file.flush()
+            os.fsync(file.fileno())
+
+        self.size += len(blob)
+        return len(records)
+
+    def flush(self):
+        return self.write(self.take())
+
+    def should_compact(self, archive_size: int):
+        return self.size > max(self.COMPACT_BYTES, archive_size * self.COMPACT_RATIO)
+
+    # ----- Reading -----
+
+    def read(self):
+        """
+        The records on disk as (op, position, args, kwargs). Empty if the journal is
+        missing or belongs to another base. A damaged tail is cut off the file.
+        """
+        if not os.path.exists(self.filepath):
+            return []
+
+        with open(self.filepath, 'rb') as file:
+            content = file.read()
+
+        header = MAGIC + self.base_id
+        if not content.startswith(header):
+            log.info("ignoring journal %s, it belongs to another save", self.filepath)
+            return []
+
+        records = []
+        offset = len(header)
+        while offset + RECORD_HEADER.size <= len(content):
+            length, crc = RECORD_HEADER.unpack_from(content, offset)
+            start = offset + RECORD_HEADER.size
+            data = content[start:start + length]
+            if len(data) != length or zlib.crc32(data) != crc:
+                break
+            records.append(pickle.loads(data))
+            offset = start + length
+
+        if offset != len(content):
+            log.warning("journal %s has %d damaged bytes at the end, dropping them",
+                        self.filepath, len(content) - offset)
+            with open(self.filepath, 'r+b') as file:
+                file.truncate(offset)
+
+        self.size = offset
+        return records
@@ -0,0 +1,330 @@
+"""
+LaTeX / PDF output for TestReport.save_latex_pdf.
+
+The report is split into fragments: the cover page and one section per test.
+Each fragment is keyed by a hash of everything that goes into it, looked up in
+an on-disk cache, and only the misses are rendered, in parallel across a process
+pool. A test's part of the key is its Test.content_key(), which the model keeps, so
+a fully cached report doesn't read or pickle any test. The fragments are put together into one document which a TeX engine,
+found on PATH, compiles in a subprocess with a timeout.
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model.column_store import format_number
+from model.report_archive import replace_file
+from model.test_model import Test
+from utils.tracing import get_logger, span
+
+log = get_logger(__name__)
+
+
+# bump when the LaTeX a fragment renders to changes, so cached fragments aren't reused
+RENDER_VERSION = 1
+
+TEX_ENGINES = ('pdflatex', 'xelatex', 'lualatex')
+COMPILE_TIMEOUT = 300
+
+# below this many fragments to render, starting a process pool costs more than it saves
+POOL_MIN_FRAGMENTS = 3
+
+PREAMBLE = r"""\documentclass[10pt]{article}
+\usepackage[margin=0.75in]{geometry}
+\usepackage[T1]{fontenc}
+\usepackage{longtable}
+\usepackage{booktabs}
+\usepackage{textcomp}
+\setlength{\LTcapwidth}{\textwidth}
+\begin{document}
+"""
+
+_LATEX_SPECIALS = {
+    '\\': r'\textbackslash{}', '&': r'\&', '%': r'\%', '$': r'\$', '#': r'\#', '_': r'\_',
+    '{': r'\{', '}': r'\}', '~': r'\textasciitilde{}', '^': r'\textasciicircum{}',
+    '±': r'$\pm$', '≤': r'$\leq$', '≥': r'$\geq$', '°': r'\textdegree{}', 'µ': r'\textmu{}',
+    'Ω': r'$\Omega$',
+}
+_LATEX_PATTERN = re.compile('|'.join(re.escape(c) for c in _LATEX_SPECIALS))
+
+
+class LatexError(RuntimeError):
+    pass
+
+
+def latex_escape(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        value = '' if value != value else format_number(value)
+    return _LATEX_PATTERN.sub(lambda m: _LATEX_SPECIALS[m.group()], str(value))
+
+
+def _tabular(headers, rows, long: bool = True, columns: int = None):
+    """
+    A booktabs table. longtable for anything that may run over a page.
+    headers=None leaves out the header row (give the number of columns instead).
+    """
+    columns = len(headers) if headers else columns
+    spec = 'l' * max(columns, 1)
+    env = 'longtable' if long else 'tabular'
+    size = r'\footnotesize' if columns > 8 else r'\small'
+
+    lines = [f"{{{size}", f"\\begin{{{env}}}{{{spec}}}", r"\toprule"]
+    if headers:
+        lines += [' & '.join(rf"\textbf{{{latex_escape(h)}}}" for h in headers) + r' \\', r"\midrule"]
+    if long:
+        lines += [r"\endhead"]
+    for row in rows:
+        lines.append(' & '.join(latex_escape(v) for v in row) + r' \\')
+    lines += [r"\bottomrule", f"\\end{{{env}}}", "}"]
+    return '\n'.join(lines)
+
+
+# ----- Fragments -----
+# these run in worker processes, so they take and return plain picklable data
+
+def render_cover_page(payload):
+    title, equipment_headers, equipment_rows, specifications, review = payload
+
+    parts = [rf"\begin{{center}}{{\LARGE\bfseries {latex_escape(title)}}}\end{{center}}", r"\vspace{1em}"]
+
+    if review:
+        parts.append(r"\section*{Testing and Review}")
+        parts.append(_tabular(None, list(review.items()), long=False, columns=2))
+
+    if specifications:
+        parts.append(r"\section*{General Specifications}")
+        parts.append(_tabular(['Specification', 'Value'], list(specifications.items())))
+
+    if equipment_rows:
+        parts.append(r"\section*{Equipment Used}")
+        parts.append(_tabular(equipment_headers, equipment_rows))
+
+    parts.append(r"\clearpage")
+    return '\n\n'.join(parts)
+
+
+def render_test(payload):
+    category, name, state, equipment_headers, equipment_rows = payload
+
+    test = Test.__new__(Test)
+    test.__setstate__(pickle.loads(state))
+
+    parts = [rf"\section{{{latex_escape(name)}}}"]
+    if category:
+        parts.append(rf"\textit{{Category: {latex_escape(category)}}}\par\medskip")
+
+    if test.spec_limits:
+        counts = test.pass_fail_counts()
+        parts.append(rf"\textbf{{Pass:}} {counts['pass']} \quad \textbf{{Fail:}} {counts['fail']} "
+                     rf"\quad \textbf{{Untested:}} {counts['untested']}\par\medskip")
+
+    headers = list(test.metadata.values())
+    if headers and len(test.combo_index):
+        columns = test.compute_columns()
+        cells = []
+        for header in headers:
+            values = columns.get(header, [''] * len(test.combo_index))
+            values = np.asarray(values)
+            cells.append(values.tolist())
+        parts.append(_tabular(headers, zip(*cells)))
+    else:
+        parts.append(r"\textit{No data.}")
+
+    checked = [equipment_rows[i] for i in sorted(getattr(test, 'checkbox_vars', [])) if 0 <= i < len(equipment_rows)]
+    if checked:
+        parts.append(r"\subsection*{Equipment Used}")
+        parts.append(_tabular(equipment_headers, checked, long=False))
+
+    return '\n\n'.join(parts)
+
+
+def _render(job):
+    kind, payload = job
+    return render_cover_page(payload) if kind == 'cover' else render_test(payload)
+
+
+# ----- Cache -----
+
+class FragmentCache():
+    """
+    Rendered fragments on disk, one file per content hash.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.tex")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, text):
+        os.makedirs(self.folder, exist_ok=True)
+        # several processes can share a cache folder
+        temp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        replace_file(temp_path, self._path(key))
+
+
+def _key(kind, content):
+    # content is plain lists, dicts and scalars in a fixed order, so the key is the
+    # same in every process whatever PYTHONHASHSEED is
+    digest = hashlib.sha256(f"{kind}:{RENDER_VERSION}:".encode())
+    digest.update(json.dumps(content, default=repr).encode())
+    return digest.hexdigest()
+
+
+def _test_state(test):
+    """
+    Pickled state for the worker. A test that was never loaded sends the bytes its
+    archive stores, the report doesn't load it.
+    """
+    if test.loaded:
+        return pickle.dumps(test.__getstate__(), protocol=pickle.HIGHEST_PROTOCOL)
+    return test.__dict__['_loader'].read()
+
+
+def _equipment(cover_page):
+    table = cover_page.equipment_used
+    headers = [str(c) for c in table.columns]
+    rows = table.astype(object).where(table.notna(), '').values.tolist()
+    return headers, rows
+
+
+def fragment_jobs(report):
+    """
+    (key, kind, make_payload) for the cover page and every test, in document order.
+    make_payload() gives what the worker renders from, and is only called for misses.
+    """
+    equipment_headers, equipment_rows = _equipment(report.cover_page)
+    cover = (report.title, equipment_headers, equipment_rows,
+             dict(report.cover_page.general_specifications), dict(report.cover_page.testing_and_review))
+    jobs = [(_key('cover', cover), 'cover', lambda: cover)]
+
+    for test in report.tests:
+        # which equipment rows a test uses (checkbox_vars) is in its state, so the worker picks them out
+        key = _key('test', [test.category, test.name, test.content_key(), equipment_headers, equipment_rows])
+        payload = lambda test=test: (test.category, test.name, _test_state(test), equipment_headers, equipment_rows)
+        jobs.append((key, 'test', payload))
+
+    return jobs
+
+
+def render_fragments(report, cache: FragmentCache = None, jobs: int = None):
+    """
+    LaTeX for each fragment of the report, rendering only the ones not in the cache.
+    """
+    fragment_list = fragment_jobs(report)
+    texts = {}
+    missing = []
+    for key, kind, make_payload in fragment_list:
+        cached = cache.get(key) if cache is not None else None
+        if cached is None:
+            missing.append((key, kind, make_payload))
+        else:
+            texts[key] = cached
+
+    with span('render_fragments', total=lambda: len(fragment_list), rendered=lambda: len(missing)):
+        work = [(kind, make_payload()) for _, kind, make_payload in missing]
+        if len(work) >= POOL_MIN_FRAGMENTS and jobs != 1:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                rendered = list(pool.map(_render, work))
+        else:
+            rendered = [_render(job) for job in work]
+
+    for (key, _, _), text in zip(missing, rendered):
+        texts[key] = text
+        if cache is not None:
+            cache.put(key, text)
+
+    log.debug("rendered %d of %d fragments", len(missing), len(fragment_list))
+    return [texts[key] for key, _, _ in fragment_list]
+
+
+# ----- Document / Compile -----
+
+def build_document(fragments):
+    return PREAMBLE + '\n\n'.join(fragments) + '\n\\end{document}\n'
+
+
+def find_tex_engine(engine: str = None):
+    """
+    Path of the TeX engine to compile with (engine if given, otherwise the first of TEX_ENGINES on PATH).
+    """
+    candidates = (engine,) if engine else TEX_ENGINES
+    for candidate in candidates:
+        path = shutil.which(candidate)
+        if path:
+            return path
+    raise LatexError(f"No TeX engine found (looked for {', '.join(candidates)}). "
+                     "Install a TeX distribution such as TeX Live or MiKTeX, or save as .tex instead.")
+
+
+def compile_pdf(tex, filepath, engine: str = None, timeout: float = COMPILE_TIMEOUT):
+    """
+    Compiles a LaTeX document to the PDF filepath in a throwaway folder.
+    Runs the engine twice so longtable column widths settle.
+    """
+    engine_path = find_tex_engine(engine)
+
+    with tempfile.TemporaryDirectory(prefix='trg-latex-') as folder:
+        tex_path = os.path.join(folder, 'report.tex')
+        with open(tex_path, 'w', encoding='utf-8') as file:
+            file.write(tex)
+
+        command = [engine_path, '-interaction=nonstopmode', '-halt-on-error', 'report.tex']
+        for run in range(2):
+            try:
+                with span('compile_pdf', engine=lambda: os.path.basename(engine_path), run=run):
+                    result = subprocess.run(command, cwd=folder, stdin=subprocess.DEVNULL,
+                                            capture_output=True, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                raise LatexError(f"{os.path.basename(engine_path)} took longer than {timeout}s, gave up.") from None
+
+            if result.returncode != 0:
+                output = result.stdout.decode('utf-8', 'replace')
+                errors = [line for line in output.splitlines() if line.startswith('!')]
+                detail = '\n'.join(errors) or output[-2000:]
+                raise LatexError(f"{os.path.basename(engine_path)} failed:\n{detail}")
+
+        temp_path = f"{filepath}.tmp"
+        shutil.copyfile(os.path.join(folder, 'report.pdf'), temp_path)
+        replace_file(temp_path, filepath)
+
+
+def render_report(report, filepath, engine: str = None, jobs: int = None, cache_dir: str = None,
+                  timeout: float = COMPILE_TIMEOUT):
+    """
+    Renders report to filepath: a PDF, or just the LaTeX source if filepath ends in .tex.
+    Fragments are cached in cache_dir (by default a .latex_cache folder next to filepath).
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(filepath)), '.latex_cache')
+
+    with span('render_report', path=filepath, tests=lambda: len(report.tests)):
+        tex = build_document(render_fragments(report, FragmentCache(cache_dir), jobs))
+
+        if str(filepath).lower().endswith('.tex'):
+            temp_path = f"{filepath}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                file.write(tex)
+            replace_file(temp_path, filepath)
+        else:
+            compile_pdf(tex, filepath, engine, timeout)
+
+    return filepath
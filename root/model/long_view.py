@@ -0,0 +1,168 @@
+"""
+Report-wide long-format view: one row per non-blank result/calculation cell of every test.
+
+    category, test, <one column per CC name>, row, column, kind, value, text, status
+
+value is the cell as a float (NaN for text and #ERR), text is set only for cells
+that aren't numbers. status is the row's spec result: 'fail' if any spec limit
+fails on the row, 'pass' if one passes and none fail, 'untested' if the test has
+limits but none could be checked, and blank if the test has no limits.
+
+Each test builds and caches its own slice (Test.long_slice, dropped on any change
+to that test), the report view is those slices concatenated. filter_view() works on
+the whole view with boolean masks.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+VALUE_KINDS = ('Re', 'Ca')
+STATUSES = ('', 'pass', 'fail', 'untested')
+
+FIXED_COLUMNS = ['category', 'test', 'row', 'column', 'kind', 'value', 'text', 'status']
+
+
+def _row_status(test, num_rows):
+    codes = np.zeros(num_rows, dtype=np.int8)
+    masks = test.spec_masks()
+    if not masks:
+        return codes
+
+    passed = np.zeros(num_rows, dtype=bool)
+    failed = np.zeros(num_rows, dtype=bool)
+    for spec_passed, spec_failed in masks.values():
+        passed |= spec_passed
+        failed |= spec_failed
+
+    codes[:] = STATUSES.index('untested')
+    codes[passed] = STATUSES.index('pass')
+    codes[failed] = STATUSES.index('fail')
+    return codes
+
+
+def test_slice(test):
+    """
+    The long-format rows of one test, without its category and name (the report adds
+    those, so renaming a test doesn't throw its slice away).
+    """
+    tags = {name: tag[:2] for tag, name in test.metadata.items() if tag.startswith(VALUE_KINDS)}
+    cc_names = [name for tag, name in test.metadata.items() if tag.startswith('CC')]
+    combos = test.combo_index
+    num_rows = len(combos)
+
+    computed = test.compute_columns(names=list(tags)) if tags and num_rows else {}
+    status = _row_status(test, num_rows) if tags and num_rows else np.zeros(0, dtype=np.int8)
+
+    rows, names, kinds, values, texts = [], [], [], [], []
+    for code, (name, kind) in enumerate(tags.items()):
+        column = np.asarray(computed.get(name, ()))
+        if column.dtype.kind == 'f':
+            filled = np.flatnonzero(~np.isnan(column))
+            number = column[filled]
+            text = np.empty(len(filled), dtype=object)
+        else:
+            # stored columns come from their numeric shadow, '3.3mV' is 0.0033
+            number = test.column_numbers(name, column)
+            text = column.astype(object)
+            blank = pd.isna(text) | (text == '')
+            filled = np.flatnonzero(~blank)
+            number, text = number[filled], text[filled]
+            text[~np.isnan(number)] = None
+        rows.append(filled)
+        names.append(np.full(len(filled), code, dtype=np.int32))
+        kinds.append(np.full(len(filled), VALUE_KINDS.index(kind), dtype=np.int8))
+        values.append(number)
+        texts.append(text)
+
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    data = {}
+    for i, name in enumerate(cc_names):
+        data[name] = combos.column(i)[rows] if len(rows) else np.empty(0, dtype=object)
+    data['row'] = rows
+    data['column'] = pd.Categorical.from_codes(np.concatenate(names) if names else np.empty(0, dtype=np.int32),
+                                               categories=list(tags))
+    data['kind'] = pd.Categorical.from_codes(np.concatenate(kinds) if kinds else np.empty(0, dtype=np.int8),
+                                             categories=VALUE_KINDS)
+    data['value'] = np.concatenate(values) if values else np.empty(0)
+    data['text'] = np.concatenate(texts) if texts else np.empty(0, dtype=object)
+    data['status'] = pd.Categorical.from_codes(status[rows], categories=STATUSES)
+    return pd.DataFrame(data)
+
+
+def assemble(tests_and_slices):
+    """
+    One frame from [(test, slice)], with each test's category and name put in front.
+    """
+    if not tests_and_slices:
+        return pd.DataFrame(columns=FIXED_COLUMNS)
+
+    frames = [frame for _, frame in tests_and_slices]
+    lengths = [len(frame) for frame in frames]
+    view = pd.concat([frame.drop(columns='column') for frame in frames], ignore_index=True, sort=False)
+
+    # categoricals put together from codes, much cheaper than factorizing millions of strings
+    for field, values in (('category', [test.category for test, _ in tests_and_slices]),
+                          ('test', [test.name for test, _ in tests_and_slices])):
+        categories = list(dict.fromkeys(values))
+        codes = np.repeat([categories.index(value) for value in values], lengths)
+        view.insert(0, field, pd.Categorical.from_codes(codes, categories=categories))
+    view['column'] = union_categoricals([frame['column'] for frame in frames])
+
+    # fixed columns first, then the CCs in the order tests have them
+    conditions = [name for name in view.columns if name not in FIXED_COLUMNS]
+    return view[['category', 'test'] + conditions + FIXED_COLUMNS[2:]]
+
+
+def _matches(column, wanted):
+    """
+    Mask of the cells of column equal to any of wanted, where numbers match numbers
+    however they're written ('12', '12.0' and 12 are the same).
+    """
+    if not isinstance(wanted, (list, tuple, set, frozenset, np.ndarray, pd.Series)):
+        wanted = [wanted]
+    wanted = list(wanted)
+
+    texts = [str(v).strip() for v in wanted]
+    mask = np.array(column.astype(str).str.strip().isin(texts), dtype=bool)
+
+    numbers = pd.to_numeric(pd.Series(wanted, dtype=object), errors='coerce').dropna()
+    if len(numbers):
+        mask |= pd.to_numeric(column, errors='coerce').isin(numbers.to_numpy(dtype=float)).to_numpy(dtype=bool)
+    return mask
+
+
+def filter_view(view, columns=None, tests=None, categories=None, conditions=None, status=None,
+                value_range=None):
+    """
+    The rows of view that match every filter given, as boolean masks over the whole frame.
+
+    columns, tests, categories and status take a value or a list of them. conditions is
+    {CC name: value or list of values}, rows of tests without that CC never match.
+    value_range is (low, high) with either end None for open, both ends included.
+    """
+    mask = np.ones(len(view), dtype=bool)
+
+    for field, wanted in (('column', columns), ('test', tests), ('category', categories), ('status', status)):
+        if wanted is None:
+            continue
+        if isinstance(wanted, str) or not hasattr(wanted, '__iter__'):
+            wanted = [wanted]
+        mask &= view[field].isin(list(wanted)).to_numpy()
+
+    for name, wanted in (conditions or {}).items():
+        if name not in view.columns:
+            return view.iloc[0:0].reset_index(drop=True)
+        # only the rows still in the running are compared
+        candidates = np.flatnonzero(mask)
+        mask[candidates[~_matches(view[name].iloc[candidates], wanted)]] = False
+
+    if value_range is not None:
+        low, high = value_range
+        values = view['value'].to_numpy()
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+
+    return view[mask].reset_index(drop=True)
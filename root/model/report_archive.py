@@ -0,0 +1,178 @@
+"""
+Zip container for reports that opens without reading every test.
+
+    manifest.json          format version, title and the test list (category, name, member, key)
+    report.pickle          everything on the TestReport except the tests
+    tests/<id>.pickle      one pickled Test state per test
+
+Opening reads the manifest and report.pickle. Each test is a Test.deferred() that
+reads its own member the first time it is used.
+"""
+import json
+import os
+import pickle
+import time
+import uuid
+import zipfile
+
+from utils.tracing import span
+
+
+ARCHIVE_EXTENSION = '.trz'
+ARCHIVE_FORMAT = 'test-report-archive'
+ARCHIVE_VERSION = 1
+
+# what find_reports() picks out of a folder
+REPORT_EXTENSIONS = (ARCHIVE_EXTENSION, '.pickle')
+
+MANIFEST = 'manifest.json'
+HEADER = 'report.pickle'
+
+
+class ArchiveMember():
+    """
+    Loader for one test inside an archive. Calling it returns the test's pickled state.
+    """
+    def __init__(self, filepath, member, on_load=None, key=None):
+        self.filepath = filepath
+        self.member = member
+        # Test.content_key() of the saved state, None in archives written before keys were kept
+        self.key = key
+        # called with the test once it's loaded (see Test.load)
+        self.on_load = on_load
+
+    def __repr__(self):
+        return f"ArchiveMember({self.filepath!r}, {self.member!r})"
+
+    def read(self):
+        with zipfile.ZipFile(self.filepath) as archive:
+            return archive.read(self.member)
+
+    def __call__(self):
+        return pickle.loads(self.read())
+
+
+def is_archive(filepath):
+    return zipfile.is_zipfile(filepath)
+
+
+def find_reports(paths, recursive: bool = False):
+    """
+    The report files in paths, with folders expanded to the reports inside them.
+    """
+    found = []
+    for path in paths:
+        if not os.path.isdir(path):
+            found.append(path)
+            continue
+
+        if recursive:
+            walk = ((folder, files) for folder, _, files in os.walk(path))
+        else:
+            walk = [(path, [f for f in os.listdir(path) if os.path.isfile(os.path.join(path, f))])]
+        for folder, files in walk:
+            found.extend(os.path.join(folder, f) for f in sorted(files) if f.lower().endswith(REPORT_EXTENSIONS))
+
+    # the same file given twice would be processed twice, in parallel, onto the same outputs
+    return list(dict.fromkeys(os.path.abspath(p) for p in found))
+
+
+def replace_file(temp_path, filepath, attempts: int = 5):
+    """
+    os.replace, retrying for a moment if something (a test loading on another thread,
+    a virus scanner) has filepath open, which Windows won't replace.
+    """
+    for attempt in range(attempts):
+        try:
+            os.replace(temp_path, filepath)
+            return
+        except PermissionError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+
+def write_archive(report, filepath):
+    """
+    Saves report to filepath. Tests that were never loaded are copied across as raw bytes
+    under the same member name, so a deferred test can still find itself after its archive
+    is rewritten. The file is written next to filepath first and swapped in once complete.
+    Returns the id given to this write (see model.journal).
+    """
+    temp_path = f"{filepath}.tmp"
+    archive_id = uuid.uuid4().bytes
+    entries = []
+    pending = []
+
+    with span('write_archive', path=filepath, tests=lambda: len(report.tests)):
+        with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+            for test in report.tests:
+                if test.loaded:
+                    member = f"tests/{uuid.uuid4().hex}.pickle"
+                    data = pickle.dumps(test.__getstate__(), protocol=pickle.HIGHEST_PROTOCOL)
+                else:
+                    loader = test.__dict__['_loader']
+                    member = loader.member
+                    data = loader.read()
+                    pending.append((test, member))
+
+                archive.writestr(member, data)
+                entries.append({'category': test.category, 'name': test.name, 'member': member,
+                                'key': test.content_key()})
+
+            state = report.__getstate__()
+            selected = report._test_position(report.selected_test)
+            state['tests'] = []
+            state['selected_test'] = None
+            archive.writestr(HEADER, pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+            manifest = {
+                'format': ARCHIVE_FORMAT,
+                'version': ARCHIVE_VERSION,
+                'id': archive_id.hex(),
+                'title': report.title,
+                'selected': selected,
+                'tests': entries,
+            }
+            archive.writestr(MANIFEST, json.dumps(manifest, indent=1))
+
+        replace_file(temp_path, filepath)
+
+    # tests still waiting to load now read from the new file
+    for test, member in pending:
+        old = test.__dict__['_loader']
+        test._loader = ArchiveMember(filepath, member, old.on_load, old.key)
+
+    return archive_id
+
+
+def read_archive(filepath, report_class):
+    """
+    Opens an archive written by write_archive(). Only the manifest and report header are read.
+    """
+    with span('read_archive', path=filepath), zipfile.ZipFile(filepath) as archive:
+        manifest = json.loads(archive.read(MANIFEST))
+        if manifest.get('format') != ARCHIVE_FORMAT:
+            raise TypeError("File is not a test report archive")
+        if manifest.get('version', 0) > ARCHIVE_VERSION:
+            raise TypeError(f"Report archive version {manifest['version']} is newer than this program supports")
+
+        state = pickle.loads(archive.read(HEADER))
+
+    # here rather than at the top, so the constants above can be had without pandas
+    from model.test_model import Test
+
+    report = report_class.__new__(report_class)
+
+    tests = []
+    for entry in manifest['tests']:
+        loader = ArchiveMember(filepath, entry['member'], report._test_loaded, entry.get('key'))
+        tests.append(Test.deferred(entry['category'], entry['name'], loader))
+
+    selected = manifest.get('selected')
+    state['tests'] = tests
+    state['selected_test'] = tests[selected] if selected is not None else None
+    report.__setstate__(state)
+    report._archive_id = bytes.fromhex(manifest['id']) if manifest.get('id') else None
+
+    return report
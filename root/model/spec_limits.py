@@ -0,0 +1,73 @@
+import numpy as np
+
+
+class SpecLimit():
+    """
+    Limits a specification (Sp) column puts on a result or calculation column.
+
+    Either give minimum and/or maximum, or nominal and tolerance (nominal ± tolerance).
+    inclusive decides whether a value sitting exactly on a limit passes.
+    """
+    def __init__(self, target: str = '', minimum=None, maximum=None, nominal=None, tolerance=None,
+                 inclusive: bool = True):
+        if nominal is not None:
+            if tolerance is None:
+                raise ValueError("A nominal spec needs a tolerance.")
+            if minimum is not None or maximum is not None:
+                raise ValueError("Give either nominal and tolerance, or minimum/maximum, not both.")
+            minimum = float(nominal) - abs(float(tolerance))
+            maximum = float(nominal) + abs(float(tolerance))
+
+        if minimum is None and maximum is None:
+            raise ValueError("A spec needs at least a minimum or a maximum.")
+
+        self.target = target
+        self.minimum = None if minimum is None else float(minimum)
+        self.maximum = None if maximum is None else float(maximum)
+        self.nominal = None if nominal is None else float(nominal)
+        self.tolerance = None if tolerance is None else abs(float(tolerance))
+        self.inclusive = inclusive
+
+        if self.minimum is not None and self.maximum is not None and self.minimum > self.maximum:
+            raise ValueError(f"Minimum ({self.minimum}) is greater than maximum ({self.maximum}).")
+
+    def __repr__(self):
+        return f"SpecLimit({self.target!r}, {self.label()!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, SpecLimit) and vars(self) == vars(other)
+
+    def label(self):
+        """
+        Short text shown in the Sp column, e.g. '5 ± 0.1', '≥ 3', '1 to 2'.
+        """
+        fmt = lambda v: f"{v:g}"
+
+        if self.nominal is not None:
+            return f"{fmt(self.nominal)} ± {fmt(self.tolerance)}"
+
+        if self.minimum is not None and self.maximum is not None:
+            text = f"{fmt(self.minimum)} to {fmt(self.maximum)}"
+            return text if self.inclusive else f"{text} (exclusive)"
+
+        if self.minimum is not None:
+            return f"{'≥' if self.inclusive else '>'} {fmt(self.minimum)}"
+
+        return f"{'≤' if self.inclusive else '<'} {fmt(self.maximum)}"
+
+    def evaluate(self, values):
+        """
+        Checks a float array against the limits in one pass.
+        Returns (passed, failed) boolean arrays. NaN (blank/error) values are neither.
+        """
+        values = np.asarray(values, dtype=float)
+        tested = ~np.isnan(values)
+
+        within = tested.copy()
+        with np.errstate(invalid='ignore'):
+            if self.minimum is not None:
+                within &= (values >= self.minimum) if self.inclusive else (values > self.minimum)
+            if self.maximum is not None:
+                within &= (values <= self.maximum) if self.inclusive else (values < self.maximum)
+
+        return within, tested & ~within
@@ -1,56 +1,277 @@
+import copy
+import hashlib
+import json
+import logging
+from contextlib import contextmanager
+
+import numpy as np
 import pandas as pd
-from itertools import product
-import re
+
+from model.column_store import Column, ColumnStore
+from model.combo_index import ComboIndex
+from model.dependency_graph import DependencyGraph
+from model.spec_limits import SpecLimit
+from model.units import parse_quantities
+from model.virtual_table import VirtualTable
+from model.formula import ERR, FormulaError, aggregate, compile_formula
+from model.long_view import test_slice
+from utils.tracing import get_logger, span, traced
+
+log = get_logger(__name__)
 
 class Test():
+    # grids with more rows than this get a VirtualTable instead of a DataFrame
+    VIRTUAL_ROW_LIMIT = 200_000
+
     def __init__(self, test_category: str = '', test_name: str = ''):
         self.column_conditions = {}
-        self.results = {}
+        self.results = ColumnStore()
         self.calculations = {}
-        self.specifications = {}
+        self.specifications = ColumnStore()
+        self.spec_limits = {}
 
         self.name = test_name
         self.category = test_category
 
         self.metadata = {}
 
+        self._combo_index = None
+        self._combo_signature = None
+
         self.root_table = pd.DataFrame()
-        self.equipment_used = pd.DataFrame(index=self.column_condition_combos)
+        self.equipment_used = pd.DataFrame(index=list(self.column_condition_combos))
         self.checkbox_vars = []
 
         cover_page_vars = {}
 
+        # columns of root_table that no longer match the stored data
+        # name -> set of rows to rewrite, or None for the whole column
+        self._dirty = {}
+        # True when root_table has to be rebuilt from scratch (row layout changed)
+        self._stale = True
+
+        # which columns each calculation reads
+        self._graph = DependencyGraph()
+
+        # spec name -> (passed, failed) masks, dropped on any change
+        self._spec_cache = None
+        # this test's part of the report's long-format view, dropped on any change
+        self._long_cache = None
+        # Aggregate.key -> (columns it reads, values per row), dropped when one of those changes
+        self._aggregate_cache = {}
+        # content_key(), dropped on any change
+        self._content_key = None
+
+        # batch() nesting depth and the state to roll back to
+        self._batch_depth = 0
+        self._batch_snapshot = None
+
+    def __getstate__(self):
+        self.load()
+        state = self.__dict__.copy()
+
+        # root_table is derived from the stored columns, it's rebuilt the first time it's needed
+        for attr in ('root_table', '_dirty', '_combo_index', '_combo_signature', '_spec_cache', '_long_cache',
+                     '_aggregate_cache', '_content_key'):
+            state.pop(attr, None)
+        state['_stale'] = True
+        state['_batch_depth'] = 0
+        state['_batch_snapshot'] = None
+        return state
+
+    def __setstate__(self, state):
+        # reports pickled before dirty tracking / combo keyed columns existed
+        self.__dict__.update(state)
+        if 'root_table' not in state:
+            self.root_table = pd.DataFrame()
+        self.__dict__.setdefault('_dirty', {})
+        self.__dict__.setdefault('_stale', True)
+        self.__dict__.setdefault('_combo_index', None)
+        self.__dict__.setdefault('_combo_signature', None)
+        # reports pickled before equipment could be checked per test
+        self.__dict__.setdefault('checkbox_vars', [])
+        self.__dict__.setdefault('equipment_used', pd.DataFrame())
+        if not isinstance(self.results, ColumnStore):
+            self.results = ColumnStore(self.results, self.combo_index, self._cc_tags())
+        if not isinstance(self.specifications, ColumnStore):
+            self.specifications = ColumnStore(self.specifications, self.combo_index, self._cc_tags())
+        self.__dict__.setdefault('_batch_depth', 0)
+        self.__dict__.setdefault('spec_limits', {})
+        self.__dict__.setdefault('_spec_cache', None)
+        self.__dict__.setdefault('_long_cache', None)
+        self.__dict__.setdefault('_aggregate_cache', {})
+        self.__dict__.setdefault('_content_key', None)
+        self.__dict__.setdefault('_batch_snapshot', None)
+        if '_graph' not in self.__dict__:
+            self._graph = DependencyGraph()
+            for name, formula in self.calculations.items():
+                try:
+                    self._graph.set(name, compile_formula(formula).referenced_names)
+                except ValueError:
+                    pass
+
+    # ----- Lazy Loading -----
+
+    @classmethod
+    def deferred(cls, test_category, test_name, loader):
+        """
+        A test that only knows its category and name. loader() returns the rest of its
+        pickled state and is called the first time anything else on the test is used.
+        """
+        test = cls.__new__(cls)
+        test.__dict__.update(name=test_name, category=test_category, _loader=loader)
+        return test
+
     @property
-    def column_condition_combos(self):
-        
+    def loaded(self):
+        return '_loader' not in self.__dict__
+
+    def load(self):
+        loader = self.__dict__.pop('_loader', None)
+        if loader is None:
+            return
+
+        # the test may have been renamed before it was loaded
+        name, category = self.name, self.category
+        try:
+            with span('Test.load', test=name):
+                self.__setstate__(loader())
+        except BaseException:
+            self._loader = loader
+            raise
+        self.name, self.category = name, category
+        # an archive keeps the key of the state it saved
+        self._content_key = getattr(loader, 'key', None)
+
+        on_load = getattr(loader, 'on_load', None)
+        if on_load is not None:
+            on_load(self)
+
+    def snapshot(self):
+        """
+        Detached copy of the test for saving on another thread. Only containers and
+        arrays are copied, nothing is pickled, so it's cheap to take. The copy is only
+        meant to be saved, its columns can't be edited or read by row.
+        """
+        if not self.loaded:
+            loader = copy.copy(self.__dict__['_loader'])
+            # loading the copy shouldn't touch the report the original belongs to
+            loader.on_load = None
+            return Test.deferred(self.category, self.name, loader)
+
+        state = self.__getstate__()
+        state['results'] = self.results.snapshot()
+        state['specifications'] = self.specifications.snapshot()
+        for attr in ('column_conditions', 'calculations', 'spec_limits', 'metadata'):
+            state[attr] = dict(state[attr])
+        state['checkbox_vars'] = list(self.checkbox_vars)
+        state['equipment_used'] = self.equipment_used.copy()
+        state['_graph'] = copy.deepcopy(self._graph)
+        state['_content_key'] = self._content_key
+
+        test = Test.__new__(Test)
+        test.__setstate__(state)
+        return test
+
+    def __getattr__(self, attr):
+        # only reached for attributes that aren't set, which on a deferred test means it isn't loaded yet
+        if '_loader' not in self.__dict__ or attr.startswith('__'):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{attr}'")
+        self.load()
+        return getattr(self, attr)
+
+    def content_key(self):
+        """
+        Hash of what the test holds: CCs, columns, formulas, limits and checked equipment,
+        not its name or category. Worked out once and kept until the next change. A test
+        that isn't loaded gets it from its archive, so asking doesn't load it.
+        """
+        key = self.__dict__.get('_content_key')
+        if key is not None:
+            return key
+
+        if not self.loaded:
+            loader = self.__dict__['_loader']
+            key = getattr(loader, 'key', None)
+            if key is None:
+                # saved before archives kept keys, worked out from a throwaway copy
+                source = Test.__new__(Test)
+                source.__setstate__(loader())
+                key = loader.key = source.content_key()
+            return key
+
+        # plain lists in a fixed order, so the key is the same whatever PYTHONHASHSEED is
+        digest = hashlib.sha256(json.dumps([
+            list(self.metadata.items()),
+            [(name, list(values)) for name, values in self.column_conditions.items()],
+            list(self.calculations.items()),
+            [(name, sorted(vars(limit).items())) for name, limit in self.spec_limits.items()],
+            sorted(self.checkbox_vars),
+        ], default=repr).encode())
+
+        # only the filled cells, so a mostly empty grid hashes quickly
+        for store in (self.results, self.specifications):
+            for name, column in store.items():
+                rows = column.filled_rows()
+                values = column.take(rows)
+                digest.update(json.dumps(name).encode())
+                digest.update(rows.tobytes())
+                if values.dtype.kind == 'f':
+                    digest.update(values.tobytes())
+                else:
+                    digest.update(json.dumps(values.tolist(), default=repr).encode())
+
+        self._content_key = digest.hexdigest()
+        return self._content_key
+
+    def set_checkbox_vars(self, checkbox_vars):
+        # which equipment rows the test uses, part of content_key()
+        self._content_key = None
+        self.checkbox_vars = list(checkbox_vars)
+
+    @property
+    def combo_index(self):
+        """
+        ComboIndex over the CC value lists in table order, rebuilt only when the CCs change.
+        """
         cc_vals = []
 
         for tag in self.metadata.keys():
             if tag.startswith('CC'):
                 name = self.metadata[tag]
-                cc_vals.append(self.column_conditions[name])    
+                cc_vals.append(self.column_conditions[name])
+
+        signature = tuple(tuple(values) for values in cc_vals)
+        if self._combo_index is None or signature != self._combo_signature:
+            self._combo_index = ComboIndex(cc_vals)
+            self._combo_signature = signature
 
-        cc_combos = list(product(*cc_vals))
-        return cc_combos
+        return self._combo_index
+
+    @property
+    def column_condition_combos(self):
+        # sequence of combo tuples, indexed lazily instead of a materialized list
+        return self.combo_index
 
     def add_CC(self, name: str = '', values=None):
+        self._begin_change()
         self.column_conditions[name] = values
 
         if name not in self.metadata.values():
             # cc_number = sum(1 for k in self.metadata if 'CC' in k) + 1
             # cc_number = greates tag # for CC's
-            cc_number = str(max((int(tag[2:]) for tag in self.metadata if tag.startswith('CC')), default=0) + 1)
-            print(f"\n\nTHIS IS THE CCNUMBER: {cc_number}\n\n")
-            self.metadata[f'CC{cc_number}'] = name
+            tag = self._next_tag('CC')
+            log.debug("new CC tag: %s", tag)
+            self.metadata[tag] = name
 
         
-        new_length = len(self.column_condition_combos)
-        for re_name in self.results:
-            self.results[re_name] = self._resize_result_list(self.results[re_name], new_length)
+        self._resize_columns()
 
-        self.build_table()
+        self._stale = True
+        self.refresh_table()
 
     def edit_CC(self, col_tag, new_name: str='', new_values=None):
+        self._begin_change()
         # get old name
         # change value in metdata
         # remove the column and values from column_conditions dict
@@ -58,64 +279,69 @@ class Test():
             # metadata holds order of df
         # build_table()
 
-        print("\n\n")
-        print(f"EDITING COLUMN: {col_tag}")
-
-
         # get the old name
         old_name = self.metadata[col_tag]
+        log.debug("editing %s: %r -> %r", col_tag, old_name, new_name)
 
-        print(f"OLD NAME: {old_name}\tNEW NAME: {new_name}")
-        print(f"OLD METADATA: {self.metadata}")
         # change the value in the METADATA (keeping same order in df)
         self.metadata[col_tag] = new_name
-        print(f"NEW METADATA: {self.metadata}")
-
-        print(f"OLD COLUMN CONDITIONS: {self.column_conditions}")
-
 
         # remove the old column
         self.column_conditions.pop(old_name)
 
-        print(f"REMOVED {col_tag} COLUMN CONDITIONS: {self.column_conditions}")
-
         # insert the new column at the end, doesn't matter because
         # metadata holds order of df
         self.column_conditions[new_name] = new_values
 
-        print(f"NEW COLUMN CONDITIONS: {self.column_conditions}")
+        log.debug("metadata: %s, column conditions: %s", self.metadata, self.column_conditions)
 
-        print("\n\n")
+        self._resize_columns()
 
-        new_length = len(self.column_condition_combos)
-        for re_name in self.results:
-            self.results[re_name] = self._resize_result_list(self.results[re_name], new_length)
 
-
-        self.build_table()
+        self._stale = True
+        self.refresh_table()
 
 
 
 
     def del_CC(self, col_tag):
+        self._begin_change()
         name = self.metadata[col_tag]
 
         del self.column_conditions[name]
         del self.metadata[col_tag]
 
-        new_length = len(self.column_condition_combos)
-        for re_name in self.results:
-            self.results[re_name] = self._resize_result_list(self.results[re_name], new_length)
+        self._resize_columns()
+
+        log.debug("deleted %s (%r), combos: %s, metadata: %s", col_tag, name, self.combo_index, self.metadata)
+
+
+        self._stale = True
+        self.refresh_table()
 
-        print("\n\n\n DEBUG BUILD:")
-        print(f"COMBOS: {self.column_condition_combos}")
-        print(f"CONDITIONS: {self.column_conditions}")
-        print(f"\nMETADATA: {self.metadata}")
+    def _cc_tags(self):
+        return tuple(tag for tag in self.metadata if tag.startswith('CC'))
 
+    def _next_tag(self, prefix):
+        # greatest number in use + 1, counting tags would hand out one that's still taken after a delete
+        number = max((int(tag[2:]) for tag in self.metadata if tag.startswith(prefix)), default=0) + 1
+        return f'{prefix}{number}'
 
-        self.build_table()
+    def _resize_columns(self):
+        # groups are rows of the grid, every aggregate has to be worked out again
+        self._aggregate_cache = {}
+        # move every stored cell to the row of its combo in the new grid
+        index, tags = self.combo_index, self._cc_tags()
+        for store in (self.results, self.specifications):
+            if index is not store.index or tags != store.tags:
+                self._touch(store, *store)
+                store.relayout(index, tags)
 
     def _resize_result_list(self, result_list, new_length, placeholder=''):
+        if isinstance(result_list, Column):
+            # combo keyed columns always span the whole grid
+            return result_list
+
         current_length = len(result_list)
         if current_length < new_length:
             result_list.extend([placeholder] * (new_length - current_length))
@@ -125,19 +351,20 @@ class Test():
         return result_list
 
     def add_Re(self, name: str = ''):
+        self._begin_change()
         # commented out for result test
         # self.results[name] = ['--'] * len(self.column_condition_combos)
         self.results[name] = []
 
         if name not in self.metadata.values():
-            re_number = sum(1 for k in self.metadata if 'Re' in k) + 1
-            self.metadata[f'Re{re_number}'] = name
+            self.metadata[self._next_tag('Re')] = name
 
-        # commented out for result test
-        self.results[name] = [''] * len(self.column_condition_combos)
-        self.build_table()
+        # an empty column is blank on every row, cells are stored once they're filled
+        self._mark_dirty(name)
+        self.refresh_table()
 
     def edit_Re_name(self, col_tag, new_name: str = ''):
+        self._begin_change()
         # 1. get old name
         old_name = self.metadata[col_tag]
         old_values = self.results[old_name]
@@ -150,77 +377,203 @@ class Test():
             # metadata holds order of df
 
         self.results[new_name] = old_values
-        self.build_table()
+
+        self._mark_dirty(old_name, new_name)
+        self.refresh_table()
 
     def del_Re(self, col_tag):
+        self._begin_change()
         name = self.metadata[col_tag]
 
         del self.results[name]
         del self.metadata[col_tag]
 
-        self.build_table()
+        self._mark_dirty(name)
+        self.refresh_table()
 
     def edit_Re_val(self, name, row, value):
+        self._begin_change()
+        self._touch(self.results, name)
         self.results[name][row] = value
-        print(f"RESULTS: {self.results}")
-        self.build_table()
+        self._mark_dirty(name, rows=[row])
+        self.refresh_table()
+
+    def set_Re_rows(self, name, rows, values):
+        """
+        Writes many values of a result column at once (see Column.set_rows). Blank values are skipped.
+        """
+        if name not in self.results:
+            raise KeyError(f"Result column '{name}' not found.")
+
+        self._begin_change()
+        self._touch(self.results, name)
+        written = self.results[name].set_rows(rows, values)
+        self._mark_dirty(name)
+        self.refresh_table()
+        return written
+
+    def set_cells(self, name, rows, values):
+        """
+        Writes values at rows of a stored Re or Sp column (see Column.put). Unlike
+        set_Re_rows, blank values clear their cell.
+        """
+        if name not in self.results and name not in self.specifications:
+            raise KeyError(f"Column '{name}' not found.")
+
+        self._begin_change()
+        self._put_cells(name, rows, values)
+        self.refresh_table()
+
+    def _put_cells(self, name, rows, values):
+        store = self.results if name in self.results else self.specifications
+        self._touch(store, name)
+        store[name].put(rows, values)
+        self._mark_dirty(name)
 
     def add_Ca(self, name: str = '', formula: str = ''):
+        self._begin_change()
 
-        if not (formula.startswith('=') and ('CC(' in formula or 'Re(' in formula)):
+        if not (formula.startswith('=') and ('CC(' in formula or 'Re(' in formula or 'Ca(' in formula)):
             raise ValueError(f"Invalid formula syntax: {formula}")
 
         if not formula.startswith('='):
             formula = f'={formula}'
 
+        # parse once up front so bad formulas are rejected here instead of showing up as #ERR
+        compiled = compile_formula(formula)
+
+        # raises DependencyCycleError if this calculation would end up reading itself
+        self._graph.set(name, compiled.referenced_names)
+
         self.calculations[name] = formula
 
         if name not in self.metadata.values():
-            ca_number = sum(1 for k in self.metadata if k.startswith('Ca')) + 1
-            self.metadata[f'Ca{ca_number}'] = name
+            self.metadata[self._next_tag('Ca')] = name
+
+        self._mark_dirty(name)
+        self.refresh_table()
 
-        self.build_table()
 
+    def add_Sp(self, name: str = '', specifications=None, limit: SpecLimit = None):
+        """
+        Adds a specification column. Either give a value per row (specifications), or a
+        SpecLimit whose target result/calculation gets checked for pass/fail.
+        """
+        self._begin_change()
+        expected_length = len(self.combo_index)
+
+        if limit is not None:
+            if limit.target not in self.results and limit.target not in self.calculations:
+                raise ValueError(f"Spec target '{limit.target}' is not a result or calculation column.")
+            if specifications is None:
+                # nothing to store, the column shows the limit's label on every row
+                specifications = []
 
-    def add_Sp(self, name: str = '', specifications=None):
         if specifications is None:
             raise ValueError("Specifications list is required.")
 
-        expected_length = len(self.column_condition_combos)
-        if len(specifications) != expected_length:
+        if len(specifications) != expected_length and not (limit is not None and len(specifications) == 0):
             raise ValueError(
                 f"Length of specifications ({len(specifications)}) does not match number of test cases ({expected_length})."
             )
 
         # Add to specifications dictionary
         self.specifications[name] = specifications
+        if limit is not None:
+            self.spec_limits[name] = limit
+        else:
+            self.spec_limits.pop(name, None)
 
         # Register in metadata
         if name not in self.metadata.values():
-            sp_number = sum(1 for k in self.metadata if k.startswith('Sp')) + 1
-            self.metadata[f'Sp{sp_number}'] = name
+            self.metadata[self._next_tag('Sp')] = name
 
-        # Rebuild the table to include this column
-        self.build_table()
+        # Patch the table to include this column
+        self._mark_dirty(name)
+        self.refresh_table()
 
 
     def evaluate_formula(self, formula: str, row: pd.Series):
         """
-        Evaluates a formula string row-wise by replacing CC() and Re() with actual values.
+        Evaluates a formula string for a single row, looking up CC() and Re() in the row.
         """
         if not isinstance(formula, str) or not formula.startswith('='):
             return formula  # Not a formula
 
-        expr = formula[1:]  # remove leading '='
+        try:
+            compiled = compile_formula(formula)
+        except FormulaError:
+            return ERR
+
+        return compiled.evaluate_row(row)
+
+    @traced('Test.evaluate_column')
+    def evaluate_column(self, formula: str, df: pd.DataFrame, num_rows: int = None, start: int = 0):
+        """
+        Evaluates a formula over every row of df (a DataFrame or dict of columns) at once.
+        df holds rows start:start + num_rows of the test, which aggregates need to know.
+        """
+        if num_rows is None:
+            num_rows = len(df.index)
+
+        if not isinstance(formula, str) or not formula.startswith('='):
+            return [formula] * num_rows
 
         try:
-            # Replace CC('colname') and Re('colname') with actual row values
-            expr = re.sub(r"CC\('(.+?)'\)", lambda m: str(row.get(m.group(1), 'None')), expr)
-            expr = re.sub(r"Re\('(.+?)'\)", lambda m: str(row.get(m.group(1), 'None')), expr)
+            compiled = compile_formula(formula)
+        except FormulaError:
+            return [ERR] * num_rows
 
-            return eval(expr)
-        except Exception as e:
-            return "#ERR"
+        numbers = lambda name: self.stored_numbers(name, start, start + num_rows)
+        return compiled.evaluate(df, num_rows, self._aggregate, start, numbers)
+
+    def _aggregate(self, node):
+        """
+        Values of an aggregate (see model.formula.Aggregate) for every row of the test: the
+        inner expression over all rows, then one groupby on the CC positions.
+        """
+        cached = self._aggregate_cache.get(node.key)
+        if cached is not None:
+            return cached[1]
+
+        inner = node.inner
+        num_rows = len(self.combo_index)
+        with span('Test.aggregate', test=lambda: self.name, func=node.func, rows=num_rows):
+            columns = self.compute_columns(names=inner.referenced_names)
+            numbers = lambda name: self.stored_numbers(name, 0, num_rows)
+            # blank rows are NaN and get skipped, errors and text are kept apart
+            values, errors = inner.evaluate_values(columns, num_rows, self._aggregate, numbers)
+
+            groups = self._group_ids(node.by, node.over)
+            result = aggregate(node.func, values, groups)
+
+            if errors.any():
+                # an #ERR anywhere in a group makes the whole group #ERR
+                result[np.isin(groups, groups[errors])] = np.nan
+
+        self._aggregate_cache[node.key] = (set(inner.referenced_names), result)
+        return result
+
+    def _group_ids(self, by, over=None):
+        # group number per row from the positions of the grouping CCs' values, no hashing of values
+        cc_names = [self.metadata[tag] for tag in self._cc_tags()]
+        if over is not None:
+            by = [name for name in cc_names if name not in over]
+            unknown = [name for name in over if name not in cc_names]
+        else:
+            unknown = [name for name in by if name not in cc_names]
+        if unknown:
+            raise FormulaError(f"Not a CC of this test: {', '.join(unknown)}")
+
+        combos = self.combo_index
+        groups = np.zeros(len(combos), dtype=np.int64)
+        for name in by:
+            i = cc_names.index(name)
+            # repeated values in a CC's list are the same group
+            first = combos.positions[i]
+            canonical = np.array([first[value] for value in combos.value_lists[i]], dtype=np.int64)
+            groups = groups * combos.sizes[i] + canonical[combos.codes(i)]
+        return groups
 
     def update_from_dataframe(self, new_df: pd.DataFrame):
         """
@@ -228,66 +581,439 @@ class Test():
         Assumes CC columns remain unchanged.
         Updates result and spec columns, and registers new ones if needed.
         """
+        self._begin_change()
+        for col, rows, values in self.changed_cells(new_df):
+            if col not in self.results and col not in self.specifications:
+                # Assume it's a result by default
+                self.results[col] = []
+                self.metadata[self._next_tag('Re')] = col
+                self._mark_dirty(col)
+            if len(rows):
+                self._put_cells(col, rows, values)
+
+        self.refresh_table()
+
+    def changed_cells(self, new_df: pd.DataFrame):
+        """
+        (column name, rows, new values) for every column update_from_dataframe() would
+        store, with just the rows whose value differs from what's stored. Columns that
+        aren't stored yet come with every row that isn't blank.
+        """
         cc_cols = [self.metadata[k] for k in self.metadata if k.startswith('CC')]
-        existing_results = set(self.results.keys())
-        existing_specs = set(self.specifications.keys())
 
         for col in new_df.columns:
-            if col in cc_cols:
+            # calculations are derived from the other columns, never stored
+            if col in cc_cols or col in self.calculations:
                 continue
 
-            col_data = new_df[col].tolist()
+            # coerced the same way they'd be stored, in one pass
+            new = Column(new_df[col].to_numpy(), self.combo_index, self._cc_tags()).to_array(blank='')
+            stored = self.results.get(col)
+            if stored is None:
+                stored = self.specifications.get(col)
 
-            if col not in existing_results and col not in existing_specs:
-                # Assume it's a result by default
-                re_number = sum(1 for k in self.metadata if k.startswith('Re')) + 1
-                self.results[col] = col_data
-                self.metadata[f'Re{re_number}'] = col
+            if stored is None:
+                rows = np.flatnonzero(new != '')
+            else:
+                rows = np.flatnonzero(stored.to_array(blank='') != new)
+            yield col, rows, new[rows]
 
-            elif col in existing_results:
-                self.results[col] = col_data
 
-            elif col in existing_specs:
-                self.specifications[col] = col_data
+    # ----- Pass / Fail -----
 
-        self.build_table()
+    def stored_numbers(self, name, start: int = 0, stop: int = None):
+        """
+        Numbers of a stored Re/Sp column (rows start:stop) from its numeric shadow, units
+        and all, or None if the column isn't stored or has text that isn't a number.
+        """
+        if name in self.results:
+            column = self.results[name]
+        elif name in self.specifications and name not in self.spec_limits:
+            column = self.specifications[name]
+        else:
+            return None
+        return None if column.has_text else column.numeric(start, stop)
+
+    def column_numbers(self, name, values, start: int = 0, stop: int = None):
+        """
+        Numbers of column name (rows start:stop), from storage for stored columns, otherwise
+        parsed from its values as computed (calculations).
+        """
+        if name in self.results:
+            return self.results[name].numeric(start, stop)
+        if name in self.specifications and name not in self.spec_limits:
+            return self.specifications[name].numeric(start, stop)
+        return parse_quantities(values)[0]
 
+    def _numeric_column(self, name):
+        # float values of a column, straight from storage for results and specs
+        numbers = self.stored_numbers(name)
+        if numbers is not None:
+            return numbers
 
-    def build_table(self):
-        combos = self.column_condition_combos
-        print(f"THESE ARE THE CC COMBOS:\n{combos}")
-        num_rows = len(combos)
-        df = pd.DataFrame(index=range(num_rows))
+        if name in self.root_table.columns:
+            return self.column_numbers(name, self.root_table[name])
+
+        return np.full(len(self.combo_index), np.nan)
+
+    def spec_masks(self):
+        """
+        spec name -> (passed, failed) boolean arrays over the rows, for every Sp with a limit.
+        Rows that are blank or #ERR in the target column are in neither.
+        """
+        if self._spec_cache is None:
+            self.refresh_table()
+            self._spec_cache = {
+                name: limit.evaluate(self._numeric_column(limit.target))
+                for name, limit in self.spec_limits.items()
+                if name in self.specifications
+            }
+        return self._spec_cache
+
+    def pass_fail_counts(self):
+        """
+        {'pass': n, 'fail': n, 'untested': n, 'specs': {spec name: {...}}}
+        A row passes a spec if the value is within limits, untested if it's blank.
+        """
+        totals = {'pass': 0, 'fail': 0, 'untested': 0, 'specs': {}}
+
+        for name, (passed, failed) in self.spec_masks().items():
+            n_pass = int(np.count_nonzero(passed))
+            n_fail = int(np.count_nonzero(failed))
+            counts = {'pass': n_pass, 'fail': n_fail, 'untested': len(passed) - n_pass - n_fail}
+
+            totals['specs'][name] = counts
+            for key in ('pass', 'fail', 'untested'):
+                totals[key] += counts[key]
+
+        return totals
+
+    def long_slice(self):
+        """
+        This test's rows of the report's long-format view (see model.long_view).
+        """
+        if self._long_cache is None:
+            self._long_cache = test_slice(self)
+        return self._long_cache
+
+    # ----- Undo -----
+
+    def restore(self, metadata=None, column_conditions=None, results=None, specifications=None,
+                calculations=None, spec_limits=None):
+        """
+        Puts back parts of the test saved before an edit (see model.history). Each argument
+        is optional: metadata and column_conditions replace the whole dict, the others are
+        {name: saved value, or None for a name that didn't exist}.
+
+        Only the columns named get rewritten in the table, unless the CCs changed, which
+        rebuilds it the same way the edit did.
+        """
+        self._begin_change()
+        names = set()
+
+        for store, columns in ((self.results, results), (self.specifications, specifications)):
+            for name, column in (columns or {}).items():
+                if column is None:
+                    store.pop(name, None)
+                else:
+                    # laid out on the right grid below, once the CCs are back too
+                    dict.__setitem__(store, name, column)
+                names.add(name)
+
+        for name, formula in (calculations or {}).items():
+            if formula is None:
+                self.calculations.pop(name, None)
+                self._graph.remove(name)
+            else:
+                self.calculations[name] = formula
+                self._graph.set(name, compile_formula(formula).referenced_names)
+            names.add(name)
+
+        for name, limit in (spec_limits or {}).items():
+            if limit is None:
+                self.spec_limits.pop(name, None)
+            else:
+                self.spec_limits[name] = limit
+            names.add(name)
+
+        if metadata is not None:
+            names.update(set(self.metadata.values()) ^ set(metadata.values()))
+            if self._cc_tags() != tuple(tag for tag in metadata if tag.startswith('CC')):
+                self._stale = True
+            self.metadata = dict(metadata)
+
+        if column_conditions is not None:
+            self.column_conditions = dict(column_conditions)
+            self._stale = True
+
+        self._resize_columns()
+        for store in (self.results, self.specifications):
+            for name in names:
+                column = store.get(name)
+                if column is not None and (column._index is not store.index or column._tags != store.tags):
+                    column.relayout(store.index, store.tags)
+
+        self._mark_dirty(*names)
+        self.refresh_table()
+
+    # ----- Batching -----
+
+    # what a rollback has to put back besides the stored columns, all of it small
+    _SNAPSHOT_ATTRS = ('column_conditions', 'calculations', 'spec_limits', 'metadata', 'name', 'category',
+                       'checkbox_vars', '_graph')
+
+    def _begin_change(self):
+        self._spec_cache = None
+        self._long_cache = None
+        self._content_key = None
+
+        # first change inside a batch saves the state to roll back to
+        if self._batch_depth and self._batch_snapshot is None:
+            self._batch_snapshot = self._snapshot()
+
+    def _snapshot(self):
+        state = {attr: copy.deepcopy(getattr(self, attr)) for attr in self._SNAPSHOT_ATTRS}
+        # the columns themselves are only copied once something is about to edit them (_touch)
+        state['results'] = self.results.copy()
+        state['specifications'] = self.specifications.copy()
+        # root_table is only patched when the batch ends, so it can be kept as it is
+        state['root_table'] = self.root_table
+        state['_dirty'] = copy.deepcopy(self._dirty)
+        state['_stale'] = self._stale
+        return state
+
+    def _touch(self, store, *names):
+        """
+        Call before editing stored columns in place. Inside a batch, the first edit of
+        each column keeps a copy of it to roll back to.
+        """
+        snapshot = self._batch_snapshot
+        if snapshot is None:
+            return
+
+        saved = snapshot['results'] if store is self.results else snapshot['specifications']
+        for name in names:
+            column = store.get(name)
+            if column is not None and saved.get(name) is column:
+                dict.__setitem__(saved, name, column.copy())
+
+    def begin_batch(self):
+        self._batch_depth += 1
+
+    def end_batch(self, commit: bool = True):
+        """
+        Leaves a batch. The outermost one either patches the table once (commit)
+        or puts back the state from before the first change (rollback).
+        """
+        self._batch_depth -= 1
+        if self._batch_depth:
+            return
+
+        snapshot = self._batch_snapshot
+        self._batch_snapshot = None
+
+        if not commit:
+            if snapshot is not None:
+                self.__dict__.update(snapshot)
+                self._combo_index = None
+                self._spec_cache = None
+                self._long_cache = None
+                self._aggregate_cache = {}
+                self._content_key = None
+            return
+
+        self.refresh_table()
+
+    @contextmanager
+    def batch(self):
+        """
+        with test.batch():
+            test.add_CC(...)
+            test.add_Re(...)
+
+        Changes are validated as they're made but the table is only rebuilt/patched once, on exit.
+        If the block raises, every change made inside it is rolled back.
+        """
+        self.begin_batch()
+        try:
+            yield self
+        except BaseException:
+            self.end_batch(commit=False)
+            raise
+        self.end_batch()
+
+    # ----- Table Maintenance -----
+
+    def _mark_dirty(self, *names, rows=None):
+        """
+        Flags columns of root_table as out of date. rows limits the rewrite to those cells.
+        """
+        if self._aggregate_cache:
+            # aggregates reading these columns, or calculations made from them
+            changed = set(names).union(self._graph.downstream(names))
+            self._aggregate_cache = {key: entry for key, entry in self._aggregate_cache.items()
+                                     if not entry[0] & changed}
+
+        for name in names:
+            if rows is None or name in self._dirty and self._dirty[name] is None:
+                self._dirty[name] = None
+            else:
+                self._dirty.setdefault(name, set()).update(rows)
+
+    def _column_values(self, tag, df, num_rows=None, start=0):
+        """
+        Returns the column for a metadata tag (rows start:start + num_rows), computed from the stored data.
+        df is the table so far (or a dict of its columns) for calculations to read from.
+        """
+        col_name = self.metadata[tag]
+        if num_rows is None:
+            num_rows = len(self.combo_index) - start
+        stop = start + num_rows
+
+        if tag.startswith('Re'):
+            return self.results[col_name].to_array(start=start, stop=stop)
+        elif tag.startswith('Ca'):
+            return self.evaluate_column(self.calculations.get(col_name, ''), df, num_rows, start)
+        elif tag.startswith('Sp'):
+            if col_name in self.spec_limits:
+                return np.full(num_rows, self.spec_limits[col_name].label(), dtype=object)
+            return self.specifications[col_name].to_array(start=start, stop=stop)
+        return [None] * num_rows
+
+    def _stored_column(self, tag):
+        col_name = self.metadata[tag]
+        if tag.startswith('Re'):
+            return self.results.get(col_name)
+        elif tag.startswith('Sp'):
+            return self.specifications.get(col_name)
+        return None
+
+    @traced('Test.refresh_table')
+    def refresh_table(self):
+        """
+        Brings root_table up to date with the stored data, only touching dirty columns.
+        Falls back to build_table() when the row layout changed.
+        Inside a batch this waits until the batch ends.
+        """
+        if self._batch_depth:
+            return
+
+        if self._stale or self.virtual != isinstance(self.root_table, VirtualTable) \
+                or len(self.root_table.index) != len(self.combo_index):
+            self.build_table()
+            return
+
+        if self.virtual:
+            # nothing to patch, the virtual table reads the stored data on demand
+            self._dirty = {}
+            return
+
+        if not self._dirty:
+            return
+
+        df = self.root_table
+        dirty = self._dirty
+        self._dirty = {}
+
+        tags = {col_name: tag for tag, col_name in self.metadata.items()}
+        order = list(self.metadata.values())
+
+        # columns that aren't in the test anymore, whether or not they were marked
+        gone = [name for name in df.columns if name not in tags]
+        if gone:
+            df.drop(columns=gone, inplace=True)
+
+        # only the calculations downstream of what changed, in dependency order
+        calcs = [name for name in self._graph.downstream(dirty.keys()) if name in tags]
+        sources = [name for name in order if name in dirty and name not in calcs]
+
+        for name in sources + calcs:
+
+            tag = tags[name]
+            rows = dirty.get(name)
+
+            stored = self._stored_column(tag)
+            if name in df.columns and rows is not None and name not in calcs and stored is not None \
+                    and df[name].dtype == stored.dtype:
+                # single cell writes (an all-text column can come back from pandas as str, which takes no numbers)
+                for row in rows:
+                    df.at[row, name] = stored.table_value(row)
+                continue
+
+            values = self._column_values(tag, df)
+            if name in df.columns:
+                df[name] = values
+            else:
+                # new column, insert it where metadata says it goes
+                position = sum(1 for n in order[:order.index(name)] if n in df.columns)
+                df.insert(position, name, values)
+
+    @property
+    def virtual(self):
+        return len(self.combo_index) > self.VIRTUAL_ROW_LIMIT
+
+    def compute_columns(self, start: int = 0, stop: int = None, names=None):
+        """
+        Computes table columns for rows start:stop straight from the stored data.
+        names limits it to those columns plus whatever their formulas read.
+        Returns a dict of column name -> array.
+        """
+        combos = self.combo_index
+        stop = len(combos) if stop is None else min(stop, len(combos))
+        num_rows = max(stop - start, 0)
+
+        tags = {col_name: tag for tag, col_name in self.metadata.items()}
+        if names is None:
+            wanted = set(tags)
+        else:
+            wanted = set(names)
+            stack = list(names)
+            while stack:
+                for ref in self._graph.references.get(stack.pop(), ()):
+                    if ref not in wanted:
+                        wanted.add(ref)
+                        stack.append(ref)
+
+        columns = {}
         cc_index = 0
         for tag in self.metadata.keys():
             col_name = self.metadata[tag]
 
             if tag.startswith('CC'):
                 # cc_index = int(tag[2:]) - 1
-                
-                print(f"\nCC_INDEX: {cc_index}\n")
                 # cc_index = list(self.column_conditions.keys()).index(col_name)
-                col_values = [combo[cc_index] for combo in combos]
-                df[col_name] = col_values
+                if col_name in wanted:
+                    columns[col_name] = combos.column(cc_index, start, stop)
                 cc_index+=1
 
-            elif tag.startswith('Re'):
-                df[col_name] = self.results[col_name]
+            elif not tag.startswith('Ca') and col_name in wanted:
+                columns[col_name] = self._column_values(tag, columns, num_rows, start)
 
-            elif tag.startswith('Ca'):
-                formula = self.calculations.get(col_name, '')
-                df[col_name] = [self.evaluate_formula(formula, df.iloc[i]) for i in range(num_rows)]
+        # calculations go last, in dependency order, so a formula can read a Ca defined after it
+        for col_name in self._graph.order():
+            if col_name in tags and col_name in wanted:
+                columns[col_name] = self._column_values(tags[col_name], columns, num_rows, start)
 
-            elif tag.startswith('Sp'):
-                df[col_name] = self.specifications[col_name]
+        return columns
 
+    def build_table(self):
+        combos = self.combo_index
+        num_rows = len(combos)
+        log.debug("building %r: %s", self.name, combos)
 
+        with span('Test.build_table', test=lambda: self.name, rows=num_rows, virtual=lambda: self.virtual):
+            if self.virtual:
+                self.root_table = VirtualTable(self)
             else:
-                df[col_name] = [None] * num_rows
+                columns = self.compute_columns()
+                order = [col_name for col_name in self.metadata.values() if col_name in columns]
+                self.root_table = pd.DataFrame({col_name: columns[col_name] for col_name in order}, index=range(num_rows))
 
-        self.root_table = df
+        self._dirty = {}
+        self._stale = False
 
-        print(self.root_table.head())
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("built table:\n%s", self.root_table.head())
 
     def manual_table_input(self):
         pass
@@ -1,8 +1,22 @@
 from model.cover_page import CoverPage
 from model.test_model import Test
+from model.report_archive import is_archive, read_archive, replace_file, write_archive
+from model.journal import Journal, journal_path, journaled
+from model.history import History
+from model.csv_export import LONG_LAYOUT, save_csv
+from model.csv_import import import_csv
+from model.long_view import assemble, filter_view
+from model.latex_render import render_report
+from contextlib import contextmanager
+import copy
+import os
 import pickle
 import pandas as pd
 
+from utils.tracing import get_logger, span
+
+log = get_logger(__name__)
+
 
 class TestReport():
     def __init__(self, title=''):
@@ -12,34 +26,247 @@ class TestReport():
 
         self.selected_test = None
 
-
+        # (category, name) -> tests with that key, category -> its tests in order, and test -> position in self.tests
+        self._test_index = {}
+        self._category_index = {}
+        self._positions = {}
+
+        # tests taking part in the current batch(), None outside of one
+        self._batch_tests = None
+        self._batch_snapshot = None
+
+        # edit log for the archive this report was last saved to or opened from
+        self._journal = None
+        self._archive_id = None
+
+        # ([(test slice, category, name)], frame) of the last long_view()
+        self._long_view = None
+
+        # bumped by every journaled edit, dirty until a save catches up
+        self._revision = 0
+        self._saved_revision = 0
+
+        # undo/redo of journaled edits, only kept in memory
+        self._history = History()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('_batch_tests', None)
+        self.__dict__.setdefault('_batch_snapshot', None)
+        self.__dict__.setdefault('_journal', None)
+        self.__dict__.setdefault('_archive_id', None)
+        self.__dict__.setdefault('_long_view', None)
+        self.__dict__.setdefault('_revision', 0)
+        self.__dict__.setdefault('_saved_revision', self._revision)
+        self.__dict__.setdefault('_history', History())
+        self._rebuild_index()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_batch_tests'] = None
+        state['_batch_snapshot'] = None
+        # rebuilt from self.tests on load
+        state.pop('_test_index', None)
+        state.pop('_category_index', None)
+        state.pop('_positions', None)
+        state.pop('_journal', None)
+        state.pop('_archive_id', None)
+        state.pop('_long_view', None)
+        state.pop('_revision', None)
+        state.pop('_saved_revision', None)
+        state.pop('_history', None)
+        return state
+
+    @contextmanager
+    def batch(self):
+        """
+        with report.batch():
+            report.add_CC(...)
+            report.add_Re(...)
+
+        Every test touched inside the block rebuilds its table once, on exit.
+        If the block raises, the tests, selection and cover page go back to how they were.
+        """
+        if self._batch_tests is not None:
+            # already inside a batch, the outer one does the work
+            yield self
+            return
+
+        self._batch_snapshot = {
+            'tests': list(self.tests),
+            'selected_test': self.selected_test,
+            'cover_page': copy.deepcopy(self.cover_page),
+            # renames don't go through the tests' own batches
+            'keys': [(test, test.category, test.name) for test in self.tests],
+        }
+        # tests that haven't been loaded yet join the batch when they load (see _test_loaded)
+        self._batch_tests = [test for test in self.tests if test.loaded]
+        for test in self._batch_tests:
+            test.begin_batch()
+        journal = self._journal
+        if journal is not None:
+            journal.hold()
+        history = self._history
+        history.hold()
+
+        commit = False
+        try:
+            yield self
+            commit = True
+        finally:
+            tests = self._batch_tests
+            snapshot = self._batch_snapshot
+            self._batch_tests = None
+            self._batch_snapshot = None
+
+            for test in tests:
+                test.end_batch(commit)
+            if journal is not None and journal is self._journal:
+                journal.release(commit)
+            history.release(commit)
+
+            if not commit:
+                self.tests = snapshot['tests']
+                self.selected_test = snapshot['selected_test']
+                self.cover_page = snapshot['cover_page']
+                for test, category, name in snapshot['keys']:
+                    test.category = category
+                    test.name = name
+
+            # names and categories may have moved around inside the block
+            self._rebuild_index()
+
+
+    @journaled
     def add_test(self, test_category, test_name):
         new_test = Test(test_category, test_name)
         self.tests.append(new_test)
-        print("A new test has been created!")
+        self._positions[new_test] = len(self.tests) - 1
+        self._index_test(new_test)
+
+        if self._batch_tests is not None:
+            new_test.begin_batch()
+            self._batch_tests.append(new_test)
+        log.debug("created test %r in %r", new_test.name, new_test.category)
 
         if not self.selected_test:
             self.selected_test = new_test
 
+    @journaled
     def remove_test(self, cat_del, name_del):
-        for test in self.tests:
-            if test.category == cat_del and test.name == name_del:
-                self.tests.remove(test)
-                return
-        
-        # self.tests.pop()
+        test = self.get_test(cat_del, name_del)
+        if test is None:
+            return
+
+        self._unindex_test(test)
+        position = self._positions.pop(test)
+        del self.tests[position]
+        # tests after the removed one move up
+        for i in range(position, len(self.tests)):
+            self._positions[self.tests[i]] = i
+
+        if self.selected_test is test:
+            self.selected_test = self.tests[0] if self.tests else None
 
     def select_test(self, test_category, test_name):
+        # not journaled: edits are recorded with the position of the test they hit, and
+        # selecting doesn't change the report (older journals may still have select_test records)
+        test = self.get_test(test_category, test_name)
+        if test is not None:
+            # tests opened from an archive are read in on first selection
+            test.load()
+            self.selected_test = test
+
+    def get_test(self, test_category, test_name):
+        """
+        The test with that category and name (the first one added if there are duplicates), or None.
+        """
+        tests = self._test_index.get((test_category, test_name))
+        return tests[0] if tests else None
+
+    def get_categories(self):
+        return list(self._category_index)
+
+    def get_category_tests(self, category):
+        return list(self._category_index.get(category, ()))
+
+    # ----- Test Index -----
+
+    def _test_position(self, test):
+        if test is None:
+            return None
+        return self._positions[test]
+
+    def _test_loaded(self, test):
+        # a deferred test was just read in from an archive
+        if self._batch_tests is not None and test in self._positions:
+            test.begin_batch()
+            self._batch_tests.append(test)
+
+    def _rebuild_index(self):
+        self._test_index = {}
+        self._category_index = {}
+        self._positions = {test: i for i, test in enumerate(self.tests)}
         for test in self.tests:
-            if test_category == test.category and test_name == test.name:
-                self.selected_test = test
-            
+            self._index_test(test)
+
+    def _index_test(self, test):
+        # both indexes keep report order, a renamed test can land ahead of the ones already there
+        position = self._positions[test]
+        tests = self._test_index.setdefault((test.category, test.name), [])
+        tests.append(test)
+        if len(tests) > 1 and self._positions[tests[-2]] > position:
+            tests.sort(key=self._positions.__getitem__)
+
+        # dict as an ordered set, so removing a test doesn't scan the category
+        category = self._category_index.setdefault(test.category, {})
+        last = next(reversed(category), None)
+        category[test] = None
+        if last is not None and self._positions[last] > position:
+            self._category_index[test.category] = dict.fromkeys(sorted(category, key=self._positions.__getitem__))
+
+    def _unindex_test(self, test):
+        key = (test.category, test.name)
+        tests = self._test_index.get(key)
+        if tests is not None and test in tests:
+            tests.remove(test)
+            if not tests:
+                del self._test_index[key]
+
+        category = self._category_index.get(test.category)
+        if category is not None:
+            category.pop(test, None)
+            if not category:
+                del self._category_index[test.category]
+
     
     # ----- Cover Page Pass Through Functions -----
 
+    @journaled
     def add_equipment(self, equipment):
         self.cover_page.add_equipment(equipment)
 
+    @journaled
+    def edit_equipment(self, index, field, value):
+        self.cover_page.edit_equipment(index, field, value)
+
+    @journaled
+    def remove_equipment(self, index):
+        self.cover_page.remove_equipment(index)
+        # checked equipment is stored by row, so rows below the removed one move up
+        for test in self.tests:
+            test.set_checkbox_vars([i if i < index else i - 1 for i in test.checkbox_vars if i != index])
+
+    @journaled
+    def set_equipment_checked(self, index, checked: bool = True):
+        checkbox_vars = list(self.selected_test.checkbox_vars)
+        if checked and index not in checkbox_vars:
+            checkbox_vars.append(index)
+        elif not checked and index in checkbox_vars:
+            checkbox_vars.remove(index)
+        self.selected_test.set_checkbox_vars(checkbox_vars)
+
+    @journaled
     def add_general_specification(self, name, value):
         self.cover_page.add_general_specification(name, value)
 
@@ -47,36 +274,162 @@ class TestReport():
 
     # -------- Test Pass through Functions ---------
 
+    @journaled
     def add_CC(self, name: str = '', values=None):
         self.selected_test.add_CC(name, values)
 
+    @journaled
     def edit_CC(self, col_tag='', new_name='', new_values=None):
         self.selected_test.edit_CC(col_tag, new_name, new_values)
 
+    @journaled
     def del_CC(self, col_tag):
         self.selected_test.del_CC(col_tag)
 
+    @journaled
     def add_Re(self, name: str = ''):
         self.selected_test.add_Re(name)
 
+    @journaled
     def edit_Re_name(self, col_tag, new_name):
         self.selected_test.edit_Re_name(col_tag, new_name)
 
+    @journaled
     def del_Re(self, col_tag):
         self.selected_test.del_Re(col_tag)
 
+    @journaled
     def edit_Re_val(self, name, row, value):
         self.selected_test.edit_Re_val(name, row, value)
 
+    @journaled
+    def set_Re_rows(self, name, rows, values):
+        return self.selected_test.set_Re_rows(name, rows, values)
+
+    @journaled
+    def set_cells(self, name, rows, values):
+        self.selected_test.set_cells(name, rows, values)
+
+    @journaled
     def add_Ca(self, name: str = '', formula: str = ''):
         self.selected_test.add_Ca(name, formula)
 
-    def add_Sp(self, name: str = '', specifications=None):
-        self.selected_test.add_Sp(name, specifications)
+    @journaled
+    def add_Sp(self, name: str = '', specifications=None, limit=None):
+        self.selected_test.add_Sp(name, specifications, limit)
 
     def update_from_dataframe(self, new_df: pd.DataFrame):
-        self.selected_test.update_from_dataframe(new_df)
+        # journaled and undone as the cells that changed, not the whole frame
+        test = self.selected_test
+        with self.batch():
+            for name, rows, values in test.changed_cells(new_df):
+                if name not in test.results and name not in test.specifications:
+                    self.add_Re(name)
+                if len(rows):
+                    self.set_cells(name, rows, values)
     
+    # ----- Undo / Redo -----
+
+    def undo(self):
+        """
+        Takes back the last edit, or the last batch of them. Returns False if there was nothing to undo.
+        The test it happened on is selected afterwards.
+        """
+        change = self._pop_change(self._history.pop_undo)
+        if change is None:
+            return False
+
+        try:
+            with span('TestReport.undo', records=lambda: len(change.inverse)), self._history.paused():
+                self._apply(change.inverse)
+        except Exception:
+            # half taken back, the steps left don't line up with the report any more
+            self._history.clear()
+            raise
+        self._history.push_redo(change)
+        return True
+
+    def redo(self):
+        """
+        Makes the last undone edit again. Returns False if there was nothing to redo.
+        """
+        change = self._pop_change(self._history.pop_redo)
+        if change is None:
+            return False
+
+        history = self._history
+        with span('TestReport.redo', records=lambda: len(change.forward)), history.redoing():
+            # recorded again as one step, with a fresh inverse
+            history.hold()
+            try:
+                self._apply(change.forward)
+            finally:
+                history.release()
+        return True
+
+    @property
+    def can_undo(self):
+        return self._history.can_undo
+
+    @property
+    def can_redo(self):
+        return self._history.can_redo
+
+    def _pop_change(self, pop):
+        if self._batch_tests is not None:
+            raise RuntimeError("Can't undo or redo in the middle of a batch.")
+        return pop()
+
+    def _apply(self, records):
+        # like _replay, but a failure stops here
+        for op, position, args, kwargs in records:
+            if position is not None:
+                self.selected_test = self.tests[position]
+            getattr(self, op)(*args, **kwargs)
+
+    @journaled
+    def _restore_test(self, **parts):
+        # undo of a test edit, parts are what model.history saved before it
+        self.selected_test.restore(**parts)
+
+    @journaled
+    def _restore_cover_page(self, equipment_used=None, general_specifications=None, checkbox_vars=None):
+        if equipment_used is not None:
+            self.cover_page.equipment_used = equipment_used.copy()
+        if general_specifications is not None:
+            self.cover_page.general_specifications = dict(general_specifications)
+        for position, checked in (checkbox_vars or {}).items():
+            self.tests[position].set_checkbox_vars(checked)
+
+    # ----- Long View -----
+
+    def long_view(self):
+        """
+        Every test's result and calculation cells as one long frame (see model.long_view).
+        Only tests that changed since the last call build their slice again. Tests that
+        haven't been loaded from the archive yet get loaded.
+        """
+        parts = [(test, test.long_slice()) for test in self.tests]
+        key = [(part, test.category, test.name) for test, part in parts]
+
+        cached = self._long_view
+        if cached is not None and len(cached[0]) == len(key) \
+                and all(old[0] is new[0] and old[1:] == new[1:] for old, new in zip(cached[0], key)):
+            return cached[1]
+
+        with span('TestReport.long_view', tests=lambda: len(parts)):
+            view = assemble(parts)
+        self._long_view = (key, view)
+        return view
+
+    def query(self, columns=None, tests=None, categories=None, conditions=None, status=None, value_range=None):
+        """
+        Rows of long_view() matching every filter, e.g. every failed row at Vin = 12 in any test:
+            report.query(conditions={'Vin': 12}, status='fail')
+        See model.long_view.filter_view for the filters.
+        """
+        return filter_view(self.long_view(), columns, tests, categories, conditions, status, value_range)
+
     # ----- Cover Page Getter Functions -----
 
     def get_equipment_used(self):
@@ -107,36 +460,220 @@ class TestReport():
         return self.selected_test.calculations
     
     def get_root_table(self):
+        # tables aren't saved with the report, build it if this test hasn't yet
+        self.selected_test.refresh_table()
         return self.selected_test.root_table
 
     # ------------- Test Setter Functions ---------
 
+    @journaled
     def set_test_name(self, name):
+        self._unindex_test(self.selected_test)
         self.selected_test.name = name
+        self._index_test(self.selected_test)
 
+    @journaled
     def set_cat_name(self, cat):
+        self._unindex_test(self.selected_test)
         self.selected_test.category = cat
+        self._index_test(self.selected_test)
 
+    @journaled
     def rename_category(self, old_cat, new_cat):
+        moved = self.get_category_tests(old_cat)
+        if not moved or old_cat == new_cat:
+            return
+        # the categories are merged in one go, not sorted again for every test
+        merged = sorted(self.get_category_tests(new_cat) + moved, key=self._positions.__getitem__)
+        for test in merged:
+            self._unindex_test(test)
+        for test in moved:
+            test.category = new_cat
+        for test in merged:
+            self._index_test(test)
+
+
+    # ------------- Report Summary ---------------
+
+    def pass_fail_counts(self):
+        """
+        Pass/fail/untested totals across every test, plus the counts for each test.
+        """
+        totals = {'pass': 0, 'fail': 0, 'untested': 0, 'tests': {}}
+
         for test in self.tests:
-            if test.category == old_cat:
-                test.category = new_cat
+            counts = test.pass_fail_counts()
+            totals['tests'][(test.category, test.name)] = counts
+            for key in ('pass', 'fail', 'untested'):
+                totals[key] += counts[key]
+
+        return totals
 
 
     def reference_cp_gen_specs(self):
         pass
 
 
+    @property
+    def dirty(self):
+        # edited since the last save
+        return self._revision != self._saved_revision
+
+    def snapshot(self):
+        """
+        Detached copy of the report to save from another thread (see Test.snapshot).
+        """
+        report = TestReport.__new__(TestReport)
+        state = self.__getstate__()
+        state['cover_page'] = copy.deepcopy(self.cover_page)
+        state['tests'] = [test.snapshot() for test in self.tests]
+        position = self._test_position(self.selected_test)
+        state['selected_test'] = None if position is None else state['tests'][position]
+        report.__setstate__(state)
+        return report
+
+    def prepare_save(self, filepath):
+        """
+        Splits a save into the cheap part that has to happen on this thread and the writing,
+        which can happen on any thread. Returns (write, finish): call write() anywhere,
+        then finish(result of write) back on this thread, or finish(None, error) if it
+        raised so nothing is lost.
+
+        Saving again to the archive the report came from only appends the edits made since
+        to its journal, until the journal is big enough to be worth compacting.
+        """
+        revision = self._revision
+
+        if str(filepath).lower().endswith('.pickle'):
+            snapshot = self.snapshot()
+
+            def finish(result, error=None):
+                if error is None:
+                    self._saved(revision)
+
+            return (lambda: snapshot.pickle(filepath)), finish
+
+        journal = self._journal
+        if journal is not None and journal.filepath == journal_path(filepath) and os.path.exists(filepath) \
+                and (self._batch_tests is not None or not journal.should_compact(os.path.getsize(filepath))):
+            records = journal.take()
+
+            def finish(result, error=None):
+                if error is None:
+                    self._saved(revision)
+                else:
+                    # put the records back so the next save tries them again
+                    journal.pending[:0] = records
+                    journal._holds = [mark + len(records) for mark in journal._holds]
+
+            return (lambda: journal.write(records)), finish
+
+        # compact: rewrite the archive, then start a new journal for it
+        if self._batch_tests is not None:
+            raise RuntimeError("Can't rewrite the report in the middle of a batch.")
+
+        snapshot = self.snapshot()
+        if journal is None:
+            # collect edits made while the archive is written, they go in the new journal
+            self._journal = journal = Journal(None, None)
+        journal.pending.clear()
+
+        def write():
+            archive_id = write_archive(snapshot, filepath)
+            new_journal = Journal(journal_path(filepath), archive_id)
+            new_journal.start()
+            return new_journal
+
+        def finish(new_journal, error=None):
+            if error is not None:
+                # the edits cleared above are only in memory now, the next save has to compact again
+                self._journal.filepath = None
+                return
+
+            if self._journal is not None:
+                new_journal.pending = self._journal.pending
+                new_journal._holds = self._journal._holds
+            self._journal = new_journal
+            self._archive_id = new_journal.base_id
+            # the snapshot's deferred tests were repointed at the new file, these have to follow
+            for test in self.tests:
+                if not test.loaded:
+                    test.__dict__['_loader'].filepath = filepath
+            self._saved(revision)
+
+        return write, finish
+
+    def _saved(self, revision):
+        self._saved_revision = revision
+
+    def save(self, filepath):
+        """
+        Saves to a report archive, or a plain pickle when filepath ends in .pickle.
+        """
+        write, finish = self.prepare_save(filepath)
+        try:
+            result = write()
+        except BaseException as e:
+            finish(None, e)
+            raise
+        finish(result)
+
+    def compact(self, filepath):
+        """
+        Rewrites the whole archive and starts an empty journal for it.
+        """
+        journal = self._journal
+        if journal is not None and journal.filepath == journal_path(filepath):
+            # already in memory, no need to write it down first
+            journal.filepath = None
+        self.save(filepath)
+
+    @staticmethod
+    def open(filepath):
+        """
+        Opens a report archive (tests load as they're selected) or an older .pickle report.
+        Edits journaled since the archive was last compacted are replayed.
+        """
+        if not is_archive(filepath):
+            return TestReport.unpickle(filepath)
+
+        report = read_archive(filepath, TestReport)
+        if report._archive_id is not None:
+            journal = Journal(journal_path(filepath), report._archive_id)
+            report._replay(journal.read())
+            report._journal = journal
+            report._saved_revision = report._revision
+        return report
+
+    def _replay(self, records):
+        with span('TestReport.replay', records=lambda: len(records)), self._history.paused(), self.batch():
+            for op, position, args, kwargs in records:
+                self.selected_test = None if position is None else self.tests[position]
+                try:
+                    getattr(self, op)(*args, **kwargs)
+                except Exception:
+                    log.exception("stopped replaying the journal at %s%s", op, args)
+                    break
+
+    def load_tests(self):
+        for test in self.tests:
+            test.load()
+
     def pickle(self, filepath=None):
         if filepath is None:
             filepath = f"{self.title}.pickle"
 
-        with open(filepath, 'wb') as file:
-            pickle.dump(self, file)
+        # written next to the real file and swapped in, so a crash mid-write can't corrupt it
+        temp_path = f"{filepath}.tmp"
+        with span('TestReport.pickle', path=filepath), open(temp_path, 'wb') as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        replace_file(temp_path, filepath)
 
     @staticmethod
     def unpickle(filepath):
-        with open(filepath, 'rb') as file:
+        with span('TestReport.unpickle', path=filepath), open(filepath, 'rb') as file:
             report = pickle.load(file)
 
         if not isinstance(report, TestReport):
@@ -144,8 +681,30 @@ class TestReport():
         
         return report
 
-    def save_latex_pdf(self, filepath=None):
-        pass
-
-    def save_csv(self, filepath=None):
-        pass
\ No newline at end of file
+    def save_latex_pdf(self, filepath=None, engine: str = None, jobs: int = None, cache_dir: str = None):
+        """
+        Renders the cover page and every test to a PDF (or just LaTeX, if filepath ends in .tex).
+        Tests that haven't changed since the last render come from the fragment cache.
+        Raises LatexError if there's no TeX engine or it fails.
+        """
+        if filepath is None:
+            filepath = f"{self.title}.pdf"
+        return render_report(self, filepath, engine=engine, jobs=jobs, cache_dir=cache_dir)
+
+    def import_csv(self, filepath, columns=None, conditions=None, duplicates: str = 'last', **read_options):
+        """
+        Streams a CSV log into the selected test's result columns, matching lines to rows by
+        their CC values (see model.csv_import). Returns an ImportResult with the unmatched
+        and duplicate lines.
+        """
+        return import_csv(self, filepath, columns, conditions, duplicates, **read_options)
+
+    def save_csv(self, filepath=None, layout: str = LONG_LAYOUT, skip_blank: bool = True):
+        """
+        Exports every test's table, streamed a chunk of rows at a time.
+        layout='long' writes one CSV with a row per cell (category, test, CCs..., column, value),
+        layout='tests' writes one CSV per test into the folder filepath.
+        """
+        if filepath is None:
+            filepath = f"{self.title}.csv" if layout == LONG_LAYOUT else self.title
+        return save_csv(self, filepath, layout, skip_blank=skip_blank)
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Numbers typed with SI prefixes and units, the way results get typed into the sheet:
+
+    '3.3mV' -> 0.0033 V     '12 V' -> 12 V     '1.2k' -> 1200     '4.7 µF' -> 4.7e-06 F
+    '-40°C' -> -40 °C       '10%'  -> 10 %     '--'   -> blank    'PASS'   -> text
+
+The number is scaled to the base unit, the unit is kept without its prefix ('' for a
+plain number). Placeholders like '--' and 'N/A' count as blank. Anything else that
+isn't a number followed by a known suffix is text.
+
+Column keeps what parse_quantities() gives for its text cells as a numeric shadow
+(see model.column_store), so formulas, spec checks and exports don't parse again.
+"""
+import math
+import re
+
+import numpy as np
+import pandas as pd
+
+
+PREFIXES = {
+    'p': 1e-12, 'n': 1e-9, 'u': 1e-6, 'µ': 1e-6, 'μ': 1e-6, 'm': 1e-3,
+    'k': 1e3, 'K': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12,
+}
+
+# spellings -> unit, these take a prefix
+UNITS = {
+    'V': 'V', 'A': 'A', 'W': 'W', 'VA': 'VA', 'Wh': 'Wh', 'J': 'J',
+    'Ω': 'Ω', 'ohm': 'Ω', 'Ohm': 'Ω', 'ohms': 'Ω', 'Ohms': 'Ω',
+    'Hz': 'Hz', 'F': 'F', 'H': 'H', 'S': 'S', 's': 's', 'sec': 's',
+}
+
+# units that never take a prefix ('dBm' isn't deci-Bm)
+PLAIN_UNITS = {
+    '%': '%', 'ppm': 'ppm', 'dB': 'dB', 'dBm': 'dBm', 'dBc': 'dBc', 'dBV': 'dBV',
+    '°C': '°C', 'degC': '°C', '°F': '°F', 'degF': '°F',
+}
+
+# typed into a cell to say there's no value, lower case
+PLACEHOLDERS = {'-', '--', '---', '—', '–', 'n/a', 'na', 'none', 'nan', '?'}
+
+_QUANTITY = re.compile(r'^\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)\s*(\S*)\s*$')
+
+
+def resolve_suffix(suffix: str):
+    """
+    (scale, unit) for what follows the number, or None if it isn't a prefix and/or unit.
+    """
+    if suffix == '':
+        return 1.0, ''
+    if suffix in PLAIN_UNITS:
+        return 1.0, PLAIN_UNITS[suffix]
+    if suffix in UNITS:
+        return 1.0, UNITS[suffix]
+    if suffix in PREFIXES:
+        return PREFIXES[suffix], ''
+    if suffix[0] in PREFIXES and suffix[1:] in UNITS:
+        return PREFIXES[suffix[0]], UNITS[suffix[1:]]
+    return None
+
+
+def is_placeholder(value):
+    return isinstance(value, str) and value.strip().lower() in PLACEHOLDERS
+
+
+def parse_quantity(value):
+    """
+    (number, unit) for one cell. (nan, None) for blanks, placeholders and text.
+    """
+    if value is None or isinstance(value, bool):
+        return math.nan, None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        value = float(value)
+        return (value, '') if math.isfinite(value) else (math.nan, None)
+
+    match = _QUANTITY.match(str(value))
+    if match is None:
+        return math.nan, None
+    resolved = resolve_suffix(match.group(2))
+    if resolved is None:
+        return math.nan, None
+    scale, unit = resolved
+    return float(match.group(1)) * scale, unit
+
+
+def parse_quantities(values):
+    """
+    Parses many cells at once, one regex pass over the distinct strings and one lookup per suffix.
+    Returns (numbers, units, text): float64 with NaN where there's no quantity, the unit of each
+    quantity (None elsewhere), and True for cells that are text rather than blank or a placeholder.
+    """
+    raw = np.empty(len(values), dtype=object)
+    raw[:] = values if isinstance(values, np.ndarray) else list(values)
+    count = len(raw)
+
+    numbers = np.full(count, np.nan)
+    units = np.full(count, None, dtype=object)
+    text = np.zeros(count, dtype=bool)
+    if not count:
+        return numbers, units, text
+
+    is_str = np.fromiter((isinstance(v, str) for v in raw), dtype=bool, count=count)
+
+    # True/False aren't quantities, same as parse_quantity()
+    others = np.flatnonzero(~is_str & ~np.fromiter((isinstance(v, bool) for v in raw), dtype=bool, count=count))
+    if len(others):
+        values = np.array(pd.to_numeric(pd.Series(raw[others], dtype=object), errors='coerce'), dtype=float)
+        values[~np.isfinite(values)] = np.nan
+        numbers[others] = values
+        units[others[~np.isnan(values)]] = ''
+
+    strings = np.flatnonzero(is_str)
+    if len(strings):
+        # typed values repeat a lot, each distinct one is parsed once
+        codes, distinct = pd.factorize(raw[strings])
+        series = pd.Series(distinct, dtype=object)
+        parts = series.str.extract(_QUANTITY.pattern)
+        value = np.array(pd.to_numeric(parts[0], errors='coerce'), dtype=float)
+
+        suffix_codes, suffixes = pd.factorize(parts[1])
+        resolved = [resolve_suffix(suffix) for suffix in suffixes]
+        # code -1 (no match) picks the last entry
+        scales = np.array([r[0] if r else np.nan for r in resolved] + [np.nan])
+        names = np.array([r[1] if r else None for r in resolved] + [None], dtype=object)
+
+        value = value * scales[suffix_codes]
+        found = ~np.isnan(value)
+        unit = np.where(found, names[suffix_codes], None)
+
+        stripped = series.str.strip()
+        blank = ((stripped == '') | stripped.str.lower().isin(PLACEHOLDERS)).to_numpy(dtype=bool)
+
+        numbers[strings] = value[codes]
+        units[strings] = unit[codes]
+        text[strings] = (~found & ~blank)[codes]
+
+    return numbers, units, text
+
+
+def main_unit(units):
+    """
+    The unit most of the quantities have, '' if they're plain numbers, None if there are none.
+    """
+    counts = pd.Series(units, dtype=object).value_counts(sort=False, dropna=True)
+    if counts.empty:
+        return None
+    # ties go to the unit that comes first
+    return str(counts.idxmax())
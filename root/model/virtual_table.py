@@ -0,0 +1,56 @@
+import pandas as pd
+
+
+class VirtualTable():
+    """
+    Lazy stand-in for Test.root_table on grids too big to hold as a DataFrame.
+
+    Nothing is stored here. Rows are computed when asked for: CC values come from
+    the combo index, Re/Sp from the column store and Ca columns are evaluated for
+    just the requested rows.
+    """
+    def __init__(self, test):
+        self.test = test
+
+    def __len__(self):
+        return len(self.test.combo_index)
+
+    def __repr__(self):
+        return f"VirtualTable({len(self)} rows x {len(self.columns)} columns)"
+
+    @property
+    def columns(self):
+        return pd.Index(list(self.test.metadata.values()))
+
+    @property
+    def index(self):
+        return pd.RangeIndex(len(self))
+
+    @property
+    def shape(self):
+        return (len(self), len(self.columns))
+
+    @property
+    def empty(self):
+        return len(self) == 0 or len(self.columns) == 0
+
+    def window(self, start: int, stop: int, columns=None):
+        """
+        DataFrame of rows start:stop (indexed by their real row numbers).
+        columns limits it to those columns.
+        """
+        start = max(start, 0)
+        stop = max(min(stop, len(self)), start)
+
+        computed = self.test.compute_columns(start, stop, columns)
+        names = [name for name in self.columns if name in computed and (columns is None or name in columns)]
+        return pd.DataFrame({name: computed[name] for name in names}, index=range(start, stop))
+
+    def head(self, n: int = 5):
+        return self.window(0, n)
+
+    def __getitem__(self, key):
+        # a whole column (or list of columns), only computing what those need
+        if isinstance(key, str):
+            return self.window(0, len(self), [key])[key]
+        return self.window(0, len(self), list(key))
@@ -0,0 +1,59 @@
+"""
+Builders for the reports and tests most of the suite starts from.
+
+    def test_something(make_report):
+        report = make_report(conditions={'Vin': ['5', '12']}, results={'I': ['1', '3']},
+                             calculations={'P': "=CC('Vin') * Re('I')"})
+
+Columns are added in the order CCs, results (with their cells, row by row),
+calculations, specifications, the same order the app builds a test in.
+"""
+import pytest
+
+from model.test_model import Test
+from model.test_report import TestReport
+
+
+def _fill(target, conditions, results, calculations, specifications):
+    # target is a Test or a TestReport, which passes the calls on to its selected test
+    for name, values in (conditions or {}).items():
+        target.add_CC(name, list(values))
+    for name, values in (results or {}).items():
+        target.add_Re(name)
+        for row, value in enumerate(values):
+            target.edit_Re_val(name, row, value)
+    for name, formula in (calculations or {}).items():
+        target.add_Ca(name, formula)
+    for name, limit in (specifications or {}).items():
+        target.add_Sp(name, limit=limit)
+
+
+@pytest.fixture
+def make_test():
+    """
+    make_test(conditions, results, calculations, specifications) -> a Test named 'n' in category 'c'.
+    """
+    def make(conditions=None, results=None, calculations=None, specifications=None, category='c', name='n'):
+        test = Test(category, name)
+        _fill(test, conditions, results, calculations, specifications)
+        return test
+    return make
+
+
+@pytest.fixture
+def make_report():
+    """
+    make_report(conditions, results, calculations, specifications) -> a TestReport. Every test
+    in tests, (category, name) pairs, gets the same columns. equipment rows go on the cover page.
+    """
+    def make(conditions=None, results=None, calculations=None, specifications=None, tests=(('cat', 'a'),),
+             equipment=(), title=''):
+        report = TestReport(title=title)
+        for row in equipment:
+            report.add_equipment(dict(row))
+        for category, name in tests:
+            report.add_test(category, name)
+            report.select_test(category, name)
+            _fill(report, conditions, results, calculations, specifications)
+        return report
+    return make
@@ -0,0 +1,63 @@
+import pytest
+
+from model.formula import ERR
+
+
+@pytest.fixture
+def grid(make_report):
+    # a report whose test has V x T rows and values in I
+    return lambda values: make_report(conditions={'V': ['5', '12'], 'T': ['25', '85', '125']}, results={'I': values},
+                                      tests=[('c', 't')])
+
+
+def column(report, formula):
+    report.add_Ca('A', formula)
+    return report.selected_test.root_table['A'].tolist()
+
+
+def test_blanks_are_skipped(grid):
+    report = grid(['1', '2', '3', '4', '', '6'])
+    values = column(report, "=Re('I') / MAX(Re('I'), over='T')")
+    assert values[:4] == pytest.approx([1 / 3, 2 / 3, 1.0, 4 / 6])
+    # only the blank row itself has no value
+    assert values[4] == ERR
+    assert values[5] == 1.0
+
+    assert column(report, "=FIRST(Re('I'))") == [1.0] * 6
+    assert column(report, "=MEAN(Re('I'), 'V')") == [2.0] * 3 + [5.0] * 3
+    assert column(report, "=DELTA(Re('I') * 2)") == [10.0] * 6
+
+
+def test_blank_first_row(grid):
+    report = grid(['', '2', '3', '', '', '6'])
+    assert column(report, "=FIRST(Re('I'), 'V')") == [2.0] * 3 + [6.0] * 3
+    assert column(report, "=MIN(Re('I'))") == [2.0] * 6
+
+
+def test_all_blank_group(grid):
+    report = grid(['1', '2', '3', '', '', ''])
+    assert column(report, "=MAX(Re('I'), 'V')") == [3.0] * 3 + [ERR] * 3
+
+
+def test_text_and_errors_make_their_group_an_error(grid):
+    report = grid(['1', 'open', '3', '4', '', '6'])
+    assert column(report, "=MAX(Re('I'), 'V')") == [ERR] * 3 + [6.0] * 3
+
+    report = grid(['1', '2', '3', '4', '0', '6'])
+    # 1 / 0 in the second group only
+    assert column(report, "=MAX(1 / Re('I'), 'V')") == [1.0] * 3 + [ERR] * 3
+
+    report = grid(['1', '2', '3', '4', '', '6'])
+    report.add_Ca('B', "=1 / (CC('V') - 12)")
+    assert column(report, "=MIN(Ca('B'), 'V')") == [pytest.approx(-1 / 7)] * 3 + [ERR] * 3
+
+
+def test_units_and_edits(grid):
+    report = grid(['1mA', '2mA', '', '4', '5', '6'])
+    assert column(report, "=MAX(Re('I'), 'V')") == pytest.approx([0.002] * 3 + [6.0] * 3)
+
+    # the cached aggregate is dropped when a column it reads changes
+    report.edit_Re_val('I', 2, '7mA')
+    assert report.selected_test.root_table['A'].tolist()[:3] == pytest.approx([0.007] * 3)
+    report.undo()
+    assert report.selected_test.root_table['A'].tolist()[:3] == pytest.approx([0.002] * 3)
@@ -0,0 +1,93 @@
+import pickle
+
+import pytest
+
+from model.report_archive import ARCHIVE_EXTENSION
+from model.test_report import TestReport
+
+
+@pytest.fixture
+def report(make_report):
+    report = make_report(conditions={'Vin': ['5', '12']}, results={'I': ['', '2.5']},
+                         calculations={'P': "=CC('Vin') * Re('I')"}, tests=[('cat', name) for name in 'abc'],
+                         equipment=[{'Model': 'DMM'}], title='Archive')
+    for name in 'abc':
+        report.select_test('cat', name)
+        report.edit_Re_val('I', 0, name)
+    report.select_test('cat', 'b')
+    return report
+
+
+def cells(test):
+    # loaded tables are rebuilt when first shown
+    test.refresh_table()
+    return test.root_table.astype(str).values.tolist()
+
+
+@pytest.fixture
+def saved(tmp_path, report):
+    path = str(tmp_path / f"report{ARCHIVE_EXTENSION}")
+    report.save(path)
+    return report, path
+
+
+def test_open_only_reads_the_header(saved):
+    report, path = saved
+    opened = TestReport.open(path)
+    assert opened.title == 'Archive'
+    assert len(opened.cover_page.equipment_used) == 1
+    assert [test.name for test in opened.tests] == ['a', 'b', 'c']
+    assert opened.selected_test is opened.tests[1]
+    assert not any(test.loaded for test in opened.tests)
+
+
+def test_selecting_loads_one_test(saved):
+    report, path = saved
+    opened = TestReport.open(path)
+    opened.select_test('cat', 'c')
+    assert [test.loaded for test in opened.tests] == [False, False, True]
+    assert cells(opened.selected_test) == cells(report.get_test('cat', 'c'))
+
+
+def test_renames_before_loading_stick(saved):
+    report, path = saved
+    opened = TestReport.open(path)
+    opened.rename_category('cat', 'other')
+    test = opened.get_test('other', 'a')
+    test.load()
+    assert (test.category, test.name) == ('other', 'a')
+    assert cells(test) == cells(report.get_test('cat', 'a'))
+
+
+def test_resaving_keeps_tests_that_never_loaded(saved, tmp_path):
+    report, path = saved
+    opened = TestReport.open(path)
+    opened.select_test('cat', 'a')
+    opened.edit_Re_val('I', 1, '7')
+
+    copy_path = str(tmp_path / f"copy{ARCHIVE_EXTENSION}")
+    opened.save(copy_path)
+    reopened = TestReport.open(copy_path)
+    reopened.load_tests()
+    assert reopened.get_test('cat', 'a').results['I'].tolist() == ['a', 7.0]
+    for name in ('b', 'c'):
+        assert cells(reopened.get_test('cat', name)) == cells(report.get_test('cat', name))
+
+    # the unloaded tests of the saved report now read from the new file
+    assert opened.get_test('cat', 'c').__dict__['_loader'].filepath == copy_path
+
+
+def test_pickles_still_open(tmp_path, report):
+    path = str(tmp_path / 'report.pickle')
+    report.save(path)
+    opened = TestReport.open(path)
+    assert all(test.loaded for test in opened.tests)
+    assert [cells(test) for test in opened.tests] == [cells(test) for test in report.tests]
+
+
+def test_deferred_tests_pickle_as_loaded(saved):
+    report, path = saved
+    opened = TestReport.open(path)
+    loaded = pickle.loads(pickle.dumps(opened))
+    assert all(test.loaded for test in loaded.tests)
+    assert cells(loaded.tests[0]) == cells(report.tests[0])
@@ -0,0 +1,115 @@
+import pytest
+
+from model.test_model import Test
+
+
+@pytest.fixture
+def report(make_report):
+    return make_report(conditions={'Vin': ['5', '12']}, results={'Iout': []}, tests=[('c', 't')])
+
+
+def test_batch_builds_the_table_once():
+    test = Test('c', 'n')
+    builds = []
+    build_table = test.build_table
+    test.build_table = lambda: builds.append(1) or build_table()
+
+    with test.batch():
+        test.add_CC('Vin', ['5', '12'])
+        test.add_CC('Load', ['a', 'b'])
+        test.add_Re('Iout')
+        assert builds == []
+    del test.build_table
+
+    assert builds == [1]
+    assert list(test.root_table.columns) == ['Vin', 'Load', 'Iout']
+    assert len(test.root_table) == 4
+
+
+def test_test_batch_rolls_back(make_test):
+    test = make_test(conditions={'Vin': ['5', '12']}, results={'Iout': ['1']})
+
+    with pytest.raises(KeyError):
+        with test.batch():
+            test.edit_Re_val('Iout', 1, '2')
+            test.add_Re('Other')
+            test.del_Re('Re9')
+
+    assert list(test.metadata.values()) == ['Vin', 'Iout']
+    assert test.results['Iout'].tolist() == [1.0, '']
+    test.refresh_table()
+    assert list(test.root_table.columns) == ['Vin', 'Iout']
+
+
+def test_report_batch_rolls_back(report):
+    first = report.selected_test
+
+    with pytest.raises(RuntimeError):
+        with report.batch():
+            report.add_test('c', 'other')
+            report.select_test('c', 'other')
+            report.set_test_name('renamed')
+            report.add_equipment({'Model': 'DMM'})
+            raise RuntimeError('stop')
+
+    assert [test.name for test in report.tests] == ['t']
+    assert report.selected_test is first
+    assert report.get_test('c', 'renamed') is None
+    assert len(report.cover_page.equipment_used) == 0
+
+
+def test_rolled_back_batch_keeps_the_history(report):
+    report.edit_Re_val('Iout', 0, '1')
+
+    # adding a test can't be undone, but the rollback takes it back anyway
+    with pytest.raises(RuntimeError):
+        with report.batch():
+            report.add_test('c', 'other')
+            raise RuntimeError('stop')
+
+    assert report.can_undo
+    report.undo()
+    assert report.selected_test.results['Iout'].tolist() == ['', '']
+
+
+def test_committed_batch_with_an_irreversible_edit_clears_the_history(report):
+    report.edit_Re_val('Iout', 0, '1')
+    with report.batch():
+        report.edit_Re_val('Iout', 1, '2')
+        report.add_test('c', 'other')
+    assert not report.can_undo
+
+
+def test_batch_only_copies_the_columns_it_edits(make_test):
+    test = make_test(conditions={'Vin': [str(v) for v in range(1000)]}, results={'A': [], 'B': []})
+    for name in ('A', 'B'):
+        test.set_Re_rows(name, range(1000), range(1000))
+    a, b = test.results['A'], test.results['B']
+
+    with pytest.raises(RuntimeError):
+        with test.batch():
+            test.edit_Re_val('A', 3, 'open')
+            test.edit_Re_val('A', 4, '9')
+            saved = test._batch_snapshot['results']
+            # the edited column was copied once, the other one is only referenced
+            assert saved['B'] is b
+            assert saved['A'] is not a
+            raise RuntimeError('stop')
+
+    assert test.results['B'] is b
+    assert test.results['A'].is_numeric
+    assert test.results['A'][3] == 3.0 and test.results['A'][4] == 4.0
+
+
+def test_batch_rolls_back_a_cc_edit(make_test):
+    test = make_test(conditions={'Vin': ['5', '12']}, results={'I': ['', '2']})
+
+    with pytest.raises(RuntimeError):
+        with test.batch():
+            test.edit_CC('CC1', 'Vin', ['12'])
+            test.edit_Re_val('I', 0, '3')
+            raise RuntimeError('stop')
+
+    assert test.results['I'].tolist() == ['', 2.0]
+    test.refresh_table()
+    assert test.root_table['I'].tolist()[1] == 2.0
@@ -0,0 +1,40 @@
+import json
+
+from benchmarks import run as bench
+from benchmarks.synthetic import make_report
+
+
+def test_synthetic_report_shape():
+    report = make_report(tests=3, ccs=2, values_per_cc=4, results=2, calculations=2, specifications=1, fill=0.5)
+    assert len(report.tests) == 3
+    test = report.tests[0]
+    assert len(test.combo_index) == 16
+    assert list(test.root_table.columns) == ['Condition 1', 'Condition 2', 'Result 1', 'Result 2',
+                                             'Calculation 1', 'Calculation 2', 'Spec 1']
+    filled = test.results['Result 1'].filled
+    assert 0 < filled < 16
+
+
+def test_synthetic_reports_are_seeded():
+    first = make_report(tests=2, fill=0.7)
+    second = make_report(tests=2, fill=0.7)
+    assert first.tests[1].root_table.equals(second.tests[1].root_table)
+
+
+def test_run_gives_json_results():
+    results = bench.run(scales=('small',), repeat=1, corpus=False)
+    names = {result['name'] for result in results['results']}
+    assert {'build_table', 'evaluate_formula', 'evaluate_column', 'pickle', 'unpickle',
+            'save_archive', 'open_archive', 'update_from_dataframe', 'edit_Re_val'} <= names
+    for result in results['results']:
+        assert result['report'] == 'synthetic:small'
+        assert result['min_s'] <= result['median_s'] <= result['max_s']
+    json.dumps(results)
+
+
+def test_compare():
+    old = {'results': [{'report': 'r', 'name': 'case', 'median_s': 2.0}]}
+    new = {'results': [{'report': 'r', 'name': 'case', 'median_s': 1.0},
+                       {'report': 'r', 'name': 'new', 'median_s': 1.0}]}
+    lines = bench.compare(new, old)
+    assert len(lines) == 1 and '(0.50x)' in lines[0]
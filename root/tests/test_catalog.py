@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from model.catalog import Catalog
+from model.report_archive import ARCHIVE_EXTENSION
+from model.test_report import TestReport
+
+
+@pytest.fixture
+def save_report(make_report):
+    def save(path, model='X'):
+        report = make_report(conditions={'Vin': ['5', '12']}, results={'I': ['1.5', 'open']},
+                             calculations={'P': "=CC('Vin') * Re('I')"}, tests=[('cat', 'load')],
+                             equipment=[{'Type': 'DMM', 'Serial': '1'}, {'Type': 'Scope', 'Serial': '2'}],
+                             title=os.path.basename(path))
+        report.cover_page.general_specifications['Model'] = model
+        report.save(str(path))
+        return report
+    return save
+
+
+@pytest.fixture
+def catalog(tmp_path, save_report):
+    save_report(tmp_path / f"a{ARCHIVE_EXTENSION}", model='X')
+    save_report(tmp_path / f"b{ARCHIVE_EXTENSION}", model='Y')
+    with Catalog(str(tmp_path / 'catalog.sqlite')) as catalog:
+        result = catalog.scan([str(tmp_path)], jobs=1)
+        assert len(result.added) == 2 and not result.failed
+        yield catalog
+
+
+def test_query(catalog):
+    frame = catalog.query(column='I', properties={'Model': 'X'})
+    assert frame['value'].tolist() == [1.5, 'open']
+    assert frame['Vin'].tolist() == ['5', '12']
+    assert frame['title'].unique().tolist() == [f"a{ARCHIVE_EXTENSION}"]
+
+    assert catalog.query(column='P')['value'].tolist() == [7.5, '#ERR'] * 2
+    assert catalog.tests()['name'].tolist() == ['load', 'load']
+
+
+def test_equipment_fields_match_on_the_same_row(catalog):
+    assert len(catalog.query(column='I', equipment={'Type': 'DMM', 'Serial': '1'})) == 4
+    # DMM is on one row and serial 2 on the other
+    assert len(catalog.query(column='I', equipment={'Type': 'DMM', 'Serial': '2'})) == 0
+    assert len(catalog.query(column='I', equipment=[{'Type': 'DMM', 'Serial': '1'}, {'Serial': 2}])) == 4
+    assert len(catalog.query(column='I', equipment=[{'Type': 'DMM'}, {'Type': 'Meter'}])) == 0
+
+
+def test_rescan_reads_only_changed_reports(catalog, tmp_path):
+    path = str(tmp_path / f"a{ARCHIVE_EXTENSION}")
+    report = TestReport.open(path)
+    report.select_test('cat', 'load')
+    report.edit_Re_val('I', 1, '2')
+    report.save(path)
+
+    result = catalog.scan([str(tmp_path)], jobs=1)
+    assert result.updated == [path]
+    assert len(result.unchanged) == 1
+    assert catalog.query(column='I', properties={'Model': 'X'})['value'].tolist() == [1.5, 2.0]
+
+    os.remove(str(tmp_path / f"b{ARCHIVE_EXTENSION}"))
+    assert len(catalog.scan([str(tmp_path)], jobs=1).removed) == 1
+    assert len(catalog.reports()) == 1
@@ -0,0 +1,93 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+import cli
+from model.journal import journal_path
+from model.report_archive import ARCHIVE_EXTENSION
+from model.spec_limits import SpecLimit
+from model.test_report import TestReport
+
+SAMPLE = Path(__file__).resolve().parents[2] / 'Report Samples' / 'GTM965500P.pickle'
+
+
+@pytest.fixture
+def save_report(make_report):
+    def save(path, formula="=CC('Vin') * Re('I')"):
+        report = make_report(conditions={'Vin': ['5', '12']}, results={'I': ['1', '3']}, calculations={'P': formula},
+                             specifications={'S': SpecLimit('I', maximum=2)}, title='CLI')
+        report.save(str(path))
+        return report
+    return save
+
+
+def table(report):
+    report.load_tests()
+    tests = []
+    for test in report.tests:
+        test.refresh_table()
+        tests.append(test.root_table.astype(str).values.tolist())
+    return tests
+
+
+def test_rebuild_in_place_compacts_the_journal(tmp_path, monkeypatch, save_report):
+    path = tmp_path / f"report{ARCHIVE_EXTENSION}"
+    report = save_report(path)
+    report.edit_Re_val('I', 1, '4')
+    report.save(str(path))
+    assert TestReport.open(str(path))._journal.read()
+
+    # relative paths rebuild in place too
+    monkeypatch.chdir(tmp_path)
+    assert cli.main(['rebuild', path.name, '-j', '1']) == 0
+    opened = TestReport.open(str(path))
+    assert opened._journal.read() == []
+    assert table(opened) == table(report)
+
+
+def test_rebuild_converts(tmp_path, save_report):
+    path = tmp_path / f"report{ARCHIVE_EXTENSION}"
+    report = save_report(path)
+    shutil.copy(SAMPLE, tmp_path / SAMPLE.name)
+    summary = tmp_path / 'summary.json'
+
+    out = tmp_path / 'out'
+    assert cli.main(['rebuild', str(tmp_path), '-o', str(out), '--format', 'pickle', '-j', '2',
+                     '--summary', str(summary)]) == 0
+    assert sorted(os.listdir(out)) == ['GTM965500P.pickle', 'report.pickle']
+    assert table(TestReport.open(str(out / 'report.pickle'))) == table(report)
+
+    result = json.loads(summary.read_text())
+    assert (result['ok'], result['failed']) == (2, 0)
+    assert all(entry['details']['tests'] for entry in result['files'])
+
+
+def test_export_csv(tmp_path, save_report):
+    path = tmp_path / f"report{ARCHIVE_EXTENSION}"
+    save_report(path)
+    assert cli.main(['export-csv', str(path), '-j', '1']) == 0
+    assert (tmp_path / 'report.csv').read_text().splitlines()[0] == 'Category,Test,Vin,Column,Value'
+
+    assert cli.main(['export-csv', str(path), '-o', str(tmp_path / 'tests'), '--layout', 'tests', '-j', '1']) == 0
+    assert os.listdir(tmp_path / 'tests' / 'report') == ['cat - a.csv']
+
+
+def test_validate(tmp_path, capsys, save_report):
+    good = tmp_path / f"good{ARCHIVE_EXTENSION}"
+    save_report(good)
+    bad = tmp_path / f"bad{ARCHIVE_EXTENSION}"
+    save_report(bad, formula="=Re('I') / (CC('Vin') - 5)")
+
+    assert cli.main(['validate', str(good), '-j', '1']) == 0
+    assert cli.main(['validate', str(good), '--strict', '-j', '1']) == 1
+    assert 'spec failures' in capsys.readouterr().out
+
+    entry = cli.run_file('validate', str(bad), cli.build_parser().parse_args(['validate', str(bad)]))
+    assert not entry['ok'] and '#ERR cells' in entry['error']
+
+
+def test_no_reports(tmp_path):
+    assert cli.main(['validate', str(tmp_path)]) == 1
@@ -0,0 +1,218 @@
+import math
+import pickle
+
+import numpy as np
+
+from model.column_store import BLANK, Column, ColumnStore, coerce_value, display_values, format_number
+from model.combo_index import ComboIndex
+
+
+def test_coerce_value():
+    assert coerce_value('1.5') == (1.5, None)
+    assert coerce_value(3) == (3.0, None)
+    assert coerce_value('  ')[1] is BLANK
+    assert coerce_value(None)[1] is BLANK
+    assert coerce_value(float('nan'))[1] is BLANK
+    number, text = coerce_value('PASS')
+    assert math.isnan(number) and text == 'PASS'
+    assert coerce_value('inf')[1] == 'inf'
+
+
+def test_numbers_display_as_typed():
+    assert format_number(2.0) == '2'
+    assert format_number(np.float64(-5.0)) == '-5'
+    assert format_number(1.2345678) == '1.2345678'
+    assert format_number(0.1 + 0.2) == '0.30000000000000004'
+    assert format_number(1e20) == '1e+20'
+
+    column = Column(['2', '5.00', '', '1.5', 'open'])
+    assert display_values(column.to_array()) == ['2', '5', '', '1.5', 'open']
+    assert display_values(np.array([3.0, np.nan])) == ['3', '']
+
+
+def test_numbers_stay_float():
+    column = Column(['1', 2, '', '3.5'])
+    assert column.is_numeric
+    assert column.tolist() == [1.0, 2.0, BLANK, 3.5]
+    assert column.filled == 3
+    assert np.isnan(column.to_array()[2])
+    assert column.missing().tolist() == [False, False, True, False]
+
+
+def test_text_switches_to_objects():
+    column = Column(['1', '2', '3'])
+    column[1] = 'open'
+    assert not column.is_numeric
+    assert column.tolist() == [1.0, 'open', 3.0]
+    assert column.numeric()[[0, 2]].tolist() == [1.0, 3.0]
+    assert np.isnan(column.numeric()[1])
+
+    column[1] = ''
+    assert column[1] == BLANK
+    assert column.filled == 2
+
+
+def test_set_rows():
+    column = Column(['1', '', '', ''])
+    assert column.set_rows([1, 3], ['2', '']) == 1
+    assert column.tolist() == [1.0, 2.0, BLANK, BLANK]
+    column.set_rows([2], ['x'])
+    assert column.tolist() == [1.0, 2.0, 'x', BLANK]
+
+
+def test_windows():
+    column = Column([str(i) for i in range(10)])
+    assert column.to_array(start=3, stop=6).tolist() == [3.0, 4.0, 5.0]
+    assert column.numeric(8).tolist() == [8.0, 9.0]
+    assert column[2:4] == [2.0, 3.0]
+
+
+def test_pickle_round_trip():
+    index = ComboIndex([['a', 'b'], ['1', '2']])
+    store = ColumnStore({'V': ['1', 'x', '', '4'], 'I': [1, 2, 3, 4]}, index, ('CC1', 'CC2'))
+    loaded = pickle.loads(pickle.dumps(store))
+    assert loaded.tags == store.tags
+    for name in store:
+        assert loaded[name].tolist() == store[name].tolist()
+        assert loaded[name].dtype == store[name].dtype
+
+    # snapshots pickle to the same thing
+    assert pickle.loads(pickle.dumps(store.snapshot()))['V'].tolist() == store['V'].tolist()
+
+
+def test_store_converts_lists():
+    index = ComboIndex([['a', 'b', 'c']])
+    store = ColumnStore(index=index, tags=('CC1',))
+    store['R'] = ['1', '', '3']
+    assert isinstance(store['R'], Column)
+    assert len(store['R']) == 3
+    assert store['R'].tolist() == [1.0, BLANK, 3.0]
+
+
+# ----- Combo Layout -----
+
+# Vin x Load with a cell in every row
+LAYOUT = {'conditions': {'Vin': ['5', '12'], 'Load': ['a', 'b']}, 'results': {'I': ['1', '2', '3', 'x']}}
+
+
+def cells(test):
+    return dict(test.results['I'].items())
+
+
+def test_cells_follow_their_combo(make_test):
+    test = make_test(**LAYOUT)
+    before = cells(test)
+    assert before == {('5', 'a'): 1.0, ('5', 'b'): 2.0, ('12', 'a'): 3.0, ('12', 'b'): 'x'}
+
+    # reordering a CC's values moves the rows, not the cells
+    test.edit_CC('CC1', 'Vin', ['12', '5'])
+    assert test.root_table['I'].tolist() == [3.0, 'x', 1.0, 2.0]
+    assert cells(test) == before
+
+
+def test_new_cc_puts_cells_at_its_first_value(make_test):
+    test = make_test(**LAYOUT)
+    test.add_CC('Temp', ['25', '85'])
+    assert test.results['I'].tolist() == [1.0, '', 2.0, '', 3.0, '', 'x', '']
+    assert test.results['I'].get(('5', 'b', '25')) == 2.0
+
+
+def test_removed_cc_keeps_the_cells_at_its_first_value(make_test):
+    test = make_test(**LAYOUT)
+    test.del_CC('CC2')
+    assert test.results['I'].tolist() == [1.0, 3.0]
+
+
+def test_cells_outside_the_grid_come_back(make_test):
+    test = make_test(**LAYOUT)
+    test.edit_CC('CC1', 'Vin', ['5'])
+    column = test.results['I']
+    assert column.tolist() == [1.0, 2.0]
+    assert column.filled == 4
+    assert column.get(('12', 'b')) == 'x'
+
+    test.edit_CC('CC1', 'Vin', ['5', '12', '24'])
+    assert test.results['I'].tolist() == [1.0, 2.0, 3.0, 'x', '', '']
+    assert test.results['I'].numeric()[:3].tolist() == [1.0, 2.0, 3.0]
+
+
+def test_hidden_cells_are_saved(make_test):
+    test = make_test(**LAYOUT)
+    test.edit_CC('CC1', 'Vin', ['5'])
+    loaded = pickle.loads(pickle.dumps(test))
+    loaded.edit_CC('CC1', 'Vin', ['5', '12'])
+    assert loaded.results['I'].tolist() == [1.0, 2.0, 3.0, 'x']
+
+
+def test_cells_saved_by_combo_key_still_load():
+    # the layout before columns were dense: one key per stored cell
+    index = ComboIndex([['5', '12'], ['a', 'b']])
+    column = Column.__new__(Column)
+    column.__setstate__({'index': index, 'tags': ('CC1', 'CC2'), 'keys': [('12', 'b'), ('5', 'a'), ('24', 'a')],
+                         'data': np.array([4.0, 1.0, 9.0])})
+    assert column.tolist() == [1.0, '', '', 4.0]
+    assert column.get(('24', 'a')) == 9.0
+
+
+def test_cells_saved_dense_still_load():
+    # the layout before columns were sparse: a value per row, no rows
+    index = ComboIndex([['5', '12'], ['a', 'b']])
+    column = Column.__new__(Column)
+    column.__setstate__({'index': index, 'tags': ('CC1', 'CC2'), 'data': np.array(['', 'x', '', 2.0], dtype=object),
+                         'hidden': None})
+    assert column.tolist() == ['', 'x', '', 2.0]
+    column[0] = '1'
+    assert column.filled == 3
+
+
+def test_dense_storage():
+    index = ComboIndex([list(range(400)), list(range(500))])
+    column = Column(np.arange(200_000, dtype=float), index, ('CC1', 'CC2'))
+    # a float64 per row and nothing per cell
+    assert column.is_dense
+    assert column.nbytes == 200_000 * 8
+    assert column.numeric()[-1] == 199_999.0
+
+
+def test_sparse_storage_follows_filled_cells():
+    # 15^6 = 11,390,625 rows, a dense float column would be 91 MB
+    index = ComboIndex([list(range(15))] * 6)
+    tags = tuple(f'CC{i}' for i in range(1, 7))
+    store = ColumnStore({name: [] for name in ('A', 'B', 'C', 'D')}, index, tags)
+    assert store.nbytes == 0
+
+    rows = np.arange(0, len(index), 11_391)
+    store['A'].set_rows(rows, rows * 0.5)
+    store['B'][7] = '3.3mV'
+    assert not store['A'].is_dense
+    # a row number and a value per filled cell
+    assert store['A'].nbytes == len(rows) * 16
+    assert store.nbytes < 20_000
+
+    assert store['A'][int(rows[3])] == rows[3] * 0.5
+    assert store['A'][1] == BLANK
+    window = store['A'].to_array(start=int(rows[2]) - 1, stop=int(rows[2]) + 2)
+    assert np.isnan(window[[0, 2]]).all() and window[1] == rows[2] * 0.5
+    assert store['B'].numeric(6, 9)[1] == 0.0033
+
+    # moving onto a new grid only touches the filled cells
+    store.relayout(ComboIndex([list(range(14, -1, -1))] + [list(range(15))] * 5), tags)
+    assert store['A'].filled == len(rows)
+    assert store['A'].get(index.combo(int(rows[5]))) == rows[5] * 0.5
+
+
+def test_filling_past_the_threshold_goes_dense():
+    index = ComboIndex([list(range(10))])
+    column = Column([], index, ('CC1',))
+    column.set_rows([0, 2, 4], ['1', '2', 'x'])
+    assert not column.is_dense
+    column.set_rows([6, 8, 9], ['3', '4', '5'])
+    assert column.is_dense
+    assert column.tolist() == [1.0, '', 2.0, '', 'x', '', 3.0, '', 4.0, 5.0]
+    assert column.numeric()[[0, 9]].tolist() == [1.0, 5.0]
+
+    # and back to sparse when it's laid out again with fewer cells
+    column.relayout(ComboIndex([[0, 1]]), ('CC1',))
+    assert not column.is_dense
+    assert column.tolist() == [1.0, '']
+    assert column.filled == 6
@@ -0,0 +1,55 @@
+from itertools import product
+
+import numpy as np
+import pytest
+
+from model.combo_index import ComboIndex
+
+
+VALUES = [['5', '12', '24'], ['a', 'b'], ['x', 'y', 'z', 'w']]
+
+
+def test_rows_follow_product_order():
+    index = ComboIndex(VALUES)
+    expected = list(product(*VALUES))
+    assert len(index) == len(expected)
+    assert list(index) == expected
+    assert [index[row] for row in range(len(index))] == expected
+    assert index[-1] == expected[-1]
+    assert index[2:5] == expected[2:5]
+
+
+def test_row_lookup_round_trips():
+    index = ComboIndex(VALUES)
+    for row, combo in enumerate(product(*VALUES)):
+        assert index.row(combo) == row
+        assert combo in index
+    assert index.row(('5', 'a', 'nope')) is None
+    assert index.row(('5', 'a')) is None
+
+
+def test_columns_and_codes():
+    index = ComboIndex(VALUES)
+    expected = list(product(*VALUES))
+    for i in range(len(VALUES)):
+        assert index.column(i).tolist() == [combo[i] for combo in expected]
+        assert index.column(i, 5, 11).tolist() == [combo[i] for combo in expected[5:11]]
+        assert index.codes(i, 3, 7).tolist() == [VALUES[i].index(combo[i]) for combo in expected[3:7]]
+
+
+def test_combos_and_rows_for():
+    index = ComboIndex(VALUES)
+    rows = np.array([0, 7, 23, 13])
+    combos = index.combos(rows)
+    assert combos == [index.combo(row) for row in rows]
+
+    codes = [[VALUES[i].index(combo[i]) for combo in combos] for i in range(len(VALUES))]
+    assert index.rows_for(codes).tolist() == rows.tolist()
+
+
+def test_empty_grids():
+    # no CCs is one empty combo, like itertools.product()
+    assert list(ComboIndex([])) == [()]
+    assert len(ComboIndex([['a'], []])) == 0
+    with pytest.raises(IndexError):
+        ComboIndex([['a']]).combo(1)
@@ -0,0 +1,75 @@
+import csv
+import os
+
+import pytest
+
+from model.report_archive import ARCHIVE_EXTENSION, ArchiveMember
+from model.test_report import TestReport
+
+
+@pytest.fixture
+def report(make_report):
+    report = make_report(conditions={'Vin': ['5', '12']}, results={'I': ['1.5', 'open']},
+                         calculations={'P': "=CC('Vin') * Re('I')"}, title='Export')
+
+    report.add_test('cat', 'b')
+    report.select_test('cat', 'b')
+    report.add_CC('Load', ['x', 'y'])
+    report.add_CC('Vin', ['3'])
+    report.add_Re('I')
+    report.edit_Re_val('I', 1, '2')
+    return report
+
+
+def read(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        return list(csv.reader(file))
+
+
+LONG = [
+    ['Category', 'Test', 'Vin', 'Load', 'Column', 'Value'],
+    ['cat', 'a', '5', '', 'I', '1.5'],
+    ['cat', 'a', '5', '', 'P', '7.5'],
+    ['cat', 'a', '12', '', 'I', 'open'],
+    ['cat', 'a', '12', '', 'P', '#ERR'],
+    ['cat', 'b', '3', 'y', 'I', '2'],
+]
+
+
+def test_long_layout(tmp_path, report):
+    path = str(tmp_path / 'long.csv')
+    assert report.save_csv(path) == [path]
+    assert read(path) == LONG
+
+
+def test_long_layout_keeps_blanks(tmp_path, report):
+    path = str(tmp_path / 'long.csv')
+    report.save_csv(path, skip_blank=False)
+    rows = read(path)
+    assert ['cat', 'b', '3', 'x', 'I', ''] in rows
+    assert len(rows) == 1 + 4 + 2
+
+
+def test_tests_layout(tmp_path, report):
+    report.add_test('cat', 'a')
+    paths = report.save_csv(str(tmp_path / 'out'), layout='tests')
+    assert [os.path.basename(path) for path in paths] == ['cat - a.csv', 'cat - b.csv', 'cat - a (2).csv']
+    assert read(paths[0]) == [['Vin', 'I', 'P'], ['5', '1.5', '7.5'], ['12', 'open', '#ERR']]
+    assert read(paths[1]) == [['Load', 'Vin', 'I'], ['x', '3', ''], ['y', '3', '2']]
+
+
+def test_deferred_tests_are_read_once(tmp_path, monkeypatch, report):
+    archive = str(tmp_path / f"report{ARCHIVE_EXTENSION}")
+    report.save(archive)
+    opened = TestReport.open(archive)
+
+    reads = []
+    read_member = ArchiveMember.read
+    monkeypatch.setattr(ArchiveMember, 'read', lambda self: reads.append(self.member) or read_member(self))
+    path = str(tmp_path / 'long.csv')
+    opened.save_csv(path)
+
+    assert read(path) == LONG
+    assert len(reads) == len(set(reads)) == 2
+    # and they aren't kept loaded
+    assert not any(test.loaded for test in opened.tests)
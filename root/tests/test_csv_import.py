@@ -0,0 +1,117 @@
+import pytest
+
+from model.column_store import Column
+
+
+@pytest.fixture
+def blank_report(make_report):
+    # Vin x Load rows, nothing in I or V yet
+    return lambda: make_report(conditions={'Vin': ['5', '12'], 'Load': ['a', 'b']}, results={'I': [], 'V': []},
+                               tests=[('cat', 't')])
+
+
+def write(tmp_path, text):
+    path = tmp_path / 'log.csv'
+    path.write_text(text)
+    return str(path)
+
+
+def values(report, name):
+    return report.selected_test.results[name].tolist()
+
+
+def test_lines_go_to_their_rows(tmp_path, blank_report):
+    report = blank_report()
+    path = write(tmp_path, "Load,Vin,I,Other\nb,12.0,4,x\na, 5 ,1,x\nc,5,9,x\n")
+    result = report.import_csv(path)
+
+    assert values(report, 'I') == [1.0, '', '', 4.0]
+    assert values(report, 'V') == ['', '', '', '']
+    assert (result.lines, result.matched, result.unmatched, result.written) == (3, 2, 1, 2)
+    assert result.unmatched_samples == [(4, ('5', 'c'))]
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 2, 100])
+def test_keep_last_keeps_the_last_value_of_each_cell(tmp_path, chunk_rows, blank_report):
+    report = blank_report()
+    path = write(tmp_path, "Vin,Load,I,V\n5,a,1,10\n5,a,2,\n5,a,,\n12,b,,30\n12,b,4,\n")
+    result = report.import_csv(path, chunk_rows=chunk_rows)
+
+    # a blank later line doesn't clear an earlier line's value
+    assert values(report, 'I') == [2.0, '', '', 4.0]
+    assert values(report, 'V') == [10.0, '', '', 30.0]
+    assert result.duplicates == 3
+
+
+def test_keep_first(tmp_path, blank_report):
+    report = blank_report()
+    path = write(tmp_path, "Vin,Load,I,V\n5,a,1,\n5,a,2,20\n")
+    result = report.import_csv(path, duplicates='first')
+    assert values(report, 'I') == [1.0, '', '', '']
+    assert values(report, 'V') == ['', '', '', '']
+    assert result.duplicate_samples == [(3, ('5', 'a'))]
+
+
+def test_duplicates_can_fail_the_import(tmp_path, blank_report):
+    report = blank_report()
+    report.edit_Re_val('I', 3, '7')
+    path = write(tmp_path, "Vin,Load,I\n12,b,1\n5,a,2\n5,a,3\n")
+    with pytest.raises(ValueError, match='Line 4'):
+        report.import_csv(path, duplicates='error', chunk_rows=2)
+    # the whole import is rolled back
+    assert values(report, 'I') == ['', '', '', 7.0]
+
+
+def test_rollback_only_copies_the_columns_written_to(tmp_path, monkeypatch, blank_report):
+    report = blank_report()
+    report.add_Re('Big')
+    report.set_Re_rows('Big', range(4), ['1', '2', '3', '4'])
+    report.edit_Re_val('I', 3, '7')
+
+    copied = []
+    copy = Column.copy
+    monkeypatch.setattr(Column, 'copy', lambda self: copied.append(self.tolist()) or copy(self))
+    path = write(tmp_path, "Vin,Load,I\n12,b,1\n5,a,2\n5,a,3\n")
+    with pytest.raises(ValueError):
+        report.import_csv(path, duplicates='error', chunk_rows=2)
+
+    # I as it was before the first chunk was written, and nothing else
+    assert copied == [['', '', '', 7.0]]
+    assert values(report, 'I') == ['', '', '', 7.0]
+    assert values(report, 'Big') == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_column_mapping_and_errors(tmp_path, blank_report):
+    report = blank_report()
+    path = write(tmp_path, "V_in,Load,current\n12,a,3\n")
+    report.import_csv(path, columns={'current': 'I'}, conditions={'Vin': 'V_in'})
+    assert values(report, 'I') == ['', '', 3.0, '']
+
+    with pytest.raises(ValueError, match='condition'):
+        report.import_csv(path)
+    with pytest.raises(ValueError, match='Not result columns'):
+        report.import_csv(path, columns={'current': 'nope'}, conditions={'Vin': 'V_in'})
+
+
+def test_import_can_be_undone(tmp_path, blank_report):
+    report = blank_report()
+    report.edit_Re_val('I', 0, '1')
+    report.import_csv(write(tmp_path, "Vin,Load,I\n5,a,5\n12,b,6\n"))
+    assert values(report, 'I') == [5.0, '', '', 6.0]
+    report.undo()
+    assert values(report, 'I') == [1.0, '', '', '']
+    report.redo()
+    assert values(report, 'I') == [5.0, '', '', 6.0]
+
+
+def test_exported_tables_import_back(tmp_path, blank_report):
+    report = blank_report()
+    for row, value in enumerate(['1.5', 'open', '', '4']):
+        report.edit_Re_val('I', row, value)
+    report.edit_Re_val('V', 2, '3.3')
+    path, = report.save_csv(str(tmp_path / 'out'), layout='tests')
+
+    fresh = blank_report()
+    fresh.import_csv(path)
+    for name in ('I', 'V'):
+        assert values(fresh, name) == values(report, name)
@@ -0,0 +1,66 @@
+import pytest
+
+from model.dependency_graph import DependencyCycleError, DependencyGraph
+from model.test_model import Test
+
+
+def test_order_and_downstream():
+    graph = DependencyGraph()
+    graph.set('late', ['early'])
+    graph.set('early', ['Iout'])
+    graph.set('other', ['Vin'])
+
+    assert graph.order() == ['early', 'late', 'other']
+    assert graph.downstream(['Iout']) == ['early', 'late']
+    assert graph.downstream(['Vin']) == ['other']
+    assert graph.downstream(['late']) == ['late']
+
+
+def test_cycles_are_rejected_without_changing_the_graph():
+    graph = DependencyGraph()
+    graph.set('a', ['b'])
+    graph.set('b', ['c'])
+    with pytest.raises(DependencyCycleError, match='a -> b'):
+        graph.set('c', ['a'])
+    assert 'c' not in graph
+    assert graph.dependents == {'b': {'a'}, 'c': {'b'}}
+
+
+def test_remove():
+    graph = DependencyGraph()
+    graph.set('a', ['x', 'y'])
+    graph.set('b', ['x'])
+    graph.remove('a')
+    assert graph.dependents == {'x': {'b'}}
+
+
+def test_calculations_read_later_calculations():
+    test = Test('c', 'n')
+    test.add_CC('Vin', ['1', '2'])
+    test.add_Re('A')
+    test.add_Ca('twice', "=Ca('base') * 2")
+    test.add_Ca('base', "=Re('A') + 1")
+    test.edit_Re_val('A', 0, '5')
+    assert test.root_table['twice'].tolist()[0] == 12.0
+
+    with pytest.raises(DependencyCycleError):
+        test.add_Ca('base', "=Ca('twice')")
+    assert test.calculations['base'] == "=Re('A') + 1"
+
+
+def test_edits_only_evaluate_what_depends_on_them():
+    test = Test('c', 'n')
+    test.add_CC('Vin', ['1', '2'])
+    test.add_Re('A')
+    test.add_Re('B')
+    test.add_Ca('from_a', "=Re('A') * 2")
+    test.add_Ca('from_b', "=Re('B') * 2")
+
+    evaluated = []
+    evaluate_column = test.evaluate_column
+    test.evaluate_column = lambda formula, *args: evaluated.append(formula) or evaluate_column(formula, *args)
+    test.edit_Re_val('B', 1, '3')
+    del test.evaluate_column
+
+    assert evaluated == ["=Re('B') * 2"]
+    assert test.root_table['from_b'].tolist()[1] == 6.0
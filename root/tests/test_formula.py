@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.formula import ERR, FormulaError, compile_formula
+from model.test_model import Test
+
+
+def evaluate(formula, columns):
+    num_rows = len(next(iter(columns.values())))
+    return list(compile_formula(formula).evaluate(columns, num_rows))
+
+
+def evaluate_rows(formula, columns):
+    compiled = compile_formula(formula)
+    frame = pd.DataFrame(columns)
+    return [compiled.evaluate_row(row) for row in frame.to_dict('records')]
+
+
+def test_vectorized_arithmetic():
+    columns = {'Vin': np.array([5.0, 12.0, 24.0]), 'Iout': np.array([1.0, 2.0, np.nan])}
+    assert evaluate("=CC('Vin') * Re('Iout')", columns) == [5.0, 24.0, ERR]
+
+
+def test_text_in_arithmetic_is_an_error():
+    columns = {'Vin': [12, 12, 5], 'Iout': ['x', 2, '']}
+    assert evaluate("=CC('Vin') * Re('Iout')", columns) == [ERR, 24, ERR]
+    assert evaluate("=Re('Iout') + Re('Iout')", columns) == [ERR, 4, ERR]
+    assert evaluate("=-Re('Iout')", columns) == [ERR, -2, ERR]
+
+
+def test_text_still_compares():
+    columns = {'Load': ['Step', 'Dump', 'Step']}
+    assert evaluate("=CC('Load') == 'Step'", columns) == [True, False, True]
+
+
+@pytest.mark.parametrize('formula', [
+    "=CC('Vin') * Re('Iout')",
+    "=Re('Iout') + 1",
+    "=Re('Iout') == 'x'",
+    "=max(CC('Vin'), 10) if Re('Iout') == 2 else 0",
+    "=abs(Re('Iout'))",
+])
+def test_vectorized_and_row_paths_agree(formula):
+    columns = {'Vin': [12, 12, 5, 24], 'Iout': ['x', 2, '', '4']}
+    assert evaluate(formula, columns) == evaluate_rows(formula, columns)
+
+    numeric = {'Vin': np.array([12.0, 12.0, 5.0]), 'Iout': np.array([1.0, 2.0, np.nan])}
+    assert evaluate(formula, numeric) == evaluate_rows(formula, numeric)
+
+
+def test_bad_formulas_are_rejected():
+    for formula in ("=__import__('os')", "=Re(1)", "=CC('a').real", "no equals"):
+        with pytest.raises(FormulaError):
+            compile_formula(formula)
+
+
+def test_calculation_column():
+    test = Test('c', 'n')
+    test.add_CC('Vin', ['5', '12'])
+    test.add_Re('Iout')
+    test.edit_Re_val('Iout', 0, '2')
+    test.edit_Re_val('Iout', 1, 'open')
+    test.add_Ca('P', "=CC('Vin') * Re('Iout')")
+    assert test.root_table['P'].tolist() == [10.0, ERR]
+
+    with pytest.raises(ValueError):
+        test.add_Ca('Bad', "=1 + 2")
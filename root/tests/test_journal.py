@@ -0,0 +1,120 @@
+import os
+
+import pytest
+
+from model.journal import journal_path
+from model.report_archive import ARCHIVE_EXTENSION
+from model.spec_limits import SpecLimit
+from model.test_report import TestReport
+
+
+@pytest.fixture
+def report(make_report):
+    report = make_report(conditions={'Vin': ['5', '12']}, results={'I': ['1']}, title='Journal')
+    report.add_test('cat', 'b')
+    return report
+
+
+def state(report):
+    report.load_tests()
+    tests = []
+    for test in report.tests:
+        test.refresh_table()
+        tests.append((test.category, test.name, dict(test.metadata), test.root_table.astype(str).values.tolist(),
+                      list(test.checkbox_vars)))
+    return tests, report.cover_page.equipment_used.astype(str).values.tolist()
+
+
+def test_saves_append_edits_and_replay_on_open(tmp_path, report):
+    path = str(tmp_path / f"report{ARCHIVE_EXTENSION}")
+    report.save(path)
+    archive_size = os.path.getsize(path)
+    journal_size = os.path.getsize(journal_path(path))
+
+    report.edit_Re_val('I', 1, '2.5')
+    report.add_Ca('P', "=CC('Vin') * Re('I')")
+    report.add_Sp('S', limit=SpecLimit('I', maximum=2))
+    report.add_equipment({'Model': 'DMM'})
+    report.set_equipment_checked(0)
+    report.select_test('cat', 'b')
+    report.add_CC('Load', ['x'])
+    report.set_test_name('renamed')
+    report.save(path)
+
+    # only the journal grew
+    assert os.path.getsize(path) == archive_size
+    assert os.path.getsize(journal_path(path)) > journal_size
+    assert not report.dirty
+
+    assert state(TestReport.open(path)) == state(report)
+
+
+def test_selecting_isnt_an_edit(tmp_path, report):
+    path = str(tmp_path / f"report{ARCHIVE_EXTENSION}")
+    report.save(path)
+    report.select_test('cat', 'b')
+    report.select_test('cat', 'a')
+    assert not report.dirty
+    assert report._journal.pending == []
+
+
+def test_rolled_back_batches_leave_no_records(tmp_path, report):
+    path = str(tmp_path / f"report{ARCHIVE_EXTENSION}")
+    report.save(path)
+    try:
+        with report.batch():
+            report.edit_Re_val('I', 1, '9')
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    report.save(path)
+    assert state(TestReport.open(path)) == state(report)
+
+
+def test_compacting_starts_a_new_journal(tmp_path, report):
+    path = str(tmp_path / f"report{ARCHIVE_EXTENSION}")
+    report.save(path)
+    report.edit_Re_val('I', 1, '3')
+    report.save(path)
+
+    report.compact(path)
+    assert TestReport.open(path)._journal.read() == []
+    assert state(TestReport.open(path)) == state(report)
+
+
+def test_damaged_tail_is_dropped(tmp_path, report):
+    path = str(tmp_path / f"report{ARCHIVE_EXTENSION}")
+    report.save(path)
+    report.edit_Re_val('I', 1, '3')
+    report.save(path)
+    expected = state(report)
+
+    report.edit_Re_val('I', 1, '4')
+    report.save(path)
+    with open(journal_path(path), 'r+b') as file:
+        file.truncate(os.path.getsize(journal_path(path)) - 3)
+
+    assert state(TestReport.open(path)) == expected
+
+
+def test_frame_edits_journal_only_the_changed_cells(tmp_path, report):
+    path = str(tmp_path / f"report{ARCHIVE_EXTENSION}")
+    report.add_CC('Load', [str(v) for v in range(50_000)])
+    report.set_Re_rows('I', range(100_000), range(100_000))
+    report.save(path)
+    report.compact(path)
+    size = os.path.getsize(journal_path(path))
+
+    frame = report.selected_test.root_table[['Vin', 'Load', 'I']].astype(object)
+    frame.loc[7, 'I'] = 'open'
+    frame.loc[8, 'I'] = ''
+    frame['V'] = ''
+    frame.loc[3, 'V'] = '1.5'
+    report.update_from_dataframe(frame)
+    report.save(path)
+
+    assert os.path.getsize(journal_path(path)) - size < 2_000
+    opened = TestReport.open(path)
+    assert state(opened) == state(report)
+    assert opened.tests[0].results['I'].tolist()[6:9] == [6.0, 'open', '']
+    assert opened.tests[0].results['V'][3] == 1.5
@@ -0,0 +1,111 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from model import latex_render
+from model.latex_render import FragmentCache, fragment_jobs, latex_escape, render_fragments
+from model.report_archive import ARCHIVE_EXTENSION
+from model.spec_limits import SpecLimit
+from model.test_report import TestReport
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture
+def report(make_report):
+    report = make_report(conditions={'Vin': ['5', '12']}, results={'I': ['1']},
+                         calculations={'P': "=CC('Vin') * Re('I')", 'Q': "=Ca('P') + 1"},
+                         specifications={'S': SpecLimit('I', maximum=2)}, tests=[('cat', 'a'), ('cat', 'b')],
+                         equipment=[{'Model': 'DMM'}], title='Render')
+    report.set_equipment_checked(0)
+    return report
+
+
+def keys(report):
+    return [key for key, _, _ in fragment_jobs(report)]
+
+
+def test_loaded_and_deferred_tests_share_keys(tmp_path, report):
+    path = str(tmp_path / f"report{ARCHIVE_EXTENSION}")
+    report.save(path)
+    opened = TestReport.open(path)
+    assert keys(opened) == keys(report)
+    assert not any(test.loaded for test in opened.tests)
+
+    opened.load_tests()
+    assert keys(opened) == keys(report)
+
+
+KEYS_SCRIPT = """
+import sys
+from model.latex_render import fragment_jobs
+from model.test_report import TestReport
+report = TestReport.open(sys.argv[1])
+print(' '.join(key for key, _, _ in fragment_jobs(report)))
+"""
+
+
+def test_keys_dont_depend_on_the_hash_seed(tmp_path, report):
+    path = str(tmp_path / f"report{ARCHIVE_EXTENSION}")
+    report.save(path)
+    outputs = set()
+    for seed in ('1', '2', '3'):
+        for load in ('', 'report.load_tests()\n'):
+            script = KEYS_SCRIPT.replace("print(", f"{load}print(")
+            result = subprocess.run([sys.executable, '-c', script, path], cwd=ROOT, capture_output=True, text=True,
+                                    env={'PYTHONHASHSEED': seed, 'PYTHONPATH': str(ROOT)}, check=True)
+            outputs.add(result.stdout)
+    assert len(outputs) == 1
+
+
+def test_edits_change_only_their_test(report):
+    before = keys(report)
+
+    report.select_test('cat', 'a')
+    report.edit_Re_val('I', 1, '3')
+    after = keys(report)
+    assert after[0] == before[0] and after[2] == before[2]
+    assert after[1] != before[1]
+
+    report.set_equipment_checked(0)
+    assert keys(report)[1] != after[1]
+
+
+def test_cached_fragments_are_reused(tmp_path, monkeypatch, report):
+    cache = FragmentCache(str(tmp_path / 'cache'))
+    texts = render_fragments(report, cache, jobs=1)
+    assert len(texts) == 3
+    assert r'\section{a}' in texts[1] and 'DMM' not in texts[1]
+    # only b has the equipment checked
+    assert 'DMM' in texts[2]
+
+    rendered = []
+    monkeypatch.setattr(FragmentCache, 'put', lambda self, key, text: rendered.append(key))
+    assert render_fragments(report, cache, jobs=1) == texts
+    assert rendered == []
+
+
+def test_cached_reports_dont_load_or_pickle_tests(tmp_path, monkeypatch, report):
+    path = str(tmp_path / f"report{ARCHIVE_EXTENSION}")
+    report.save(path)
+    cache = FragmentCache(str(tmp_path / 'cache'))
+    texts = render_fragments(TestReport.open(path), cache, jobs=1)
+
+    def fail(*args):
+        raise AssertionError("cached fragment was rebuilt")
+    monkeypatch.setattr(latex_render, '_test_state', fail)
+    opened = TestReport.open(path)
+    assert render_fragments(opened, cache, jobs=1) == texts
+    assert not any(test.loaded for test in opened.tests)
+
+    # a loaded test keeps its key until it changes
+    opened.load_tests()
+    assert render_fragments(opened, cache, jobs=1) == texts
+
+
+def test_numbers_render_as_stored():
+    assert latex_escape(1.2345678) == '1.2345678'
+    assert latex_escape(2.0) == '2'
+    assert latex_escape(float('nan')) == ''
@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import pytest
+
+from benchmarks import run as bench
+from model.autosave import AutoSaver
+from model.report_archive import ARCHIVE_EXTENSION
+from model.test_report import TestReport
+
+SAMPLES = sorted((Path(__file__).resolve().parents[2] / 'Report Samples').glob('*.pickle'))
+
+
+def contents(report):
+    report.load_tests()
+    tests = []
+    for test in report.tests:
+        test.refresh_table()
+        tests.append((test.category, test.name, dict(test.metadata), list(test.checkbox_vars),
+                      test.root_table.astype(str).values.tolist()))
+    return report.title, tests
+
+
+@pytest.mark.parametrize('path', SAMPLES, ids=lambda path: path.stem)
+def test_samples_save_and_reopen(path, tmp_path):
+    report = TestReport.unpickle(path)
+    expected = contents(report)
+    for name in ('copy.pickle', f"copy{ARCHIVE_EXTENSION}"):
+        report.save(str(tmp_path / name))
+        assert contents(TestReport.open(str(tmp_path / name))) == expected
+
+
+def test_missing_checkbox_vars_default_to_none_checked():
+    report = TestReport.unpickle(SAMPLES[0])
+    assert SAMPLES[0].stem == 'GTM965500P'
+    for test in report.tests:
+        assert test.checkbox_vars == []
+        assert test.snapshot().checkbox_vars == []
+
+
+@pytest.mark.parametrize('name', ['copy.pickle', f"copy{ARCHIVE_EXTENSION}"])
+def test_autosave(name, tmp_path):
+    report = TestReport.unpickle(SAMPLES[0])
+    path = str(tmp_path / name)
+    saver = AutoSaver(delay=0)
+    saver.set_report(report, path)
+
+    saver.save_now()
+    saver.wait()
+    assert saver.last_error is None
+    assert contents(TestReport.open(path)) == contents(report)
+
+    # an edit is saved by the next poll once the delay has passed
+    report.select_test(report.tests[0].category, report.tests[0].name)
+    report.set_test_name('renamed')
+    assert report.dirty
+    saver.poll()
+    saver.wait()
+    assert saver.last_error is None and not report.dirty
+    assert contents(TestReport.open(path)) == contents(report)
+
+
+def test_benchmarks_run_on_the_samples():
+    results = bench.run(scales=(), cases=['pickle', 'archive'], repeat=1)
+    reports = {result['report'] for result in results['results']}
+    assert reports == {f"corpus:{path.stem}" for path in SAMPLES}
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from model.spec_limits import SpecLimit
+
+
+@pytest.fixture
+def report(make_report):
+    report = make_report(conditions={'Vin': ['5', '12']}, results={'I': ['1', '3']},
+                         calculations={'P': "=CC('Vin') * Re('I')"},
+                         specifications={'S': SpecLimit('I', maximum=2)}, tests=[('power', 'a')])
+
+    report.add_test('misc', 'b')
+    report.select_test('misc', 'b')
+    report.add_CC('Vin', ['12.0'])
+    report.add_CC('Load', ['x'])
+    report.add_Re('V')
+    report.edit_Re_val('V', 0, 'open')
+    return report
+
+
+def test_view(report):
+    view = report.long_view()
+    assert list(view.columns) == ['category', 'test', 'Vin', 'Load', 'row', 'column', 'kind', 'value', 'text',
+                                  'status']
+    assert view['test'].tolist() == ['a', 'a', 'a', 'a', 'b']
+    assert view['column'].tolist() == ['I', 'I', 'P', 'P', 'V']
+    assert view['kind'].tolist() == ['Re', 'Re', 'Ca', 'Ca', 'Re']
+    assert view['value'].tolist()[:4] == [1.0, 3.0, 5.0, 36.0]
+    assert np.isnan(view['value'].iat[4]) and view['text'].iat[4] == 'open'
+    assert view['status'].tolist() == ['pass', 'fail', 'pass', 'fail', '']
+    assert view['Load'].tolist()[4] == 'x'
+
+
+def test_only_changed_tests_rebuild_their_slice(report):
+    view = report.long_view()
+    a, b = report.tests
+    a_slice, b_slice = a.long_slice(), b.long_slice()
+    assert report.long_view() is view
+
+    report.select_test('power', 'a')
+    report.edit_Re_val('I', 1, '2')
+    assert a.long_slice() is not a_slice
+    assert b.long_slice() is b_slice
+    assert report.long_view()['status'].tolist()[:2] == ['pass', 'pass']
+
+    # renames keep the slices, the view picks up the new name
+    a_slice = a.long_slice()
+    report.set_test_name('renamed')
+    assert a.long_slice() is a_slice
+    assert report.long_view()['test'].tolist()[0] == 'renamed'
+
+    report.undo()
+    report.undo()
+    assert report.long_view()['value'].tolist()[1] == 3.0
+
+
+def test_query(report):
+    # numbers match however they're written
+    failed = report.query(conditions={'Vin': 12}, status='fail')
+    assert failed[['test', 'column', 'value']].values.tolist() == [['a', 'I', 3.0], ['a', 'P', 36.0]]
+
+    assert report.query(conditions={'Vin': '12'})['test'].tolist() == ['a', 'a', 'b']
+    assert report.query(conditions={'Load': 'x'}, columns='V')['text'].tolist() == ['open']
+    assert report.query(value_range=(2, 10))['value'].tolist() == [3.0, 5.0]
+    assert report.query(categories=['misc'], tests='b')['row'].tolist() == [0]
+    assert report.query(conditions={'Temp': 25}).empty
@@ -0,0 +1,71 @@
+import pickle
+
+import pytest
+
+
+@pytest.fixture
+def report(make_report):
+    # t0..t4, alternating between cat0 and cat1
+    return make_report(tests=[(f"cat{i % 2}", f"t{i}") for i in range(5)])
+
+
+def assert_index(report):
+    assert report._positions == {test: i for i, test in enumerate(report.tests)}
+    for test in report.tests:
+        assert report.get_test(test.category, test.name) is test
+    grouped = {}
+    for test in report.tests:
+        grouped.setdefault(test.category, []).append(test)
+    assert report.get_categories() == list(grouped)
+    for category, tests in grouped.items():
+        assert report.get_category_tests(category) == tests
+
+
+def test_lookup_and_groups(report):
+    assert report.get_categories() == ['cat0', 'cat1']
+    assert [test.name for test in report.get_category_tests('cat1')] == ['t1', 't3']
+    assert report.get_test('cat0', 'nope') is None
+    assert_index(report)
+
+
+def test_remove_moves_later_tests_up(report):
+    report.remove_test('cat1', 't1')
+    assert [test.name for test in report.tests] == ['t0', 't2', 't3', 't4']
+    assert_index(report)
+    assert report._test_position(report.get_test('cat0', 't4')) == 3
+
+
+def test_renames_keep_the_index(report):
+    report.select_test('cat0', 't2')
+    report.set_test_name('renamed')
+    report.rename_category('cat1', 'cat0')
+    assert report.get_test('cat0', 't2') is None
+    assert report.get_test('cat0', 'renamed') is report.selected_test
+    assert report.get_categories() == ['cat0']
+    assert_index(report)
+
+    # undoing the category rename puts each test back by position
+    report.undo()
+    assert [test.name for test in report.get_category_tests('cat1')] == ['t1', 't3']
+    assert_index(report)
+
+
+def test_rollback_and_pickle_rebuild_the_index(report):
+    try:
+        with report.batch():
+            report.remove_test('cat0', 't0')
+            report.add_test('cat2', 'new')
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert [test.name for test in report.tests] == ['t0', 't1', 't2', 't3', 't4']
+    assert_index(report)
+    assert_index(pickle.loads(pickle.dumps(report)))
+
+
+def test_merging_categories_keeps_report_order(report):
+    report.add_test('cat1', 't5')
+    report.rename_category('cat0', 'cat1')
+    assert [test.name for test in report.get_category_tests('cat1')] == [f"t{i}" for i in range(6)]
+    assert all(len(tests) == 1 for tests in report._test_index.values())
+    assert_index(report)
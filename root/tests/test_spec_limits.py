@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from model.spec_limits import SpecLimit
+
+
+def test_evaluate():
+    values = np.array([4.4, 4.5, 5.0, 5.5, 5.6, np.nan])
+    passed, failed = SpecLimit('V', nominal=5, tolerance=0.5).evaluate(values)
+    assert passed.tolist() == [False, True, True, True, False, False]
+    assert failed.tolist() == [True, False, False, False, True, False]
+
+    passed, failed = SpecLimit('V', minimum=4.5, maximum=5.5, inclusive=False).evaluate(values)
+    assert passed.tolist() == [False, False, True, False, False, False]
+
+
+def test_labels():
+    assert SpecLimit('V', nominal=5, tolerance=0.1).label() == '5 ± 0.1'
+    assert SpecLimit('V', minimum=3).label() == '≥ 3'
+    assert SpecLimit('V', maximum=10, inclusive=False).label() == '< 10'
+    assert SpecLimit('V', minimum=1, maximum=2).label() == '1 to 2'
+
+
+def test_bad_limits():
+    with pytest.raises(ValueError):
+        SpecLimit('V')
+    with pytest.raises(ValueError):
+        SpecLimit('V', nominal=5)
+    with pytest.raises(ValueError):
+        SpecLimit('V', minimum=2, maximum=1)
+
+
+@pytest.fixture
+def spec_test(make_test):
+    return make_test(conditions={'Vin': ['1', '2', '3']}, results={'V': ['5.2', '6', '']},
+                     calculations={'P': "=Re('V') * 2"},
+                     specifications={'Vspec': SpecLimit('V', nominal=5, tolerance=0.5),
+                                     'Pspec': SpecLimit('P', maximum=11)})
+
+
+def test_pass_fail_counts(spec_test):
+    assert spec_test.root_table['Vspec'].tolist() == ['5 ± 0.5'] * 3
+    counts = spec_test.pass_fail_counts()
+    assert counts['specs'] == {
+        'Vspec': {'pass': 1, 'fail': 1, 'untested': 1},
+        'Pspec': {'pass': 1, 'fail': 1, 'untested': 1},
+    }
+    assert (counts['pass'], counts['fail'], counts['untested']) == (2, 2, 2)
+
+    # an edit drops the cached masks
+    spec_test.edit_Re_val('V', 1, '5')
+    assert spec_test.pass_fail_counts()['specs']['Vspec'] == {'pass': 2, 'fail': 0, 'untested': 1}
+
+
+def test_limit_target_has_to_exist(spec_test):
+    with pytest.raises(ValueError):
+        spec_test.add_Sp('Bad', limit=SpecLimit('nope', minimum=0))
+
+
+def test_report_totals(make_report):
+    report = make_report(conditions={'Vin': ['1', '2']}, results={'V': ['1']},
+                         specifications={'S': SpecLimit('V', minimum=2)}, tests=[('c', 't')])
+    totals = report.pass_fail_counts()
+    assert (totals['pass'], totals['fail'], totals['untested']) == (0, 1, 1)
+    assert totals['tests'][('c', 't')]['fail'] == 1
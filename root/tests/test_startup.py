@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def run(script, **env):
+    return subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True,
+                          env={**os.environ, 'PYTHONPATH': str(ROOT), **env})
+
+
+def test_window_imports_stay_light():
+    # the GUI module only needs tkinter until the panels are built
+    result = run("import sys, gui.main_app; print(sorted({'pandas', 'numpy', 'tksheet', 'PIL'} & set(sys.modules)))")
+    assert result.stdout.strip() == '[]'
+
+
+def test_report_lists_phases_and_nested_imports(tmp_path):
+    output = tmp_path / 'startup.txt'
+    run("from utils import startup\n"
+        "startup.install_from_environment()\n"
+        "import json\n"
+        "import model.report_archive\n"
+        "startup.mark('imports done')\n",
+        TRG_STARTUP_REPORT=str(output))
+
+    text = output.read_text()
+    assert 'imports done' in text
+    lines = [line for line in text.splitlines() if line.startswith('import time:')]
+    names = [line.split('|')[-1] for line in lines[1:]]
+    assert ' model.report_archive' in names
+    # modules imported by report_archive are indented under it and finish first
+    assert any(name.startswith('   ') for name in names[:names.index(' model.report_archive')])
+
+
+def test_nothing_is_hooked_without_the_variable():
+    result = run("from utils import startup\n"
+                 "startup.install_from_environment()\n"
+                 "print(startup.is_installed())",
+                 TRG_STARTUP_REPORT='')
+    assert result.stdout.strip() == 'False'
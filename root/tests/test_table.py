@@ -0,0 +1,84 @@
+import random
+
+import pandas as pd
+import pytest
+
+# the grid every test here starts from
+VIN = {'Vin': ['5', '12', '24']}
+
+
+def assert_matches_rebuild(test):
+    # the patched table has to be what a rebuild from the stored data gives
+    patched = test.root_table.copy()
+    test.build_table()
+    rebuilt = test.root_table
+    assert list(patched.columns) == list(rebuilt.columns)
+    for name in rebuilt.columns:
+        assert [str(v) for v in patched[name]] == [str(v) for v in rebuilt[name]], name
+
+
+def test_deleted_column_doesnt_linger(make_test):
+    test = make_test(conditions=VIN)
+    test.add_Re('R0')
+    test.add_Re('R1')
+    test.del_Re('Re1')
+    test.add_Re('R2')
+
+    assert list(test.metadata.values()) == ['Vin', 'R1', 'R2']
+    assert list(test.root_table.columns) == ['Vin', 'R1', 'R2']
+    assert_matches_rebuild(test)
+
+
+def test_tags_are_never_reused(make_test):
+    test = make_test(conditions=VIN)
+    test.add_Ca('A', "=CC('Vin') * 2")
+    test.add_Ca('B', "=CC('Vin') * 3")
+    del test.metadata['Ca1']
+    test.add_Ca('C', "=CC('Vin') * 4")
+    assert test.metadata['Ca2'] == 'B'
+    assert test.metadata['Ca3'] == 'C'
+
+
+def test_cell_edits_patch_the_table(make_test):
+    test = make_test(conditions=VIN)
+    test.add_Re('Iout')
+    test.add_Ca('P', "=CC('Vin') * Re('Iout')")
+    test.add_Ca('P2', "=Ca('P') * 2")
+    test.edit_Re_val('Iout', 1, '3')
+    assert test.root_table['P2'].tolist()[1] == 72.0
+    assert_matches_rebuild(test)
+
+    test.edit_Re_name('Re1', 'I')
+    test.add_CC('Load', ['a', 'b'])
+    test.add_Sp('S', list('abcdef'))
+    df = test.root_table.copy()
+    df['I'] = [str(i) for i in range(6)]
+    df['New'] = ['x'] * 6
+    test.update_from_dataframe(df)
+    assert_matches_rebuild(test)
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_random_edits_match_rebuild(seed, make_test):
+    rng = random.Random(seed)
+    test = make_test(conditions=VIN)
+    names = iter(f'R{i}' for i in range(100))
+
+    for _ in range(25):
+        results = [tag for tag in test.metadata if tag.startswith('Re')]
+        action = rng.choice(['add', 'add', 'delete', 'rename', 'edit', 'calc', 'cc'])
+        if action == 'add' or not results:
+            test.add_Re(next(names))
+        elif action == 'delete':
+            test.del_Re(rng.choice(results))
+        elif action == 'rename':
+            test.edit_Re_name(rng.choice(results), next(names))
+        elif action == 'edit':
+            name = test.metadata[rng.choice(results)]
+            test.edit_Re_val(name, rng.randrange(len(test.combo_index)), rng.choice(['1', '2.5', 'x', '']))
+        elif action == 'calc':
+            name = test.metadata[rng.choice(results)]
+            test.add_Ca(f'C{rng.randrange(3)}', f"=Re('{name}') + 1")
+        else:
+            test.add_CC(f'L{rng.randrange(2)}', rng.choice([['a'], ['a', 'b']]))
+        assert_matches_rebuild(test)
@@ -0,0 +1,73 @@
+import pytest
+
+from utils import tracing
+
+
+@pytest.fixture
+def enabled():
+    tracing.reset()
+    tracing.enable()
+    yield
+    tracing.enable(False)
+    tracing.reset()
+
+
+def test_disabled_spans_record_nothing():
+    tracing.reset()
+    calls = []
+    with tracing.span('quiet', count=lambda: calls.append(1) or 3):
+        pass
+    assert calls == []
+    assert tracing.events() == []
+
+
+def test_lazy_arguments_are_resolved_when_enabled(enabled):
+    with tracing.span('loud', count=lambda: 3, path='a.trz'):
+        pass
+    event, = tracing.events()
+    assert event['name'] == 'loud'
+    assert event['args'] == {'count': 3, 'path': 'a.trz'}
+
+
+def test_errors_are_recorded(enabled):
+    with pytest.raises(KeyError):
+        with tracing.span('broken'):
+            raise KeyError('x')
+    assert tracing.events()[0]['args'] == {'error': 'KeyError'}
+
+
+def test_traced_and_summary(enabled):
+    @tracing.traced()
+    def work():
+        return 5
+
+    assert work() == 5
+    assert work() == 5
+    stats = tracing.summary()['test_traced_and_summary.<locals>.work']
+    assert stats['count'] == 2
+    assert stats['max_ms'] >= stats['mean_ms']
+
+
+def test_build_table_args_are_lazy(monkeypatch):
+    from model import test_model
+
+    spans = []
+    monkeypatch.setattr(test_model, 'span', lambda name, **args: spans.append((name, args)) or tracing.span(name))
+    test = test_model.Test('c', 'n')
+    test.add_CC('Vin', ['5', '12'])
+    test.build_table()
+
+    args = dict(spans)['Test.build_table']
+    # nothing worked out for a span that's switched off
+    assert callable(args['test']) and callable(args['virtual'])
+
+
+def test_build_table_span(enabled):
+    from model.test_model import Test
+
+    test = Test('c', 'n')
+    test.add_CC('Vin', ['5', '12'])
+    tracing.reset()
+    test.build_table()
+    event = next(e for e in tracing.events() if e['name'] == 'Test.build_table')
+    assert event['args'] == {'test': 'n', 'rows': 2, 'virtual': False}
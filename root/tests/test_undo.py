@@ -0,0 +1,173 @@
+import pandas as pd
+import pytest
+
+from model.report_archive import ARCHIVE_EXTENSION
+from model.spec_limits import SpecLimit
+from model.test_report import TestReport
+
+
+@pytest.fixture
+def report(make_report):
+    report = make_report(conditions={'Vin': ['5', '12'], 'Load': ['x', 'y']}, results={'I': ['1', '2', 'open', '4']},
+                         calculations={'P': "=CC('Vin') * Re('I')"}, specifications={'S': SpecLimit('I', maximum=3)},
+                         equipment=[{'Model': 'DMM', 'Serial': '1'}, {'Model': 'Scope', 'Serial': '2'}])
+    report.set_equipment_checked(1)
+    # what's been built so far isn't part of the tests below
+    report._history.clear()
+    return report
+
+
+def state(report):
+    test = report.selected_test
+    table = test.root_table.copy()
+    # the patched table has to be what a rebuild gives
+    test.build_table()
+    pd.testing.assert_frame_equal(table, test.root_table)
+    return (test.name, test.category, dict(test.metadata), {k: list(v) for k, v in test.column_conditions.items()},
+            {name: column.tolist() for name, column in test.results.items()}, dict(test.calculations),
+            list(test.checkbox_vars), table.astype(str).values.tolist(),
+            report.cover_page.equipment_used.astype(str).values.tolist(),
+            dict(report.cover_page.general_specifications))
+
+
+EDITS = {
+    'edit_Re_val': lambda r: r.edit_Re_val('I', 2, '9'),
+    'set_Re_rows': lambda r: r.set_Re_rows('I', [0, 3], ['7', '8']),
+    'set_cells': lambda r: r.set_cells('I', [0, 2], ['', '7']),
+    'update_from_dataframe': lambda r: r.update_from_dataframe(pd.DataFrame({'I': ['5', '', 'x', '6']})),
+    'add_CC': lambda r: r.add_CC('Temp', ['25', '85']),
+    'edit_CC': lambda r: r.edit_CC('CC1', 'Vin', ['12', '24']),
+    'del_CC': lambda r: r.del_CC('CC2'),
+    'add_Re': lambda r: r.add_Re('V'),
+    'edit_Re_name': lambda r: r.edit_Re_name('Re1', 'Iout'),
+    'del_Re': lambda r: r.del_Re('Re1'),
+    'add_Ca': lambda r: r.add_Ca('Q', "=Ca('P') + 1"),
+    'add_Sp': lambda r: r.add_Sp('T', limit=SpecLimit('P', minimum=10)),
+    'set_test_name': lambda r: r.set_test_name('b'),
+    'set_cat_name': lambda r: r.set_cat_name('other'),
+    'rename_category': lambda r: r.rename_category('cat', 'other'),
+    'add_equipment': lambda r: r.add_equipment({'Model': 'Load'}),
+    'edit_equipment': lambda r: r.edit_equipment(0, 'Serial', '9'),
+    'remove_equipment': lambda r: r.remove_equipment(0),
+    'set_equipment_checked': lambda r: r.set_equipment_checked(0),
+    'add_general_specification': lambda r: r.add_general_specification('Vout', '5 V'),
+}
+
+
+@pytest.mark.parametrize('op', list(EDITS))
+def test_undo_and_redo(op, report):
+    before = state(report)
+    EDITS[op](report)
+    after = state(report)
+    assert after != before
+
+    assert report.undo()
+    assert state(report) == before
+    assert report.redo()
+    assert state(report) == after
+    assert report.undo()
+    assert state(report) == before
+    assert not report.can_undo
+
+
+def test_cell_undo_patches_the_table(report):
+    test = report.selected_test
+    report.edit_Re_val('I', 1, '5')
+
+    builds = []
+    build_table = test.build_table
+    test.build_table = lambda: builds.append(1) or build_table()
+    report.undo()
+    report.redo()
+    del test.build_table
+    assert builds == []
+    assert test.root_table['P'].tolist()[1] == 25.0
+
+
+def test_batches_undo_as_one_step(report):
+    before = state(report)
+    with report.batch():
+        report.edit_Re_val('I', 0, '3')
+        report.add_Re('V')
+        report.edit_Re_val('V', 1, '2')
+    report.undo()
+    assert state(report) == before
+    assert not report.can_undo
+
+
+def test_new_edits_drop_the_redo_steps(report):
+    report.edit_Re_val('I', 0, '3')
+    report.undo()
+    assert report.can_redo
+    report.edit_Re_val('I', 1, '3')
+    assert not report.can_redo
+
+
+def test_history_is_capped(report):
+    report._history.max_steps = 3
+    for value in range(6):
+        report.edit_Re_val('I', 0, str(value))
+    assert len(report._history.undo_stack) == 3
+    while report.undo():
+        pass
+    assert report.selected_test.results['I'].tolist()[0] == 2.0
+
+    report._history.clear()
+    report._history.max_bytes = 1
+    report.edit_Re_val('I', 0, '3')
+    report.edit_Re_val('I', 0, '4')
+    # the newest step is always kept
+    assert len(report._history.undo_stack) == 1
+
+
+def test_undone_edits_reach_the_journal(tmp_path, report):
+    path = str(tmp_path / f"report{ARCHIVE_EXTENSION}")
+    report.save(path)
+    report.add_CC('Temp', ['25', '85'])
+    report.edit_Re_val('I', 0, '9')
+    report.undo()
+    report.undo()
+    report.redo()
+    report.save(path)
+
+    opened = TestReport.open(path)
+    opened.select_test('cat', 'a')
+    assert state(opened) == state(report)
+
+
+def test_adding_a_test_clears_the_history(report):
+    report.edit_Re_val('I', 0, '3')
+    report.add_test('cat', 'b')
+    assert not report.can_undo and not report.can_redo
+
+
+def test_steps_keep_only_the_cells_they_change(make_report):
+    report = make_report(conditions={'Vin': [str(v) for v in range(1000)], 'Load': ['x', 'y']}, results={'I': []},
+                         tests=[('cat', 'big')])
+    # every cell at Load 'x'
+    report.set_Re_rows('I', range(0, 2000, 2), range(1000))
+    column = report.selected_test.results['I']
+    report._history.clear()
+
+    report.set_Re_rows('I', [4, 6], ['1', '2'])
+    report.edit_Re_val('I', 8, 'open')
+    values = column.to_array(blank='')
+    values[10] = '9'
+    report.update_from_dataframe(pd.DataFrame({'I': values}))
+    # a few cells each, no column copies
+    assert report._history.nbytes < 2_000
+
+    report.del_CC('CC2')
+    step = report._history.undo_stack[-1]
+    assert [op for op, *_ in step.inverse] == ['_restore_test']
+    assert step.inverse[0][3]['results'] == {}
+
+    report.undo()
+    assert column.filled == 1000 and len(column) == 2000
+    report.undo()
+    assert column[10] == 5.0 and not column.is_numeric
+    report.undo()
+    # taking the text back turns the column back to numbers
+    assert column.is_numeric and column[8] == 4.0
+    report.undo()
+    assert column[4] == 2.0 and column[6] == 3.0
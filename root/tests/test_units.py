@@ -0,0 +1,93 @@
+import math
+import pickle
+
+import numpy as np
+import pytest
+
+from model.column_store import Column
+from model.report_archive import ARCHIVE_EXTENSION
+from model.spec_limits import SpecLimit
+from model.test_report import TestReport
+from model.units import main_unit, parse_quantities, parse_quantity
+
+CASES = {
+    '3.3mV': (0.0033, 'V'), '12 V': (12.0, 'V'), '1.2k': (1200.0, ''), '4.7 µF': (4.7e-06, 'F'),
+    '-40°C': (-40.0, '°C'), '10%': (10.0, '%'), '5 dBm': (5.0, 'dBm'), '100 mohm': (0.1, 'Ω'),
+    '2.5': (2.5, ''), 3: (3.0, ''), '1e3 Hz': (1000.0, 'Hz'),
+}
+
+
+@pytest.mark.parametrize('value', list(CASES))
+def test_parse_quantity(value):
+    number, unit = parse_quantity(value)
+    assert number == pytest.approx(CASES[value][0]) and unit == CASES[value][1]
+
+
+def test_parse_quantities_matches_one_at_a_time():
+    values = list(CASES) + ['--', 'N/A', '', None, 'PASS', '3 furlongs', float('nan'), True]
+    numbers, units, text = parse_quantities(values)
+    for value, number, unit in zip(values, numbers, units):
+        expected_number, expected_unit = parse_quantity(value)
+        assert unit == expected_unit
+        assert number == pytest.approx(expected_number, nan_ok=True)
+    assert text.tolist() == [False] * len(CASES) + [False, False, False, False, True, True, False, False]
+
+
+def test_main_unit():
+    assert main_unit([None, 'V', 'mV', 'V', '']) == 'V'
+    assert main_unit(['', 'A', 'A', '']) == ''
+    assert main_unit([None, None]) is None
+    assert main_unit(np.array(['V', 'A'], dtype=object)) == 'V'
+
+
+def test_column_shadows():
+    column = Column(['3.3mV', '12 V', '--', 'PASS', '2'])
+    assert column.tolist() == ['3.3mV', '12 V', '--', 'PASS', 2.0]
+    assert column.numeric().tolist()[:2] == pytest.approx([0.0033, 12.0])
+    assert math.isnan(column.numeric()[2]) and math.isnan(column.numeric()[3])
+    assert column.units().tolist() == ['V', 'V', None, None, '']
+    assert column.unit == 'V'
+    assert column.has_text
+
+    column[3] = '5 V'
+    assert not column.has_text
+    loaded = pickle.loads(pickle.dumps(column))
+    assert loaded.tolist() == column.tolist()
+    assert loaded.numeric().tolist()[:2] == pytest.approx([0.0033, 12.0])
+    assert loaded.units().tolist() == column.units().tolist()
+
+
+@pytest.fixture
+def report(make_report):
+    return make_report(conditions={'Load': ['1', '2', '3']}, results={'V': ['3.3mV', '1.2 V', 'n/a']},
+                       calculations={'mV': "=Re('V') * 1000"}, specifications={'S': SpecLimit('V', maximum=1)},
+                       tests=[('c', 't')])
+
+
+def test_formulas_and_limits_use_the_numbers(report):
+    table = report.selected_test.root_table
+    # cells show what was typed
+    assert table['V'].tolist() == ['3.3mV', '1.2 V', 'n/a']
+    assert table['mV'].tolist()[:2] == pytest.approx([3.3, 1200.0])
+    assert table['mV'].tolist()[2] == '#ERR'
+    assert report.selected_test.pass_fail_counts()['specs']['S'] == {'pass': 1, 'fail': 1, 'untested': 1}
+
+    view = report.long_view()
+    assert view['value'].tolist()[:2] == pytest.approx([0.0033, 1.2])
+
+
+def test_units_survive_save_and_reopen(tmp_path, report):
+    for name in ('report.pickle', f"report{ARCHIVE_EXTENSION}"):
+        path = str(tmp_path / name)
+        report.save(path)
+        opened = TestReport.open(path)
+        opened.select_test('c', 't')
+        test = opened.selected_test
+        test.refresh_table()
+        assert test.results['V'].tolist() == ['3.3mV', '1.2 V', 'n/a']
+        assert test.results['V'].unit == 'V'
+        assert test.root_table['mV'].tolist()[:2] == pytest.approx([3.3, 1200.0])
+
+        # and the shadow follows edits after reopening
+        opened.edit_Re_val('V', 2, '500 mV')
+        assert test.root_table['mV'].tolist()[2] == pytest.approx(500.0)
@@ -0,0 +1,80 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.test_model import Test
+from model.virtual_table import VirtualTable
+
+
+@pytest.fixture
+def grid(make_test):
+    def make(row_limit):
+        test = make_test(conditions={'Vin': [str(v) for v in range(10)], 'Load': ['a', 'b', 'c']}, results={'I': []},
+                         calculations={'P': "=CC('Vin') * Re('I')"})
+        test.VIRTUAL_ROW_LIMIT = row_limit
+        test.build_table()
+        test.set_Re_rows('I', range(0, 30, 2), [str(v) for v in range(15)])
+        return test
+    return make
+
+
+def test_big_grids_get_a_virtual_table(grid):
+    assert isinstance(grid(10).root_table, VirtualTable)
+    assert isinstance(grid(1000).root_table, pd.DataFrame)
+
+
+def test_windows_match_the_full_table(grid):
+    virtual = grid(10)
+    full = grid(1000).root_table
+
+    table = virtual.root_table
+    assert table.shape == full.shape
+    assert list(table.columns) == list(full.columns)
+    pd.testing.assert_frame_equal(table.window(7, 19), full.iloc[7:19])
+    pd.testing.assert_frame_equal(table.window(25, 99), full.iloc[25:])
+    assert table['P'].tolist() == full['P'].tolist()
+
+
+def test_edits_show_up_without_a_rebuild(grid):
+    test = grid(10)
+    table = test.root_table
+    test.edit_Re_val('I', 4, '100')
+    assert test.root_table is table
+    assert table.window(3, 5)['P'].tolist() == ['#ERR', 100.0]
+
+
+def test_growing_past_the_limit_switches_tables(grid):
+    test = grid(40)
+    assert isinstance(test.root_table, pd.DataFrame)
+    test.add_CC('Temp', ['25', '85'])
+    assert isinstance(test.root_table, VirtualTable)
+    test.del_CC('CC3')
+    assert isinstance(test.root_table, pd.DataFrame)
+
+
+def test_result_columns_on_a_huge_grid_stay_small():
+    # 15^6 = 11,390,625 rows
+    test = Test('c', 'n')
+    with test.batch():
+        for i in range(6):
+            test.add_CC(f'CC{i}', [str(v) for v in range(15)])
+    assert len(test.combo_index) > test.VIRTUAL_ROW_LIMIT
+
+    tracemalloc.start()
+    try:
+        for name in ('A', 'B', 'C', 'D'):
+            test.add_Re(name)
+        test.edit_Re_val('A', 5_000_000, '1.5')
+        test.set_Re_rows('B', np.arange(0, 10_000_000, 1000), np.ones(10_000))
+        window = test.root_table.window(4_999_990, 5_000_010)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert isinstance(test.root_table, VirtualTable)
+    assert window['A'].tolist()[10] == 1.5
+    # storage is allocated as cells are written, nothing per row of the grid
+    assert test.results.nbytes == 16 * 10_001
+    assert peak < 2 * 1024 * 1024
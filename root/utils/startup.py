@@ -0,0 +1,177 @@
+"""
+Startup timing: how long every import took and when the window got on screen.
+
+    TRG_STARTUP_REPORT=1 python main.py              # report on stderr once startup is done
+    TRG_STARTUP_REPORT=startup.txt python main.py    # or written to a file
+
+main.py calls install_from_environment() before importing anything else. From then
+on every module import is timed and listed in the same layout as python -X importtime
+(self and cumulative microseconds, nested imports indented under what imported them),
+after the startup phases marked with mark() and the slowest top-level imports.
+finish() writes the report, or it's written at exit if finish() is never called
+(the batch command line). Nothing is hooked unless TRG_STARTUP_REPORT is set.
+"""
+import atexit
+import os
+import sys
+import threading
+import time
+
+
+# times are relative to this module being imported, the first thing main.py does
+T0 = time.perf_counter()
+
+_phases = []
+_imports = []           # (depth, name, self us, cumulative us) in the order they finished
+_local = threading.local()
+_finder = None
+_output = None
+
+
+# ----- Import timing -----
+
+class _TimedLoader():
+    """
+    Stands in for a module's loader while it executes, then puts the real one back.
+    """
+    def __init__(self, loader, name):
+        self._loader = loader
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+
+        # children add their cumulative time here, what's left is the module's own
+        stack.append(0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            cumulative = int((time.perf_counter() - start) * 1e6)
+            children = stack.pop()
+            if stack:
+                stack[-1] += cumulative
+            _imports.append((len(stack), self._name, cumulative - children, cumulative))
+
+            spec = getattr(module, '__spec__', None)
+            if spec is not None and spec.loader is self:
+                spec.loader = self._loader
+            if getattr(module, '__loader__', None) is self:
+                module.__loader__ = self._loader
+
+
+class _TimingFinder():
+    """
+    First on sys.meta_path: asks the other finders for the spec and wraps its loader.
+    """
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader, name)
+        return spec
+
+
+def install():
+    """
+    Starts timing imports. Modules imported before this aren't in the report.
+    """
+    global _finder
+    if _finder is None:
+        _finder = _TimingFinder()
+        sys.meta_path.insert(0, _finder)
+
+
+def uninstall():
+    global _finder
+    if _finder is not None:
+        if _finder in sys.meta_path:
+            sys.meta_path.remove(_finder)
+        _finder = None
+
+
+def is_installed():
+    return _finder is not None
+
+
+def install_from_environment():
+    """
+    Installs the import timer if TRG_STARTUP_REPORT is set, and writes the report at exit.
+    """
+    global _output
+    output = os.environ.get('TRG_STARTUP_REPORT')
+    if not output:
+        return
+    _output = output
+    install()
+    atexit.register(finish)
+
+
+# ----- Phases / Report -----
+
+def mark(phase: str):
+    """
+    Records that phase was reached, in ms since startup. Cheap enough to leave in.
+    """
+    _phases.append((phase, (time.perf_counter() - T0) * 1000))
+
+
+def phases():
+    return list(_phases)
+
+
+def imports():
+    return list(_imports)
+
+
+def report(slowest: int = 15):
+    """
+    The startup report as text: phases, the slowest top-level imports, then every import.
+    """
+    lines = ["startup phases (ms since launch):"]
+    for phase, ms in _phases:
+        lines.append(f"  {ms:10.1f}  {phase}")
+
+    top = sorted((entry for entry in _imports if entry[0] == 0), key=lambda entry: -entry[3])
+    total = sum(entry[3] for entry in top)
+    lines.append(f"slowest top-level imports ({total / 1000:.1f} ms in {len(_imports)} modules):")
+    for _, name, _, cumulative in top[:slowest]:
+        lines.append(f"  {cumulative / 1000:10.1f}  {name}")
+
+    lines.append("import time: self [us] | cumulative | imported package")
+    for depth, name, self_us, cumulative in _imports:
+        lines.append(f"import time: {self_us:>9} | {cumulative:>10} | {'  ' * depth}{name}")
+    return '\n'.join(lines) + '\n'
+
+
+def finish():
+    """
+    Stops timing imports and writes the report where TRG_STARTUP_REPORT says, once.
+    """
+    global _output
+    uninstall()
+    output, _output = _output, None
+    if not output:
+        return
+
+    text = report()
+    if output in ('1', '-', 'stderr'):
+        sys.stderr.write(text)
+    else:
+        with open(output, 'w', encoding='utf-8') as file:
+            file.write(text)
@@ -0,0 +1,192 @@
+"""
+Leveled logging and timing spans.
+
+    from utils.tracing import get_logger, span, traced
+
+    log = get_logger(__name__)
+
+    with span('build_table', rows=n):
+        ...
+
+    # arguments that cost something to work out can be passed as callables,
+    # they're only called when tracing is on
+    with span('write', records=lambda: len(records)):
+        ...
+
+    @traced('pickle')
+    def pickle(...):
+        ...
+
+When tracing is off (the default) span() hands back one shared object that does
+nothing and traced() functions make a single flag check, so the hooks can stay
+in hot paths. Turn it on with enable() or by setting TRG_TRACE to the path the
+JSON trace should be written to when the program exits. TRG_LOG_LEVEL sets the
+log level (WARNING by default).
+"""
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+
+LOGGER_NAME = 'trg'
+
+_enabled = False
+_events = []
+_lock = threading.Lock()
+
+
+def get_logger(name: str = ''):
+    # every logger hangs off the 'trg' logger so one level controls the whole app
+    if not name or name == LOGGER_NAME:
+        return logging.getLogger(LOGGER_NAME)
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def configure_logging(level=None):
+    """
+    Sets up console logging once. level defaults to TRG_LOG_LEVEL, then WARNING.
+    """
+    level = level or os.environ.get('TRG_LOG_LEVEL', 'WARNING')
+    logger = get_logger()
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        logger.addHandler(handler)
+
+
+# ----- Spans -----
+
+class _NullSpan():
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span():
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        event = {
+            'name': self.name,
+            'ph': 'X',
+            'ts': self.start / 1000,
+            'dur': (end - self.start) / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+        }
+        if self.args or exc_type is not None:
+            args = dict(self.args)
+            if exc_type is not None:
+                args['error'] = exc_type.__name__
+            event['args'] = {k: v if isinstance(v, (int, float, str, bool)) or v is None else str(v)
+                             for k, v in args.items()}
+        with _lock:
+            _events.append(event)
+        return False
+
+
+def span(name: str, **args):
+    """
+    Context manager timing a block. Does nothing unless tracing is enabled.
+    Callable arguments are called when the span starts, so they cost nothing
+    while tracing is off.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, {k: v() if callable(v) else v for k, v in args.items()})
+
+
+def traced(name: str = None):
+    """
+    Decorator version of span(), named after the function unless name is given.
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ----- Control / Export -----
+
+def enable(enabled: bool = True):
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _events.clear()
+
+
+def events():
+    with _lock:
+        return list(_events)
+
+
+def summary():
+    """
+    span name -> {'count', 'total_ms', 'mean_ms', 'max_ms'}
+    """
+    totals = {}
+    for event in events():
+        stats = totals.setdefault(event['name'], {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        ms = event['dur'] / 1000
+        stats['count'] += 1
+        stats['total_ms'] += ms
+        stats['max_ms'] = max(stats['max_ms'], ms)
+
+    for stats in totals.values():
+        stats['mean_ms'] = stats['total_ms'] / stats['count']
+    return totals
+
+
+def export_json(filepath):
+    """
+    Writes the recorded spans as a Chrome trace (chrome://tracing, Perfetto) plus a per-span summary.
+    """
+    with open(filepath, 'w') as file:
+        json.dump({'traceEvents': events(), 'summary': summary(), 'displayTimeUnit': 'ms'}, file, indent=1)
+
+
+def _enable_from_environment():
+    trace_path = os.environ.get('TRG_TRACE')
+    if trace_path:
+        enable()
+        atexit.register(export_json, trace_path)
+
+
+_enable_from_environment()